@@ -6,6 +6,7 @@ from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth import get_user_model, authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
+from icpac_booking.serializers import SparseFieldsSerializerMixin
 
 User = get_user_model()
 
@@ -144,12 +145,17 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for user information
     """
     full_name = serializers.CharField(source='get_full_name', read_only=True)
     managed_rooms_data = serializers.SerializerMethodField()
+    expandable_fields = {'managed_rooms': 'apps.rooms.serializers.RoomListSerializer'}
+    field_sources = {
+        'full_name': ('first_name', 'last_name'),
+        'managed_rooms_data': ('role', 'managed_rooms'),
+    }
     
     class Meta:
         model = User
@@ -168,6 +174,18 @@ class UserSerializer(serializers.ModelSerializer):
         return []
 
 
+class UserSummarySerializer(serializers.ModelSerializer):
+    """
+    Public name of a user, nested in other objects
+    """
+    full_name = serializers.CharField(source='get_full_name', read_only=True)
+
+    class Meta:
+        model = User
+        fields = ['id', 'first_name', 'last_name', 'full_name']
+        read_only_fields = fields
+
+
 class UserUpdateSerializer(serializers.ModelSerializer):
     """
     Serializer for updating user information
@@ -234,11 +252,15 @@ class PasswordChangeSerializer(serializers.Serializer):
         return user
 
 
-class AdminUserSerializer(serializers.ModelSerializer):
+class AdminUserSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for admin user management (super admin only)
     """
     full_name = serializers.CharField(source='get_full_name', read_only=True)
+    expandable_fields = {'managed_rooms': 'apps.rooms.serializers.RoomListSerializer'}
+    field_sources = {
+        'full_name': ('first_name', 'last_name'),
+    }
     
     class Meta:
         model = User
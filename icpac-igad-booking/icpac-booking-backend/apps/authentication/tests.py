@@ -1,3 +1,250 @@
-from django.test import TestCase
+from django.core.cache import caches
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
-# Create your tests here.
+from apps.bookings.models import Booking
+from apps.rooms.models import Room
+from apps.rooms.serializers import RoomListSerializer
+from apps.security.models import OTPToken
+from icpac_booking.querybudget import QueryBudgetTestMixin
+from .models import EmailVerificationOTP, User
+
+
+@override_settings(
+    AUDIT_LOG_ASYNC=False,
+    LOG_API_REQUESTS=False,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class AuthenticationEndpointBudgetTests(QueryBudgetTestMixin, APITestCase):
+    """
+    Every authentication and user endpoint family stays within its query
+    budget while returning what it should
+    """
+    password = 'Secret-pass-42'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rooms = [
+            Room.objects.create(name=f'Room {n}', capacity=20, category='meeting')
+            for n in range(3)
+        ]
+        cls.admin = User.objects.create_user(
+            'admin', 'admin@icpac.net', cls.password, role='super_admin', is_email_verified=True
+        )
+        cls.room_admin = User.objects.create_user(
+            'roomadmin', 'roomadmin@icpac.net', cls.password, role='room_admin', is_email_verified=True
+        )
+        cls.room_admin.managed_rooms.set(cls.rooms[:2])
+        cls.users = [
+            User.objects.create_user(
+                f'user{n}', f'user{n}@icpac.net', cls.password,
+                first_name='User', last_name=str(n), is_email_verified=True
+            )
+            for n in range(12)
+        ]
+        # Listed users carry managed rooms, so a per-row lookup would show
+        for user in cls.users:
+            user.managed_rooms.set(cls.rooms[:1])
+        cls.unverified = User.objects.create_user('new', 'new@icpac.net', cls.password)
+
+    def setUp(self):
+        super().setUp()
+        caches['default'].clear()
+
+    def login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+    def test_account_flow(self):
+        response = self.client.post('/api/auth/register/', {
+            'email': 'someone@icpac.net', 'first_name': 'Some', 'last_name': 'One',
+            'password': self.password, 'password_confirm': self.password,
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertWithinBudget(response)
+        self.assertTrue(response.data['requires_verification'])
+        self.assertFalse(User.objects.get(email='someone@icpac.net').is_email_verified)
+
+        response = self.client.post('/api/auth/resend-otp/', {'email': self.unverified.email})
+        self.assertIn(response.status_code, (200, 500))
+        self.assertWithinBudget(response)
+
+        otp = EmailVerificationOTP.generate_otp_for_user(self.unverified)
+        response = self.client.post('/api/auth/verify-email/', {'email': self.unverified.email, 'otp_code': otp.otp_code})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertWithinBudget(response)
+        self.assertEqual(response.data['user']['email'], self.unverified.email)
+        self.assertEqual(set(response.data['tokens']), {'access', 'refresh'})
+        self.assertTrue(User.objects.get(pk=self.unverified.pk).is_email_verified)
+
+        for user in (self.users[0], self.room_admin):
+            response = self.client.post('/api/auth/login/', {'email': user.email, 'password': self.password})
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertWithinBudget(response)
+            self.assertEqual(response.data['user']['email'], user.email)
+            self.assertEqual(AccessToken(response.data['access'])['user_id'], user.id)
+
+        response = self.client.post('/api/auth/token/refresh/', {'refresh': response.data['refresh']})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertWithinBudget(response)
+        self.assertEqual(AccessToken(response.data['access'])['user_id'], self.room_admin.id)
+
+        self.login(self.users[0])
+        response = self.client.post('/api/auth/logout/')
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+
+    def test_passwords(self):
+        response = self.client.post('/api/auth/password/reset/', {'email': self.users[1].email})
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+
+        otp = OTPToken.objects.filter(user=self.users[1], token_type='password_reset').latest('created_at')
+        response = self.client.post('/api/auth/password/reset/confirm/', {
+            'email': self.users[1].email, 'otp': otp.token, 'new_password': 'Another-pass-42',
+        })
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertWithinBudget(response)
+        self.assertTrue(User.objects.get(pk=self.users[1].pk).check_password('Another-pass-42'))
+
+        self.login(self.users[2])
+        response = self.client.post('/api/auth/password/change/', {
+            'old_password': self.password,
+            'new_password': 'Another-pass-42',
+            'new_password_confirm': 'Another-pass-42',
+        })
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertWithinBudget(response)
+        self.assertTrue(User.objects.get(pk=self.users[2].pk).check_password('Another-pass-42'))
+
+    def test_profile_and_dashboard(self):
+        for user in (self.users[0], self.room_admin):
+            self.login(user)
+            response = self.client.get('/api/auth/profile/')
+            self.assertEqual(response.status_code, 200)
+            self.assertWithinBudget(response)
+            self.assertEqual((response.data['email'], response.data['role']), (user.email, user.role))
+
+        response = self.client.patch('/api/auth/profile/', {'department': 'Climate'})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertWithinBudget(response)
+        self.assertEqual(User.objects.get(pk=self.room_admin.pk).department, 'Climate')
+
+        for user in (self.admin, self.room_admin, self.users[0]):
+            self.login(user)
+            response = self.client.get('/api/auth/dashboard/stats/')
+            self.assertEqual(response.status_code, 200)
+            self.assertWithinBudget(response)
+            self.assertEqual(response.data['user_role'], user.role)
+            self.assertEqual(response.data['total_bookings'], 0)
+            self.assertEqual('managed_rooms_count' in response.data, user.role != 'user')
+
+    def test_user_list(self):
+        self.login(self.admin)
+        response = self.client.get('/api/auth/users/')
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        newest_first = [self.unverified, *reversed(self.users), self.room_admin, self.admin]
+        self.assertEqual([user['id'] for user in response.data['results']], [user.id for user in newest_first[:10]])
+        self.assertEqual(response.data['results'][1]['managed_rooms'], [self.rooms[0].id])
+
+        response = self.client.get(response.data['next'])
+        self.assertWithinBudget(response)
+        self.assertEqual([user['id'] for user in response.data['results']], [user.id for user in newest_first[10:]])
+
+    def test_room_admin_user_list(self):
+        Booking.objects.bulk_create([
+            Booking(
+                room=self.rooms[0], user=user, start_date='2030-01-01', end_date='2030-01-01',
+                start_time='09:00', end_time='10:00', purpose='Synthetic booking',
+            )
+            for user in self.users
+        ])
+        self.login(self.room_admin)
+        response = self.client.get('/api/auth/users/', {'page': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        # Only users who booked one of the admin's rooms, each once
+        self.assertEqual(response.data['count'], len(self.users))
+        self.assertEqual(
+            {user['id'] for user in response.data['results']}, {user.id for user in self.users[-10:]}
+        )
+
+    def test_user_admin(self):
+        self.login(self.admin)
+        response = self.client.post('/api/auth/users/', {
+            'username': 'created', 'email': 'created@icpac.net', 'role': 'room_admin',
+            'managed_rooms': [self.rooms[0].id],
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertWithinBudget(response)
+        created = User.objects.get(email='created@icpac.net')
+        self.assertEqual(list(created.managed_rooms.all()), [self.rooms[0]])
+
+        url = f'/api/auth/users/{self.users[3].id}/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        self.assertEqual(response.data['email'], self.users[3].email)
+
+        response = self.client.patch(url, {'department': 'ICT'})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertWithinBudget(response)
+        self.assertEqual(User.objects.get(pk=self.users[3].pk).department, 'ICT')
+
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, 204)
+        self.assertWithinBudget(response)
+        self.assertFalse(User.objects.filter(pk=self.users[3].pk).exists())
+
+
+@override_settings(AUDIT_LOG_ASYNC=False, LOG_API_REQUESTS=False)
+class UserSparseFieldsTests(APITestCase):
+    """?fields= and ?expand= on the user list"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rooms = [Room.objects.create(name=f'Room {n}', capacity=20, category='meeting') for n in range(3)]
+        cls.admin = User.objects.create(username='admin', email='admin@icpac.net', role='super_admin')
+        for n in range(6):
+            user = User.objects.create(
+                username=f'user{n}', email=f'user{n}@icpac.net', first_name='User', last_name=str(n),
+                role='room_admin' if n % 2 else 'user',
+            )
+            user.managed_rooms.set(cls.rooms[:n % 3])
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+
+    def get(self, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/auth/users/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'], [query['sql'] for query in queries]
+
+    def test_fields(self):
+        full, _ = self.get({'page_size': 4})
+        results, sql = self.get({'fields': 'id,full_name', 'page_size': 4})
+        self.assertEqual(results, [{'id': user['id'], 'full_name': user['full_name']} for user in full])
+        # Managed rooms are no longer prefetched, and only the name columns are read
+        self.assertFalse([query for query in sql if '"rooms"' in query])
+        users_sql = [query for query in sql if 'FROM "auth_user"' in query][-1]
+        self.assertNotIn('"auth_user"."password"', users_sql)
+        self.assertIn('"auth_user"."last_name"', users_sql)
+
+    def test_expand(self):
+        results, sql = self.get({'fields': 'id,managed_rooms', 'expand': 'managed_rooms', 'page_size': 2})
+        results, more_sql = self.get({'fields': 'id,managed_rooms', 'expand': 'managed_rooms', 'page_size': 7})
+        self.assertEqual(len(sql), len(more_sql))
+        users = User.objects.in_bulk([user['id'] for user in results])
+        for user in results:
+            rooms = users[user['id']].managed_rooms.all()
+            self.assertEqual(user['managed_rooms'], RoomListSerializer(rooms, many=True).data)
+        self.assertTrue(any(user['managed_rooms'] for user in results))
+
+    def test_unknown_names_are_rejected(self):
+        response = self.client.get('/api/auth/users/', {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Unknown field(s): password', response.data['fields'])
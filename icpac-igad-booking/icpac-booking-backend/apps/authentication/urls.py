@@ -4,6 +4,7 @@ Authentication URLs for ICPAC Booking System
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework_simplejwt.views import TokenRefreshView
+from icpac_booking.querybudget import query_budget
 from . import views
 
 app_name = 'authentication'
@@ -13,7 +14,7 @@ urlpatterns = [
     path('login/', views.CustomTokenObtainPairView.as_view(), name='login'),
     path('register/', csrf_exempt(views.UserRegistrationView.as_view()), name='register'),
     path('logout/', views.LogoutView.as_view(), name='logout'),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/refresh/', query_budget(0)(TokenRefreshView.as_view()), name='token_refresh'),
     
     # Email verification endpoints
     path('verify-email/', views.VerifyEmailOTPView.as_view(), name='verify_email'),
@@ -22,6 +22,9 @@ from .serializers import (
     AdminUserSerializer
 )
 from .models import EmailVerificationOTP
+from icpac_booking.pagination import KeysetOrPageNumberPagination
+from icpac_booking.querybudget import query_budget
+from icpac_booking.serializers import SparseFieldsMixin
 from .email_utils import send_otp_email
 
 User = get_user_model()
@@ -33,6 +36,7 @@ class CustomTokenObtainPairView(TokenObtainPairView):
     Custom login view that returns JWT tokens with user info
     """
     serializer_class = CustomTokenObtainPairSerializer
+    query_budget = 4
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -68,6 +72,7 @@ class UserRegistrationView(generics.CreateAPIView):
     serializer_class = UserRegistrationSerializer
     permission_classes = [permissions.AllowAny]
     authentication_classes = []  # No authentication required for registration
+    query_budget = 4
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -107,12 +112,13 @@ class UserRegistrationView(generics.CreateAPIView):
             }, status=status.HTTP_201_CREATED)
 
 
-class CurrentUserView(generics.RetrieveUpdateAPIView):
+class CurrentUserView(SparseFieldsMixin, generics.RetrieveUpdateAPIView):
     """
     Get and update current user profile
     """
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'GET': 3, 'PUT': 2, 'PATCH': 2}
 
     def get_object(self):
         return self.request.user
@@ -128,6 +134,7 @@ class PasswordChangeView(APIView):
     Change user password
     """
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 2
 
     def post(self, request):
         serializer = PasswordChangeSerializer(data=request.data, context={'request': request})
@@ -144,6 +151,7 @@ class LogoutView(APIView):
     Logout user by blacklisting refresh token
     """
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 1
 
     def post(self, request):
         try:
@@ -167,6 +175,7 @@ class VerifyEmailOTPView(APIView):
     Verify email using OTP code
     """
     permission_classes = [permissions.AllowAny]
+    query_budget = 6
     
     def post(self, request):
         email = request.data.get('email')
@@ -221,6 +230,7 @@ class ResendOTPView(APIView):
     Resend OTP for email verification
     """
     permission_classes = [permissions.AllowAny]
+    query_budget = 2
     
     def post(self, request):
         email = request.data.get('email')
@@ -262,27 +272,30 @@ class ResendOTPView(APIView):
             }, status=status.HTTP_404_NOT_FOUND)
 
 
-class UserListView(generics.ListCreateAPIView):
+class UserListView(SparseFieldsMixin, generics.ListCreateAPIView):
     """
     List and create users (admin only)
     """
     queryset = User.objects.all()
     serializer_class = AdminUserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetOrPageNumberPagination
+    keyset_ordering = ('-created_at', '-id')
+    query_budget = {'GET': 4, 'POST': 8}
     
     def get_queryset(self):
         user = self.request.user
         
         # Super admin can see all users
         if user.role == 'super_admin':
-            return User.objects.all().order_by('-date_joined')
+            return User.objects.prefetch_related('managed_rooms').order_by('-date_joined')
         
         # Room admin can see users who have booked their rooms
         elif user.role == 'room_admin':
             managed_room_ids = user.managed_rooms.values_list('id', flat=True)
             return User.objects.filter(
                 bookings__room_id__in=managed_room_ids
-            ).distinct().order_by('-date_joined')
+            ).distinct().prefetch_related('managed_rooms').order_by('-date_joined')
         
         # Regular users can only see themselves
         return User.objects.filter(id=user.id)
@@ -320,13 +333,14 @@ class UserListView(generics.ListCreateAPIView):
                 pass  # Don't fail user creation if email fails
 
 
-class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
+class UserDetailView(SparseFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update, or delete a user (admin only)
     """
     queryset = User.objects.all()
     serializer_class = AdminUserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'GET': 3, 'PUT': 4, 'PATCH': 4, 'DELETE': 15}
     
     def get_queryset(self):
         user = self.request.user
@@ -364,6 +378,7 @@ class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
         instance.delete()
 
 
+@query_budget(4)
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def user_dashboard_stats(request):
@@ -373,39 +388,32 @@ def user_dashboard_stats(request):
     user = request.user
     
     # Get user's bookings count
-    from apps.bookings.models import Booking
+    from apps.bookings import stats as booking_stats
     
-    total_bookings = Booking.objects.filter(user=user).count()
-    pending_bookings = Booking.objects.filter(user=user, approval_status='pending').count()
-    approved_bookings = Booking.objects.filter(user=user, approval_status='approved').count()
+    counts = booking_stats.user_stats(user)
     
     stats = {
-        'total_bookings': total_bookings,
-        'pending_bookings': pending_bookings,
-        'approved_bookings': approved_bookings,
+        'total_bookings': counts['total'],
+        'pending_bookings': counts['pending'],
+        'approved_bookings': counts['approved'],
         'user_role': user.role,
     }
     
     # Add admin stats if user is admin
     if user.role in ['super_admin', 'room_admin']:
-        if user.role == 'super_admin':
-            all_bookings = Booking.objects.all()
-            managed_rooms_count = user.managed_rooms.count() if user.role == 'room_admin' else 0
-        else:
-            # Room admin stats for their managed rooms
-            managed_room_ids = user.managed_rooms.values_list('id', flat=True)
-            all_bookings = Booking.objects.filter(room_id__in=managed_room_ids)
-            managed_rooms_count = user.managed_rooms.count()
+        managed_counts = booking_stats.managed_stats(user)
+        managed_rooms_count = user.managed_rooms.count() if user.role == 'room_admin' else 0
         
         stats.update({
-            'total_system_bookings': all_bookings.count(),
-            'pending_approvals': all_bookings.filter(approval_status='pending').count(),
+            'total_system_bookings': managed_counts['total'],
+            'pending_approvals': managed_counts['pending'],
             'managed_rooms_count': managed_rooms_count,
         })
     
     return Response(stats)
 
 
+@query_budget(4)
 @csrf_exempt
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
@@ -493,6 +501,7 @@ ICPAC Booking System
     })
 
 
+@query_budget(6)
 @csrf_exempt
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
@@ -1,8 +1,11 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.utils.html import format_html
 from django.db.models import Count, Q
 from django.utils import timezone
-from .models import Booking
+from . import cache as availability_cache
+from .models import Booking, BookingOccurrence, RoomOccupancy, RoomUsageDaily
+from .exports import ExportError, export_response
+from .stats import system_stats
 from apps.rooms.models import Room
 
 # Custom admin site configuration
@@ -76,14 +79,14 @@ class BookingAdmin(admin.ModelAdmin):
     search_fields = ('purpose', 'user__username', 'user__email', 'room__name')
     readonly_fields = ('created_at', 'updated_at', 'approved_by', 'approved_at', 'booking_details')
     date_hierarchy = 'start_date'
-    actions = ['approve_bookings', 'reject_bookings', 'export_to_csv']
+    actions = ['approve_bookings', 'reject_bookings', 'export_to_csv', 'export_to_xlsx']
 
     fieldsets = (
         ('Booking Information', {
             'fields': ('room', 'user', 'purpose', 'special_requirements')
         }),
         ('Schedule', {
-            'fields': ('booking_type', 'start_date', 'end_date', 'start_time', 'end_time', 'expected_attendees', 'selected_dates')
+            'fields': ('booking_type', 'start_date', 'end_date', 'start_time', 'end_time', 'expected_attendees', 'selected_dates', 'recurrence_rule')
         }),
         ('Approval', {
             'fields': ('approval_status', 'approved_by', 'approved_at', 'rejection_reason'),
@@ -178,54 +181,54 @@ class BookingAdmin(admin.ModelAdmin):
     booking_details.short_description = 'Details'
 
     def check_conflicts(self, obj):
-        return Booking.objects.filter(
-            room=obj.room,
-            approval_status='approved',
-            start_date__lte=obj.end_date,
-            end_date__gte=obj.start_date
-        ).exclude(id=obj.id)
+        conflicting = BookingOccurrence.overlapping(
+            obj.room_id, obj.occurrence_dates(), obj.start_time, obj.end_time,
+            exclude_booking=obj.id
+        ).filter(approval_status='approved')
+        return Booking.objects.filter(id__in=conflicting.values('booking_id'))
 
     def approve_bookings(self, request, queryset):
-        updated = queryset.filter(approval_status='pending').update(
+        pending = queryset.filter(approval_status='pending')
+        # update() skips signals and save(), so carry the status to the derived tables
+        booking_ids = list(pending.values_list('id', flat=True))
+        updated = pending.update(
             approval_status='approved',
             approved_by=request.user,
             approved_at=timezone.now()
         )
+        removed, added = BookingOccurrence.update_status(booking_ids, 'approved')
+        RoomUsageDaily.sync_booking(removed, added)
+        availability_cache.bump_on_commit(*{row[0] for row in added})
         self.message_user(request, f'{updated} booking(s) approved successfully.')
     approve_bookings.short_description = 'Approve selected bookings'
 
     def reject_bookings(self, request, queryset):
-        updated = queryset.filter(approval_status='pending').update(
+        pending = queryset.filter(approval_status='pending')
+        # update() skips signals and save(), so free the rejected slots explicitly
+        booking_ids = list(pending.values_list('id', flat=True))
+        updated = pending.update(
             approval_status='rejected',
             approved_by=request.user,
             approved_at=timezone.now()
         )
+        removed, added = BookingOccurrence.update_status(booking_ids, 'rejected')
+        RoomOccupancy.sync_booking(removed, added)
+        RoomUsageDaily.sync_booking(removed, added)
+        availability_cache.bump_on_commit(*{row[0] for row in added})
         self.message_user(request, f'{updated} booking(s) rejected.')
     reject_bookings.short_description = 'Reject selected bookings'
 
     def export_to_csv(self, request, queryset):
-        import csv
-        from django.http import HttpResponse
-
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="bookings.csv"'
-
-        writer = csv.writer(response)
-        writer.writerow(['Room', 'User', 'Purpose', 'Start Date', 'End Date', 'Status'])
-
-        for booking in queryset:
-            writer.writerow([
-                booking.room.name,
-                booking.user.email,
-                booking.purpose,
-                booking.start_date,
-                booking.end_date,
-                booking.approval_status
-            ])
-
-        return response
+        return export_response(queryset, 'csv')
     export_to_csv.short_description = 'Export to CSV'
 
+    def export_to_xlsx(self, request, queryset):
+        try:
+            return export_response(queryset, 'xlsx')
+        except ExportError as exc:
+            self.message_user(request, str(exc), level=messages.ERROR)
+    export_to_xlsx.short_description = 'Export to Excel'
+
 
 # Dashboard customization
 class BookingDashboard(admin.AdminSite):
@@ -234,10 +237,8 @@ class BookingDashboard(admin.AdminSite):
 
         # Add dashboard statistics
         extra_context['total_rooms'] = Room.objects.filter(is_active=True).count()
-        extra_context['pending_bookings'] = Booking.objects.filter(approval_status='pending').count()
-        extra_context['todays_bookings'] = Booking.objects.filter(
-            start_date=timezone.now().date(),
-            approval_status='approved'
-        ).count()
+        counts = system_stats()
+        extra_context['pending_bookings'] = counts['pending']
+        extra_context['todays_bookings'] = counts['today']
 
         return super().index(request, extra_context)
\ No newline at end of file
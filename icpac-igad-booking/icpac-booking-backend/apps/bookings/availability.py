@@ -0,0 +1,140 @@
+"""
+Multi-room availability engine for ICPAC Booking System
+
+AvailabilityWindow loads everything needed to answer availability questions
+for a set of rooms over a date window with one query per source, instead of
+one or two queries per room:
+
+- the occupancy bitmaps, always (one query)
+- the pending/approved booking occurrences, only when a caller needs booking
+  details or the bitmaps report a possible overlap (one query)
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from . import occupancy
+from .models import Booking, BookingOccurrence, RoomOccupancy
+
+
+class AvailabilityWindow:
+    """
+    Availability of several rooms between start_date and end_date (inclusive)
+    """
+
+    def __init__(self, rooms, start_date, end_date=None):
+        self.room_ids = [getattr(room, 'id', room) for room in rooms]
+        self.start_date = start_date
+        self.end_date = end_date or start_date
+        self._bitmaps = None
+        self._occurrences = None
+
+    @property
+    def bitmaps(self):
+        """{(room_id, date): bitmap} for every booked room day in the window"""
+        if self._bitmaps is None:
+            rows = RoomOccupancy.objects.filter(
+                room_id__in=self.room_ids,
+                date__range=[self.start_date, self.end_date]
+            ).values_list('room_id', 'date', 'bitmap')
+            self._bitmaps = {
+                (room_id, day): occupancy.from_bytes(bitmap)
+                for room_id, day, bitmap in rows
+            }
+        return self._bitmaps
+
+    @property
+    def occurrences(self):
+        """{room_id: [occurrences]} of pending/approved bookings inside the window"""
+        if self._occurrences is None:
+            occurrences = BookingOccurrence.objects.filter(
+                room_id__in=self.room_ids,
+                approval_status__in=Booking.ACTIVE_STATUSES,
+                date__range=[self.start_date, self.end_date]
+            ).select_related('booking__user').order_by('date', 'start_time')
+
+            self._occurrences = defaultdict(list)
+            for occurrence in occurrences:
+                self._occurrences[occurrence.room_id].append(occurrence)
+        return self._occurrences
+
+    def bitmap(self, room_id, date):
+        """Occupancy bitmap of a room on a date (0 when nothing is booked)"""
+        return self.bitmaps.get((room_id, date), 0)
+
+    def bookings_on(self, room_id, date):
+        """Bookings of a room on a date, ordered by start time"""
+        return [o.booking for o in self.occurrences.get(room_id, []) if o.date == date]
+
+    def availability_level(self, room_id, date):
+        """'available', 'partially_booked' or 'fully_booked'"""
+        return occupancy.availability_level(self.bitmap(room_id, date))
+
+    def conflicts(self, room_id, start_date, end_date, start_time, end_time):
+        """Bookings of a room overlapping start_time..end_time on any day of start_date..end_date"""
+        mask = occupancy.slot_mask(start_time, end_time)
+        day = start_date
+        while day <= end_date:
+            if self.bitmap(room_id, day) & mask:
+                break
+            day += timedelta(days=1)
+        else:
+            # The index shows every requested slot free
+            return []
+
+        conflicts = {}
+        for occurrence in self.occurrences.get(room_id, []):
+            if (start_date <= occurrence.date <= end_date
+                    and occurrence.start_time < end_time and occurrence.end_time > start_time):
+                conflicts.setdefault(occurrence.booking_id, occurrence.booking)
+        return list(conflicts.values())
+
+    def is_free(self, room_id, date, start_time, end_time):
+        """Whether a room can take start_time..end_time on a date"""
+        return not self.conflicts(room_id, date, date, start_time, end_time)
+
+    def free_slots(self, room, date):
+        """Free slots of a room on a date within business hours"""
+        return free_time_slots(room, date, self.bitmap(room.id, date))
+
+
+def sweep_schedule(room, occurrences, start_date, end_date):
+    """
+    Walk occurrences ordered by (date, start_time) once and yield
+    (date, day_occurrences, free_slots) for every day from start_date to end_date.
+
+    Days are emitted in order while the occurrence iterator advances, so each
+    occurrence is visited once however long the range is.
+    """
+    pending = iter(occurrences)
+    upcoming = next(pending, None)
+
+    day = start_date
+    while day <= end_date:
+        day_occurrences = []
+        bitmap = 0
+        while upcoming is not None and upcoming.date <= day:
+            if upcoming.date == day:
+                day_occurrences.append(upcoming)
+                bitmap |= occupancy.slot_mask(upcoming.start_time, upcoming.end_time)
+            upcoming = next(pending, None)
+
+        yield day, day_occurrences, free_time_slots(room, day, bitmap)
+        day += timedelta(days=1)
+
+
+def free_time_slots(room, date, bitmap):
+    """
+    Free slots within business hours (8 AM to 6 PM) for a day bitmap,
+    skipping gaps shorter than the room's minimum booking duration
+    """
+    available_slots = []
+    for slot_start, slot_end in occupancy.free_runs(bitmap):
+        duration_hours = (datetime.combine(date, slot_end) - datetime.combine(date, slot_start)).total_seconds() / 3600
+        if duration_hours >= room.min_booking_duration:
+            available_slots.append({
+                'start_time': slot_start.strftime('%H:%M'),
+                'end_time': slot_end.strftime('%H:%M'),
+                'duration_hours': duration_hours
+            })
+
+    return available_slots
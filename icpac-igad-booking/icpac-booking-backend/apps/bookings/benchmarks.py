@@ -0,0 +1,292 @@
+"""
+Endpoint benchmarks for ICPAC Booking System
+
+The benchmark management command fills a throwaway test database with
+generate_load_data for each dataset size, then drives the hot booking
+endpoints through the Django test client and records p50/p95 latency and
+query counts per endpoint. Results are compared with the JSON baselines in
+benchmarks/baselines/: an endpoint whose p50 or p95 grew by more than its
+threshold, or which runs more queries than before, is a regression. The tail
+of a few dozen requests is noisy, so p95 gets a looser threshold than p50.
+
+Latencies only compare well with baselines recorded on the same machine and
+database; query counts compare anywhere.
+"""
+import io
+import json
+import math
+import platform
+import random
+import time
+from contextlib import redirect_stdout
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max, Min
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.authentication.models import User
+from apps.rooms.models import Room
+from icpac_booking.querybudget import QueryRecorder
+from .models import Booking
+
+PREFIX = 'bench'
+
+# generate_load_data options of each dataset size
+DATASETS = {
+    'small': {'users': 50, 'rooms': 5, 'amenities': 12, 'bookings': 2000, 'years': 1},
+    'medium': {'users': 200, 'rooms': 20, 'amenities': 12, 'bookings': 20000, 'years': 2},
+    'large': {'users': 500, 'rooms': 50, 'amenities': 12, 'bookings': 50000, 'years': 5},
+}
+
+# Growth of each latency metric flagged as a regression; queries must not grow at all
+DEFAULT_THRESHOLDS = {'p50_ms': 0.25, 'p95_ms': 0.5}
+
+
+def baseline_dir():
+    return settings.BASE_DIR / 'benchmarks' / 'baselines'
+
+
+def dataset_options(name, today=None):
+    """generate_load_data options of a dataset, centred on today"""
+    options = dict(DATASETS[name])
+    today = today or timezone.now().date()
+    start = today - timedelta(days=round(365.25 * options['years'] / 2))
+    options.update(start_date=start.isoformat(), audit_logs=0, login_attempts=0, prefix=PREFIX)
+    return options
+
+
+class BenchmarkContext:
+    """Rooms, users and booked dates of a generated dataset"""
+
+    def __init__(self, prefix=PREFIX):
+        self.today = timezone.now().date()
+        self.rooms = list(
+            Room.objects.filter(name__startswith=f'[{prefix}] ').order_by('id').values_list('id', flat=True)
+        )
+        users = User.objects.filter(username__startswith=f'{prefix}_').order_by('id')
+        self.admin = users.filter(role='super_admin').first()
+        self.user = users.filter(role='user').first()
+        span = Booking.objects.filter(room_id__in=self.rooms).aggregate(first=Min('start_date'), last=Max('end_date'))
+        self.first_day = span['first']
+        self.last_day = span['last']
+
+    def any_day(self, rng, length=0):
+        """Day of the dataset with room for length more days after it"""
+        days = max((self.last_day - self.first_day).days - length, 0)
+        return self.first_day + timedelta(days=rng.randint(0, days))
+
+    def future_day(self, rng):
+        """Day from today to the end of the dataset"""
+        first = max(self.today, self.first_day)
+        return first + timedelta(days=rng.randint(0, max((self.last_day - first).days, 0)))
+
+
+def slot(rng):
+    """Random one or two hour window within office hours, as HH:MM strings"""
+    start = rng.randint(8, 16)
+    end = min(start + rng.randint(1, 2), 18)
+    return f'{start:02d}:00', f'{end:02d}:00'
+
+
+# Each scenario returns (method, path, data, user, expected status) for iteration n
+
+def check_availability(context, rng, n):
+    start_time, end_time = slot(rng)
+    day = context.future_day(rng)
+    return 'post', '/api/bookings/check-availability/', {
+        'room_id': rng.choice(context.rooms),
+        'start_date': str(day),
+        'end_date': str(day),
+        'start_time': start_time,
+        'end_time': end_time,
+    }, None, 200
+
+
+def calendar_events(context, rng, n):
+    day = context.any_day(rng, 30)
+    return 'get', '/api/bookings/calendar/events/', {
+        'start': str(day), 'end': str(day + timedelta(days=30)),
+    }, context.admin, 200
+
+
+def room_schedule(context, rng, n):
+    day = context.any_day(rng, 7)
+    return 'get', f'/api/bookings/room/{rng.choice(context.rooms)}/schedule/', {
+        'start_date': str(day), 'end_date': str(day + timedelta(days=7)),
+    }, None, 200
+
+
+def available_rooms(context, rng, n):
+    start_time, end_time = slot(rng)
+    return 'get', '/api/bookings/available-rooms/', {
+        'date': str(context.any_day(rng)), 'start_time': start_time, 'end_time': end_time,
+    }, None, 200
+
+
+def create_booking(context, rng, n):
+    # Days after the dataset are free, so every request takes the full create path
+    day = context.last_day + timedelta(days=1 + n // len(context.rooms))
+    start_time, end_time = slot(rng)
+    return 'post', '/api/bookings/', {
+        'room': context.rooms[n % len(context.rooms)],
+        'start_date': str(day),
+        'end_date': str(day),
+        'start_time': start_time,
+        'end_time': end_time,
+        'purpose': f'Benchmark booking {n}',
+        'booking_type': 'hourly',
+    }, context.user, 201
+
+
+SCENARIOS = {
+    'check_availability': check_availability,
+    'calendar_events': calendar_events,
+    'get_room_schedule': room_schedule,
+    'available_rooms': available_rooms,
+    'create_booking': create_booking,
+}
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def summarize(timings, queries, errors):
+    return {
+        'iterations': len(timings),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'queries': max(queries),
+        'errors': errors,
+    }
+
+
+def run_scenario(name, context, iterations, warmup=0, seed=0):
+    """Time one scenario; warmup iterations run first and are not recorded"""
+    scenario = SCENARIOS[name]
+    rng = random.Random(f'{seed}:{name}')
+    client = APIClient()
+    timings, queries, errors = [], [], 0
+
+    for n in range(warmup + iterations):
+        method, path, data, user, expected = scenario(context, rng, n)
+        if user is None:
+            client.credentials()
+        else:
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        # Views and the console mail backend print; keep it out of the report
+        with QueryRecorder() as recorder, redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            if method == 'post':
+                response = client.post(path, data, format='json')
+            else:
+                response = client.get(path, data)
+            elapsed = time.perf_counter() - started
+        if n < warmup:
+            continue
+        timings.append(elapsed * 1000)
+        queries.append(recorder.count)
+        if response.status_code != expected:
+            errors += 1
+
+    return summarize(timings, queries, errors)
+
+
+def environment():
+    """Where a result was recorded, stored next to it in the baseline"""
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'machine': platform.machine(),
+        'processor': platform.processor() or platform.machine(),
+    }
+
+
+def load_baseline(dataset, directory=None):
+    path = (directory or baseline_dir()) / f'{dataset}.json'
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def save_baseline(dataset, results, options, directory=None):
+    directory = directory or baseline_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'{dataset}.json'
+    path.write_text(json.dumps({
+        'dataset': dataset,
+        'recorded_at': timezone.now().isoformat(timespec='seconds'),
+        'options': options,
+        'environment': environment(),
+        'endpoints': results,
+    }, indent=2, sort_keys=True) + '\n')
+    return path
+
+
+def compare(dataset, results, baseline, thresholds=None):
+    """
+    Rows comparing results with a baseline. status is 'regression',
+    'improvement', 'ok' or 'new' (no baseline for the endpoint)
+    """
+    thresholds = thresholds or DEFAULT_THRESHOLDS
+    endpoints = (baseline or {}).get('endpoints', {})
+    rows = []
+    for name, current in results.items():
+        before = endpoints.get(name)
+        if before is None:
+            rows.append({'dataset': dataset, 'endpoint': name, 'metric': 'p95_ms',
+                         'baseline': None, 'current': current['p95_ms'], 'change': None, 'status': 'new'})
+            continue
+        for metric, threshold in thresholds.items():
+            change = current[metric] / before[metric] - 1 if before[metric] else 0.0
+            if change > threshold:
+                status = 'regression'
+            elif change < -threshold:
+                status = 'improvement'
+            else:
+                status = 'ok'
+            rows.append({'dataset': dataset, 'endpoint': name, 'metric': metric, 'baseline': before[metric],
+                         'current': current[metric], 'change': change, 'status': status})
+        queries = current['queries'] - before['queries']
+        rows.append({
+            'dataset': dataset, 'endpoint': name, 'metric': 'queries', 'baseline': before['queries'],
+            'current': current['queries'], 'change': queries,
+            'status': 'regression' if queries > 0 else 'improvement' if queries < 0 else 'ok',
+        })
+    return rows
+
+
+def format_report(rows, thresholds=None):
+    """Markdown table of compare() rows"""
+    thresholds = thresholds or DEFAULT_THRESHOLDS
+    limits = ', '.join(f'{metric} +{threshold:.0%}' for metric, threshold in thresholds.items())
+    lines = [
+        f'Regression thresholds: {limits}, any increase in queries',
+        '',
+        '| Dataset | Endpoint | Metric | Baseline | Current | Change | Status |',
+        '|---|---|---|---|---|---|---|',
+    ]
+    for row in rows:
+        if row['change'] is None:
+            change = ''
+        elif row['metric'] == 'queries':
+            change = f"{row['change']:+d}"
+        else:
+            change = f"{row['change']:+.1%}"
+        baseline = '' if row['baseline'] is None else row['baseline']
+        status = f"**{row['status']}**" if row['status'] == 'regression' else row['status']
+        lines.append(
+            f"| {row['dataset']} | {row['endpoint']} | {row['metric']} | {baseline} | "
+            f"{row['current']} | {change} | {status} |"
+        )
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,121 @@
+"""
+Versioned availability cache for ICPAC Booking System
+
+Availability answers are cached under keys that embed a version number: one
+per room for single-room answers and a global one for answers spanning all
+rooms. The Booking and Room signal handlers bump those versions once their
+transaction commits, so a change makes every affected entry unreachable at
+once. Entries are never served stale and need no TTL tuning; superseded
+ones simply age out of the backend.
+
+That only holds when every worker shares the cache. A per-process backend
+(local memory) would keep serving old answers in every worker but the one
+that bumped, so get_or_compute() bypasses it unless
+AVAILABILITY_CACHE_PER_PROCESS says the site runs a single process.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils import timezone
+
+from icpac_booking import metrics
+
+CACHE_PREFIX = 'availability'
+GLOBAL_SCOPE = 'all'
+
+# Backends whose entries and versions live in one process
+PER_PROCESS_BACKENDS = (LocMemCache,)
+
+
+def get_cache():
+    return caches[getattr(settings, 'AVAILABILITY_CACHE_ALIAS', 'default')]
+
+
+def cache_enabled():
+    """Whether version bumps reach every process reading the cache"""
+    if getattr(settings, 'AVAILABILITY_CACHE_PER_PROCESS', False):
+        return True
+    return not isinstance(get_cache(), PER_PROCESS_BACKENDS)
+
+
+def cache_timeout():
+    """How long an entry may sit unused before the backend drops it"""
+    return getattr(settings, 'AVAILABILITY_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def version_key(scope):
+    return f'{CACHE_PREFIX}:version:{scope}'
+
+
+def fresh_version():
+    # Versions restart from the clock, not from 1, so an evicted counter can
+    # never come back to a number that older entries were stored under
+    return time.time_ns()
+
+
+def version(scope):
+    """Current version of a room id or of GLOBAL_SCOPE"""
+    cache = get_cache()
+    current = cache.get(version_key(scope))
+    if current is None:
+        cache.add(version_key(scope), fresh_version(), timeout=None)
+        current = cache.get(version_key(scope))
+    return current
+
+
+def bump(*room_ids):
+    """Invalidate the cached answers of some rooms and every multi-room answer"""
+    cache = get_cache()
+    for scope in {*room_ids, GLOBAL_SCOPE}:
+        if scope is None:
+            continue
+        try:
+            cache.incr(version_key(scope))
+        except ValueError:
+            # Counter missing (never read, or evicted): start a new one
+            cache.set(version_key(scope), fresh_version(), timeout=None)
+
+
+def bump_on_commit(*room_ids):
+    """
+    bump() once the current transaction commits (at once outside of one).
+    A read racing an uncommitted write still sees the old rows; bumping
+    before the commit would let it cache them under the new version.
+    """
+    transaction.on_commit(lambda: bump(*room_ids))
+
+
+def make_key(scope, name, *parts):
+    """Cache key for an answer that depends on scope's version and on parts"""
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+    # Answers depend on what counts as past, so they also expire at midnight
+    today = timezone.now().date().isoformat()
+    return f'{CACHE_PREFIX}:{name}:{scope}:{version(scope)}:{today}:{digest}'
+
+
+def room_key(room_id, name, *parts):
+    return make_key(room_id, name, *parts)
+
+
+def rooms_key(name, *parts):
+    return make_key(GLOBAL_SCOPE, name, *parts)
+
+
+def get_or_compute(key, compute):
+    """Return the cached value for key, computing and storing it on a miss"""
+    if not cache_enabled():
+        metrics.cache_requests.inc(cache=CACHE_PREFIX, result='bypass')
+        return compute()
+    cache = get_cache()
+    value = cache.get(key)
+    if value is None:
+        metrics.cache_requests.inc(cache=CACHE_PREFIX, result='miss')
+        value = compute()
+        cache.set(key, value, cache_timeout())
+    else:
+        metrics.cache_requests.inc(cache=CACHE_PREFIX, result='hit')
+    return value
@@ -0,0 +1,86 @@
+"""
+Database-enforced booking conflict detection for ICPAC Booking System
+
+On PostgreSQL a GiST exclusion constraint on ``booking_occurrences`` rejects
+pending/approved occurrences whose time ranges overlap in the same room, so
+writing a booking's occurrences is itself the conflict check and two
+concurrent requests can no longer both claim a slot.
+"""
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+
+OCCURRENCES_TABLE = 'booking_occurrences'
+OVERLAP_CONSTRAINT = 'booking_occurrences_no_overlap'
+
+# SQLSTATE raised by PostgreSQL for exclusion constraint violations
+EXCLUSION_VIOLATION = '23P01'
+
+
+class BookingConflictError(ValidationError):
+    """Raised when the database rejects a booking that overlaps another one"""
+
+
+def database_conflict_check_enabled():
+    """Whether booking overlaps are enforced by the exclusion constraint"""
+    return (
+        getattr(settings, 'BOOKING_DB_CONFLICT_CHECK', False)
+        and connection.vendor == 'postgresql'
+    )
+
+
+def is_overlap_violation(exc):
+    """Check if an IntegrityError comes from the booking overlap constraint"""
+    cause = exc.__cause__
+    # psycopg2 exposes pgcode, psycopg 3 exposes sqlstate
+    code = getattr(cause, 'pgcode', None) or getattr(cause, 'sqlstate', None)
+    return code == EXCLUSION_VIOLATION or OVERLAP_CONSTRAINT in str(exc)
+
+
+def reserve_occurrences(booking, occurrences):
+    """
+    Insert the occurrences of a booking.
+    Raises BookingConflictError if the exclusion constraint rejects any of them.
+    """
+    if not occurrences:
+        return
+
+    try:
+        with transaction.atomic():
+            type(occurrences[0]).objects.bulk_create(occurrences)
+    except IntegrityError as exc:
+        if not is_overlap_violation(exc):
+            raise
+        raise BookingConflictError({
+            'start_time': f'Time slot conflicts with existing booking: {conflicting_purpose(booking)}'
+        }) from exc
+
+
+def conflicting_purpose(booking):
+    """Look up the purpose of the booking that holds an overlapping occurrence"""
+    from .models import BookingOccurrence
+
+    conflict = BookingOccurrence.overlapping(
+        booking.room_id, booking.occurrence_dates(), booking.start_time, booking.end_time,
+        exclude_booking=booking.pk
+    ).values_list('booking__purpose', flat=True).first()
+    return conflict or 'another booking'
+
+
+def overlapping_bookings(cursor):
+    """
+    (booking_id, other_booking_id) pairs of active bookings holding
+    overlapping times in the same room, each pair once with the older id first
+    """
+    cursor.execute(f"""
+        SELECT DISTINCT a.booking_id, b.booking_id
+        FROM {OCCURRENCES_TABLE} a
+        JOIN {OCCURRENCES_TABLE} b
+            ON b.room_id = a.room_id AND b.date = a.date AND b.booking_id > a.booking_id
+            AND b.start_time < a.end_time AND a.start_time < b.end_time
+        WHERE a.approval_status IN ('pending', 'approved')
+            AND b.approval_status IN ('pending', 'approved')
+            AND a.start_time < a.end_time AND b.start_time < b.end_time
+        ORDER BY a.booking_id, b.booking_id
+    """)
+    return cursor.fetchall()
@@ -8,12 +8,35 @@ from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import UntypedToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from django.conf import settings
+from icpac_booking import fastjson, metrics
 import jwt
 
 User = get_user_model()
 
 
-class BookingConsumer(AsyncWebsocketConsumer):
+class MeasuredConsumerMixin:
+    """
+    Joins and leaves the consumer's group through the channel layer, timing
+    each call and keeping the open connection gauge per consumer class
+    """
+
+    async def join_group(self):
+        consumer = type(self).__name__
+        with metrics.channel_layer_latency.time(operation='group_add', consumer=consumer):
+            await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        metrics.websocket_connections.inc(consumer=consumer)
+
+    async def leave_group(self):
+        # Connections rejected before authentication never joined a group
+        if not hasattr(self, 'room_group_name'):
+            return
+        consumer = type(self).__name__
+        with metrics.channel_layer_latency.time(operation='group_discard', consumer=consumer):
+            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        metrics.websocket_connections.dec(consumer=consumer)
+
+
+class BookingConsumer(MeasuredConsumerMixin, AsyncWebsocketConsumer):
     """
     WebSocket consumer for real-time booking updates
     """
@@ -41,15 +64,11 @@ class BookingConsumer(AsyncWebsocketConsumer):
                 self.room_group_name = 'booking_updates'
                 
                 # Only authenticated users can join groups
-                await self.channel_layer.group_add(
-                    self.room_group_name,
-                    self.channel_name
-                )
-                
+                await self.join_group()
                 await self.accept()
                 
                 # Send authentication success message
-                await self.send(text_data=json.dumps({
+                await self.send(text_data=fastjson.dumps({
                     'type': 'auth_success',
                     'message': 'Authenticated and connected'
                 }))
@@ -61,16 +80,13 @@ class BookingConsumer(AsyncWebsocketConsumer):
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection"""
         # Leave room group
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        await self.leave_group()
     
     async def receive(self, text_data):
         """Receive message from WebSocket (only from authenticated users)"""
         # Check if user is authenticated
         if not hasattr(self, 'user') or not self.user:
-            await self.send(text_data=json.dumps({
+            await self.send(text_data=fastjson.dumps({
                 'type': 'error',
                 'message': 'Authentication required'
             }))
@@ -78,39 +94,39 @@ class BookingConsumer(AsyncWebsocketConsumer):
             return
             
         try:
-            text_data_json = json.loads(text_data)
+            text_data_json = fastjson.loads(text_data)
             message_type = text_data_json.get('type')
             
             if message_type == 'ping':
                 # Handle ping for connection keep-alive
-                await self.send(text_data=json.dumps({
+                await self.send(text_data=fastjson.dumps({
                     'type': 'pong',
                     'timestamp': text_data_json.get('timestamp')
                 }))
                 
         except json.JSONDecodeError:
-            await self.send(text_data=json.dumps({
+            await self.send(text_data=fastjson.dumps({
                 'type': 'error',
                 'message': 'Invalid JSON format'
             }))
     
     async def booking_update(self, event):
         """Send booking update to WebSocket"""
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=fastjson.dumps({
             'type': 'booking_update',
             'data': event['data']
         }))
     
     async def room_availability_update(self, event):
         """Send room availability update to WebSocket"""
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=fastjson.dumps({
             'type': 'room_availability_update',
             'data': event['data']
         }))
     
     async def booking_status_change(self, event):
         """Send booking status change to WebSocket"""
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=fastjson.dumps({
             'type': 'booking_status_change',
             'data': event['data']
         }))
@@ -140,7 +156,7 @@ class BookingConsumer(AsyncWebsocketConsumer):
         return None
 
 
-class RoomConsumer(AsyncWebsocketConsumer):
+class RoomConsumer(MeasuredConsumerMixin, AsyncWebsocketConsumer):
     """
     WebSocket consumer for real-time room updates
     """
@@ -168,11 +184,7 @@ class RoomConsumer(AsyncWebsocketConsumer):
                 self.room_group_name = f'room_{self.room_id}'
                 
                 # Only authenticated users can join room groups
-                await self.channel_layer.group_add(
-                    self.room_group_name,
-                    self.channel_name
-                )
-                
+                await self.join_group()
                 await self.accept()
                 return
         
@@ -182,34 +194,31 @@ class RoomConsumer(AsyncWebsocketConsumer):
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection"""
         # Leave room group
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        await self.leave_group()
     
     async def receive(self, text_data):
         """Receive message from WebSocket"""
         try:
-            text_data_json = json.loads(text_data)
+            text_data_json = fastjson.loads(text_data)
             message_type = text_data_json.get('type')
             
             if message_type == 'request_availability':
                 # Send current room availability
                 availability_data = await self.get_room_availability()
-                await self.send(text_data=json.dumps({
+                await self.send(text_data=fastjson.dumps({
                     'type': 'room_availability',
                     'data': availability_data
                 }))
                 
         except json.JSONDecodeError:
-            await self.send(text_data=json.dumps({
+            await self.send(text_data=fastjson.dumps({
                 'type': 'error',
                 'message': 'Invalid JSON format'
             }))
     
     async def room_booking_update(self, event):
         """Send room booking update to WebSocket"""
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=fastjson.dumps({
             'type': 'room_booking_update',
             'data': event['data']
         }))
@@ -217,18 +226,30 @@ class RoomConsumer(AsyncWebsocketConsumer):
     @database_sync_to_async
     def get_room_availability(self):
         """Get current room availability"""
-        from .models import Booking
+        from .models import BookingOccurrence
         from datetime import datetime, timedelta
         from django.utils import timezone
         
         # Get today's bookings for this room
         today = timezone.now().date()
-        bookings = Booking.objects.filter(
+        occurrences = BookingOccurrence.objects.filter(
             room_id=self.room_id,
-            start_date__lte=today,
-            end_date__gte=today,
+            date=today,
             approval_status='approved'
-        ).values('start_time', 'end_time', 'purpose', 'user__first_name', 'user__last_name')
+        ).values_list(
+            'start_time', 'end_time', 'booking__purpose',
+            'booking__user__first_name', 'booking__user__last_name'
+        )
+        bookings = [
+            {
+                'start_time': start_time,
+                'end_time': end_time,
+                'purpose': purpose,
+                'user__first_name': first_name,
+                'user__last_name': last_name
+            }
+            for start_time, end_time, purpose, first_name, last_name in occurrences
+        ]
         
         return {
             'room_id': self.room_id,
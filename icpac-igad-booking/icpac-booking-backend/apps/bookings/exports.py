@@ -0,0 +1,140 @@
+"""
+Streaming booking exports for ICPAC Booking System
+
+Bookings are read with a values() projection (room and user columns come
+from the same query) and iterated in chunks, so an export of several years
+holds one chunk in memory at a time and starts sending before it finishes.
+XLSX is the exception: a workbook is a zip archive that is only readable once
+complete, so it is built on disk first and capped at
+BOOKING_EXPORT_XLSX_MAX_ROWS rows; larger exports must use CSV or NDJSON.
+"""
+import csv
+import json
+import tempfile
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+# (column header, NDJSON key, values() field)
+EXPORT_COLUMNS = [
+    ('ID', 'id', 'id'),
+    ('Room', 'room', 'room__name'),
+    ('User', 'user', 'user_name'),
+    ('User Email', 'user_email', 'user__email'),
+    ('Purpose', 'purpose', 'purpose'),
+    ('Booking Type', 'booking_type', 'booking_type'),
+    ('Start Date', 'start_date', 'start_date'),
+    ('End Date', 'end_date', 'end_date'),
+    ('Start Time', 'start_time', 'start_time'),
+    ('End Time', 'end_time', 'end_time'),
+    ('Attendees', 'expected_attendees', 'expected_attendees'),
+    ('Status', 'approval_status', 'approval_status'),
+    ('Created At', 'created_at', 'created_at'),
+]
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+class ExportError(Exception):
+    """Raised when an export cannot be produced in the requested format"""
+
+
+class Echo:
+    """File-like object whose write() hands the written line back to the caller"""
+
+    def write(self, value):
+        return value
+
+
+def chunk_size():
+    """Rows fetched from the database per round trip"""
+    return getattr(settings, 'BOOKING_EXPORT_CHUNK_SIZE', 2000)
+
+
+def xlsx_max_rows():
+    """Most bookings an XLSX export may hold"""
+    return getattr(settings, 'BOOKING_EXPORT_XLSX_MAX_ROWS', 50000)
+
+
+def export_rows(queryset):
+    """Yield one dict per booking, keyed by the values() fields of EXPORT_COLUMNS"""
+    fields = [field for _, _, field in EXPORT_COLUMNS if field != 'user_name']
+    rows = queryset.order_by('start_date', 'start_time', 'id').values(
+        *fields, 'user__first_name', 'user__last_name'
+    )
+    for row in rows.iterator(chunk_size=chunk_size()):
+        first_name = row.pop('user__first_name')
+        last_name = row.pop('user__last_name')
+        row['user_name'] = f'{first_name} {last_name}'.strip()
+        if row['created_at'] is not None:
+            row['created_at'] = timezone.localtime(row['created_at'])
+        yield row
+
+
+def stream_csv(queryset):
+    writer = csv.writer(Echo())
+    yield writer.writerow([header for header, _, _ in EXPORT_COLUMNS])
+    for row in export_rows(queryset):
+        yield writer.writerow([row[field] for _, _, field in EXPORT_COLUMNS])
+
+
+def stream_ndjson(queryset):
+    for row in export_rows(queryset):
+        record = {key: row[field] for _, key, field in EXPORT_COLUMNS}
+        yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
+
+
+def build_xlsx(queryset):
+    """
+    Write the workbook with openpyxl's write-only mode into a temporary file.
+    XLSX is a zip archive, so it is streamed from disk once complete.
+    Raises ExportError above xlsx_max_rows() bookings.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError as exc:
+        raise ExportError('XLSX export requires the openpyxl package.') from exc
+
+    limit = xlsx_max_rows()
+    if queryset.order_by()[:limit + 1].count() > limit:
+        raise ExportError(
+            f'XLSX exports are limited to {limit} bookings. Narrow the filters or use csv or ndjson.'
+        )
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Bookings')
+    sheet.append([header for header, _, _ in EXPORT_COLUMNS])
+    for row in export_rows(queryset):
+        if row['created_at'] is not None:
+            # Excel has no time zones
+            row['created_at'] = row['created_at'].replace(tzinfo=None)
+        sheet.append([row[field] for _, _, field in EXPORT_COLUMNS])
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+def export_response(queryset, export_format):
+    """Build a streaming download of the bookings in queryset"""
+    if export_format not in EXPORT_FORMATS:
+        raise ExportError(f"Unsupported export format '{export_format}'. Use csv, ndjson or xlsx.")
+
+    filename = f"bookings-{timezone.now().strftime('%Y%m%d-%H%M')}.{export_format}"
+    content_type = EXPORT_FORMATS[export_format]
+
+    if export_format == 'xlsx':
+        return FileResponse(build_xlsx(queryset), as_attachment=True,
+                            filename=filename, content_type=content_type)
+
+    stream = stream_csv(queryset) if export_format == 'csv' else stream_ndjson(queryset)
+    response = StreamingHttpResponse(stream, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
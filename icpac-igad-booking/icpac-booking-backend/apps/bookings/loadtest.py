@@ -0,0 +1,503 @@
+"""
+Load testing for ICPAC Booking System
+
+The load_test management command drives a running server (runserver, daphne
+or uvicorn) with virtual users that follow the real booking flow: log in
+through CustomTokenObtainPairView, browse the room list, open the
+ws/bookings/ WebSocket, then loop over polling the calendar, checking
+availability and, for a share of free slots, creating a booking. Users start
+at --spawn-rate until --users are active, like the 9am Monday rush.
+
+Everything runs on asyncio and the standard library: each virtual user holds
+one keep-alive HTTP/1.1 connection and one WebSocket, as a browser tab does,
+so no external load-testing service or client library is needed. The report
+gives throughput, p50/p95/p99 latency, error rates and the response statuses
+of each operation.
+
+Virtual users log in as the accounts made by generate_load_data
+(<prefix>.user00001@icpac.net ...), so run it against that data.
+"""
+import asyncio
+import base64
+import json
+import os
+import random
+import ssl
+import struct
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+from urllib.parse import urlencode, urlsplit
+
+from django.utils import timezone
+
+from .benchmarks import percentile, slot
+
+# Response statuses counted as success; a 400 on create is a slot taken
+# between the availability check and the booking, which real users hit too
+EXPECTED_STATUSES = {
+    'login': (200,),
+    'browse_rooms': (200,),
+    'ws_connect': (101,),
+    'ws_ping': ('pong',),
+    'calendar_events': (200,),
+    'check_availability': (200,),
+    'create_booking': (201, 400),
+}
+
+# Days ahead in which virtual users look for a free slot
+BOOKING_HORIZON_DAYS = 30
+
+
+async def read_head(reader):
+    """Status code and lower-cased headers of an HTTP response"""
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ', 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    return status, headers
+
+
+async def read_body(reader, status, headers):
+    if status in (204, 304) or status < 200:
+        return b''
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                # Trailers end with an empty line
+                while (await reader.readline()) not in (b'\r\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+    if 'content-length' in headers:
+        return await reader.readexactly(int(headers['content-length']))
+    return await reader.read()
+
+
+def open_stream(url):
+    parts = urlsplit(url)
+    secure = parts.scheme in ('https', 'wss')
+    return asyncio.open_connection(
+        parts.hostname,
+        parts.port or (443 if secure else 80),
+        ssl=ssl.create_default_context() if secure else None,
+    )
+
+
+class HTTPConnection:
+    """One keep-alive HTTP/1.1 connection, reopened when the server closes it"""
+
+    def __init__(self, url):
+        self.url = url
+        self.host = urlsplit(url).netloc
+        self.reader = self.writer = None
+
+    async def request(self, method, path, data=None, token=None):
+        """(status, body) of a request with an optional JSON body"""
+        reused = self.writer is not None
+        try:
+            return await self.send(method, path, data, token)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.close()
+            # The server may drop an idle keep-alive connection before reading the request
+            if not reused:
+                raise
+        return await self.send(method, path, data, token)
+
+    async def send(self, method, path, data, token):
+        if self.writer is None:
+            self.reader, self.writer = await open_stream(self.url)
+        body = json.dumps(data).encode() if data is not None else b''
+        lines = [
+            f'{method} {path} HTTP/1.1',
+            f'Host: {self.host}',
+            'Accept: application/json',
+            f'Content-Length: {len(body)}',
+        ]
+        if data is not None:
+            lines.append('Content-Type: application/json')
+        if token:
+            lines.append(f'Authorization: Bearer {token}')
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + body)
+        await self.writer.drain()
+
+        status, headers = await read_head(self.reader)
+        content = await read_body(self.reader, status, headers)
+        if headers.get('connection', '').lower() == 'close' or (
+            'content-length' not in headers and 'chunked' not in headers.get('transfer-encoding', '')
+        ):
+            self.close()
+        return status, content
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def encode_frame(opcode, payload):
+    """Masked, unfragmented client frame"""
+    mask = os.urandom(4)
+    length = len(payload)
+    if length < 126:
+        head = struct.pack('!BB', 0x80 | opcode, 0x80 | length)
+    elif length < 1 << 16:
+        head = struct.pack('!BBH', 0x80 | opcode, 0x80 | 126, length)
+    else:
+        head = struct.pack('!BBQ', 0x80 | opcode, 0x80 | 127, length)
+    return head + mask + bytes(byte ^ mask[n % 4] for n, byte in enumerate(payload))
+
+
+async def read_frame(reader):
+    """(fin, opcode, payload) of the next frame"""
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack('!H', await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', await reader.readexactly(8))[0]
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = bytes(byte ^ mask[n % 4] for n, byte in enumerate(payload))
+    return bool(first & 0x80), first & 0x0F, payload
+
+
+class WebSocket:
+    """Minimal RFC 6455 client for text messages"""
+
+    TEXT, CLOSE, PING, PONG = 0x1, 0x8, 0x9, 0xA
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, url, path):
+        """Open the connection; ConnectionError unless the server switches protocols"""
+        reader, writer = await open_stream(url)
+        key = base64.b64encode(os.urandom(16)).decode()
+        writer.write((
+            f'GET {path} HTTP/1.1\r\n'
+            f'Host: {urlsplit(url).netloc}\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            f'Sec-WebSocket-Key: {key}\r\n'
+            'Sec-WebSocket-Version: 13\r\n\r\n'
+        ).encode())
+        await writer.drain()
+        status, headers = await read_head(reader)
+        if status != 101:
+            writer.close()
+            raise ConnectionError(f'WebSocket handshake returned {status}')
+        return cls(reader, writer)
+
+    async def send(self, message):
+        self.writer.write(encode_frame(self.TEXT, json.dumps(message).encode()))
+        await self.writer.drain()
+
+    async def receive(self):
+        """Next JSON message, or None once the server closes the connection"""
+        parts = []
+        while True:
+            fin, opcode, payload = await read_frame(self.reader)
+            if opcode == self.CLOSE:
+                return None
+            if opcode == self.PING:
+                self.writer.write(encode_frame(self.PONG, payload))
+                continue
+            if opcode == self.PONG:
+                continue
+            parts.append(payload)
+            if fin:
+                return json.loads(b''.join(parts))
+
+    async def close(self):
+        try:
+            self.writer.write(encode_frame(self.CLOSE, struct.pack('!H', 1000)))
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+        self.writer.close()
+
+
+class Stats:
+    """Latencies and statuses of every operation during a run"""
+
+    def __init__(self):
+        self.timings = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+        self.messages = Counter()
+        self.active_users = 0
+        self.peak_users = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, operation, elapsed, status):
+        self.timings[operation].append(elapsed * 1000)
+        self.statuses[operation][status] += 1
+        if status not in EXPECTED_STATUSES[operation]:
+            self.errors[operation] += 1
+
+    def user_started(self):
+        self.active_users += 1
+        self.peak_users = max(self.peak_users, self.active_users)
+
+    def user_finished(self):
+        self.active_users -= 1
+
+    def summary(self):
+        duration = (self.finished or time.perf_counter()) - self.started
+        operations = {}
+        for operation in EXPECTED_STATUSES:
+            timings = self.timings.get(operation)
+            if not timings:
+                continue
+            operations[operation] = summarize(
+                timings, self.errors[operation], duration, self.statuses[operation]
+            )
+        all_timings = [value for timings in self.timings.values() for value in timings]
+        total = summarize(all_timings, sum(self.errors.values()), duration, Counter()) if all_timings else None
+        return {
+            'duration_s': round(duration, 1),
+            'peak_users': self.peak_users,
+            'operations': operations,
+            'total': total,
+            'websocket_messages': dict(self.messages),
+        }
+
+
+def summarize(timings, errors, duration, statuses):
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'error_rate': round(errors / len(timings), 4),
+        'throughput_rps': round(len(timings) / duration, 2) if duration else 0.0,
+        'p50_ms': round(percentile(timings, 50), 1),
+        'p95_ms': round(percentile(timings, 95), 1),
+        'p99_ms': round(percentile(timings, 99), 1),
+        'max_ms': round(max(timings), 1),
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+    }
+
+
+class LoadTest:
+    """
+    Runs virtual users against url. users start at spawn_rate per second and
+    keep going until duration seconds after the first one started.
+    """
+
+    def __init__(self, url, users=50, spawn_rate=10.0, duration=60.0, think_time=2.0, create_ratio=0.1,
+                 websocket=True, prefix='load', password='LoadTest-pass-1', accounts=500, timeout=30.0, seed=42):
+        self.url = url.rstrip('/')
+        self.users = users
+        self.spawn_rate = spawn_rate
+        self.duration = duration
+        self.think_time = think_time
+        self.create_ratio = create_ratio
+        self.websocket = websocket
+        self.prefix = prefix
+        self.password = password
+        self.accounts = accounts
+        self.timeout = timeout
+        self.seed = seed
+        self.stats = Stats()
+
+    def run(self):
+        """Run to the end and return Stats.summary()"""
+        asyncio.run(self.run_users())
+        return self.stats.summary()
+
+    async def run_users(self):
+        self.stats = Stats()
+        deadline = time.perf_counter() + self.duration
+        tasks = []
+        for number in range(self.users):
+            if time.perf_counter() >= deadline:
+                break
+            tasks.append(asyncio.create_task(VirtualUser(self, number).run(deadline)))
+            await asyncio.sleep(1 / self.spawn_rate)
+        await asyncio.gather(*tasks)
+        self.stats.finished = time.perf_counter()
+
+
+class VirtualUser:
+    """One person at a browser: a login, the room list, then the booking loop"""
+
+    def __init__(self, load_test, number):
+        self.test = load_test
+        self.stats = load_test.stats
+        self.rng = random.Random(f'{load_test.seed}:{number}')
+        self.email = f'{load_test.prefix}.user{number % load_test.accounts + 1:05d}@icpac.net'
+        self.http = HTTPConnection(load_test.url)
+        self.token = None
+        self.socket = None
+        self.pings = {}
+        self.sent = 0
+
+    async def run(self, deadline):
+        self.stats.user_started()
+        listener = None
+        try:
+            if not await self.login():
+                return
+            rooms = await self.browse_rooms()
+            if self.test.websocket and await self.open_websocket():
+                listener = asyncio.create_task(self.listen())
+            while time.perf_counter() < deadline:
+                await self.poll_calendar()
+                if rooms:
+                    await self.book(self.rng.choice(rooms))
+                if listener is not None and not listener.done():
+                    await self.ping()
+                await asyncio.sleep(self.test.think_time * self.rng.uniform(0.5, 1.5))
+        finally:
+            if listener is not None:
+                listener.cancel()
+            if self.socket is not None:
+                await self.socket.close()
+            self.http.close()
+            self.stats.user_finished()
+
+    async def call(self, operation, method, path, data=None):
+        """Timed request; the decoded JSON body, or None when it failed"""
+        started = time.perf_counter()
+        try:
+            status, content = await asyncio.wait_for(
+                self.http.request(method, path, data, self.token), self.test.timeout
+            )
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as error:
+            # Connection refused, reset or timed out: counted under the exception's name
+            self.http.close()
+            self.stats.record(operation, time.perf_counter() - started, type(error).__name__)
+            return None
+        self.stats.record(operation, time.perf_counter() - started, status)
+        if status not in EXPECTED_STATUSES[operation] or not 200 <= status < 300:
+            return None
+        try:
+            return json.loads(content) if content else {}
+        except ValueError:
+            return None
+
+    async def login(self):
+        data = await self.call('login', 'POST', '/api/auth/login/', {
+            'email': self.email, 'password': self.test.password,
+        })
+        if data is None or 'access' not in data:
+            return False
+        self.token = data['access']
+        return True
+
+    async def browse_rooms(self):
+        """Ids of every active room, walking the paginated list"""
+        rooms = []
+        path = '/api/rooms/'
+        while path:
+            data = await self.call('browse_rooms', 'GET', path)
+            if data is None:
+                break
+            rooms += [room['id'] for room in data.get('results', [])]
+            following = urlsplit(data['next']) if data.get('next') else None
+            path = f'{following.path}?{following.query}' if following else None
+        return rooms
+
+    async def open_websocket(self):
+        started = time.perf_counter()
+        path = '/ws/bookings/?' + urlencode({'token': self.token})
+        url = self.test.url.replace('http', 'ws', 1)
+        try:
+            self.socket = await asyncio.wait_for(WebSocket.connect(url, path), self.test.timeout)
+            # The consumer confirms the token before anything else
+            message = await asyncio.wait_for(self.socket.receive(), self.test.timeout)
+            if not message or message.get('type') != 'auth_success':
+                raise ConnectionError('WebSocket authentication failed')
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as error:
+            if self.socket is not None:
+                self.socket.writer.close()
+            self.socket = None
+            self.stats.record('ws_connect', time.perf_counter() - started, type(error).__name__)
+            return False
+        self.stats.record('ws_connect', time.perf_counter() - started, 101)
+        return True
+
+    async def listen(self):
+        """Count server messages and time ping round trips"""
+        try:
+            while True:
+                message = await self.socket.receive()
+                if message is None:
+                    break
+                self.stats.messages[message.get('type', 'unknown')] += 1
+                started = self.pings.pop(message.get('timestamp'), None)
+                if message.get('type') == 'pong' and started is not None:
+                    self.stats.record('ws_ping', time.perf_counter() - started, 'pong')
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            pass
+
+    async def ping(self):
+        # The consumer echoes the timestamp back in its pong
+        self.sent += 1
+        self.pings[self.sent] = time.perf_counter()
+        try:
+            await self.socket.send({'type': 'ping', 'timestamp': self.sent})
+        except OSError:
+            self.pings.pop(self.sent, None)
+
+    async def poll_calendar(self):
+        today = timezone.now().date()
+        await self.call('calendar_events', 'GET', '/api/bookings/calendar/events/?' + urlencode({
+            'start': str(today), 'end': str(today + timedelta(days=BOOKING_HORIZON_DAYS)),
+        }))
+
+    async def book(self, room):
+        day = timezone.now().date() + timedelta(days=self.rng.randint(0, BOOKING_HORIZON_DAYS))
+        start_time, end_time = slot(self.rng)
+        request = {
+            'start_date': str(day),
+            'end_date': str(day),
+            'start_time': start_time,
+            'end_time': end_time,
+        }
+        answer = await self.call('check_availability', 'POST', '/api/bookings/check-availability/', {
+            'room_id': room, **request,
+        })
+        if not answer or not answer.get('available') or self.rng.random() >= self.test.create_ratio:
+            return
+        await self.call('create_booking', 'POST', '/api/bookings/', {
+            'room': room,
+            'purpose': f'Load test booking ({self.email})',
+            'booking_type': 'hourly',
+            **request,
+        })
+
+
+def format_report(summary):
+    """Markdown table of a LoadTest.run() summary"""
+    lines = [
+        f"Duration: {summary['duration_s']} s, peak virtual users: {summary['peak_users']}",
+        '',
+        '| Operation | Requests | Errors | Error rate | Req/s | p50 ms | p95 ms | p99 ms | Max ms | Statuses |',
+        '|---|---|---|---|---|---|---|---|---|---|',
+    ]
+    rows = list(summary['operations'].items())
+    if summary['total']:
+        rows.append(('**total**', summary['total']))
+    for operation, row in rows:
+        statuses = ', '.join(f'{status}: {count}' for status, count in row['statuses'].items())
+        lines.append(
+            f"| {operation} | {row['requests']} | {row['errors']} | {row['error_rate']:.2%} | "
+            f"{row['throughput_rps']} | {row['p50_ms']} | {row['p95_ms']} | {row['p99_ms']} | "
+            f"{row['max_ms']} | {statuses} |"
+        )
+    if summary['websocket_messages']:
+        received = ', '.join(f'{kind}: {count}' for kind, count in sorted(summary['websocket_messages'].items()))
+        lines += ['', f'WebSocket messages received: {received}']
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,111 @@
+import io
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from apps.bookings import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the hot booking endpoints on generated datasets and compare with the stored baselines'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dataset',
+            action='append',
+            choices=sorted(benchmarks.DATASETS),
+            help='Dataset size to run (repeatable); default: all'
+        )
+        parser.add_argument(
+            '--endpoint',
+            action='append',
+            choices=sorted(benchmarks.SCENARIOS),
+            help='Endpoint to run (repeatable); default: all'
+        )
+        parser.add_argument('--iterations', type=int, default=50, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per endpoint first')
+        parser.add_argument('--seed', type=int, default=42, help='Seed of the dataset and the request parameters')
+        parser.add_argument(
+            '--threshold', type=float, default=benchmarks.DEFAULT_THRESHOLDS['p50_ms'],
+            help='p50 latency growth flagged as a regression (0.25 = 25%%)'
+        )
+        parser.add_argument(
+            '--p95-threshold', type=float, default=benchmarks.DEFAULT_THRESHOLDS['p95_ms'],
+            help='p95 latency growth flagged as a regression'
+        )
+        parser.add_argument('--baseline-dir', help='Directory of the JSON baselines (default: benchmarks/baselines)')
+        parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baselines')
+        parser.add_argument('--report', help='Also write the comparison report (Markdown) to this file')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Exit with an error when a regression is found')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1.')
+        datasets = options['dataset'] or list(benchmarks.DATASETS)
+        directory = Path(options['baseline_dir']) if options['baseline_dir'] else benchmarks.baseline_dir()
+        thresholds = {'p50_ms': options['threshold'], 'p95_ms': options['p95_threshold']}
+
+        rows = []
+        # As in production: DEBUG would also record every query in memory
+        setup_test_environment(debug=False)
+        try:
+            for dataset in datasets:
+                results, dataset_options = self.run_dataset(dataset, options)
+                rows += benchmarks.compare(
+                    dataset, results, benchmarks.load_baseline(dataset, directory), thresholds
+                )
+                if options['save_baseline']:
+                    path = benchmarks.save_baseline(dataset, results, dataset_options, directory)
+                    self.stdout.write(self.style.SUCCESS(f'✓ Saved baseline {path}'))
+        finally:
+            teardown_test_environment()
+
+        report = benchmarks.format_report(rows, thresholds)
+        self.stdout.write('\n' + report)
+        if options['report']:
+            Path(options['report']).write_text(report)
+            self.stdout.write(self.style.SUCCESS(f'✓ Wrote report to {options["report"]}'))
+
+        regressions = [row for row in rows if row['status'] == 'regression']
+        if regressions and options['fail_on_regression'] and not options['save_baseline']:
+            raise CommandError(f'{len(regressions)} benchmark regression(s) beyond the threshold.')
+        self.stdout.write(self.style.SUCCESS('\n✅ Benchmarks complete!'))
+
+    def run_dataset(self, dataset, options):
+        """Generate a dataset in a fresh test database and run the endpoints on it"""
+        dataset_options = benchmarks.dataset_options(dataset)
+        self.stdout.write(f'\n{dataset}: generating {dataset_options["bookings"]} bookings...')
+
+        # A private cache and synchronous audit writes keep the run isolated and repeatable
+        with override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            AUDIT_LOG_ASYNC=False,
+            LOG_API_REQUESTS=False,
+            QUERY_BUDGET_ENABLED=False,
+            PROFILING_ENABLED=False,
+            METRICS_DIR='',
+        ):
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                # clear: SQLite keeps an in-memory test database alive between datasets
+                call_command(
+                    'generate_load_data', seed=options['seed'], clear=True, stdout=io.StringIO(), **dataset_options
+                )
+                context = benchmarks.BenchmarkContext()
+                results = {}
+                for name in options['endpoint'] or benchmarks.SCENARIOS:
+                    results[name] = benchmarks.run_scenario(
+                        name, context, options['iterations'], options['warmup'], options['seed']
+                    )
+                    summary = results[name]
+                    line = (f'{name}: p50 {summary["p50_ms"]} ms, p95 {summary["p95_ms"]} ms, '
+                            f'{summary["queries"]} queries')
+                    if summary['errors']:
+                        self.stdout.write(self.style.WARNING(f'! {line}, {summary["errors"]} unexpected responses'))
+                    else:
+                        self.stdout.write(self.style.SUCCESS(f'✓ {line}'))
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+        return results, dataset_options
@@ -0,0 +1,426 @@
+import random
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models.signals import post_delete
+from django.utils import timezone
+from apps.authentication.models import User
+from apps.bookings import cache as availability_cache
+from apps.bookings import recurrence
+from apps.bookings.models import Booking, BookingOccurrence, RoomOccupancy, RoomUsageDaily
+from apps.bookings.signals import booking_deleted
+from apps.rooms.models import Room, RoomAmenity
+from apps.security import partitions
+from apps.security.models import AuditLog, LoginAttempt
+
+# Bookings are placed on a grid of 30-minute slots from 08:00 to 18:00
+DAY_START = 8
+SLOT_MINUTES = 30
+SLOTS_PER_DAY = 20
+
+BOOKING_TYPE_WEIGHTS = {
+    'hourly': 70,
+    'full_day': 8,
+    'multi_day': 10,
+    'weekly': 4,
+    'recurring': 8,
+}
+STATUS_WEIGHTS = {
+    'approved': 65,
+    'pending': 15,
+    'rejected': 10,
+    'cancelled': 10,
+}
+CATEGORY_CAPACITIES = {
+    'meeting': (6, 20),
+    'boardroom': (10, 30),
+    'conference': (40, 200),
+    'training': (15, 40),
+    'event_hall': (100, 400),
+    'auditorium': (150, 500),
+    'other': (4, 50),
+}
+AMENITY_NAMES = [
+    'Projector', 'Whiteboard', 'Video Conferencing', 'Audio System', 'TV Screen',
+    'Screen', 'Computers', 'Internet Access', 'Printers', 'Air Conditioning',
+    'Natural Light', 'Catering Setup',
+]
+DEPARTMENTS = ['Climate Services', 'ICT', 'Finance', 'Administration', 'Research', 'Capacity Building']
+PURPOSES = [
+    'Team meeting', 'Project review', 'Training session', 'Workshop', 'Board meeting',
+    'Climate outlook forum', 'Interview', 'Planning session', 'Partner briefing', 'Seminar',
+]
+AUDIT_ACTION_WEIGHTS = {
+    'user_login': 30,
+    'user_logout': 15,
+    'booking_create': 20,
+    'booking_update': 8,
+    'booking_cancel': 5,
+    'booking_approve': 10,
+    'booking_reject': 3,
+    'user_profile_update': 3,
+    'room_update': 1,
+    'other': 5,
+}
+LOGIN_ATTEMPT_WEIGHTS = {
+    'success': 80,
+    'failed_password': 14,
+    'failed_user': 4,
+    'failed_otp': 1,
+    'blocked': 1,
+}
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/126.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 14_5) Safari/605.1.15',
+    'Mozilla/5.0 (X11; Linux x86_64) Firefox/127.0',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) Mobile/15E148',
+]
+
+
+@contextmanager
+def keep_given_timestamps(*fields):
+    """Let bulk_create store the given values of auto_now/auto_now_add fields"""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def slot_time(slot):
+    minutes = DAY_START * 60 + slot * SLOT_MINUTES
+    return time(minutes // 60, minutes % 60)
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic users, rooms, bookings and security logs for load and benchmark testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed and options give the same data')
+        parser.add_argument('--users', type=int, default=500, help='Number of users')
+        parser.add_argument('--rooms', type=int, default=50, help='Number of rooms')
+        parser.add_argument('--amenities', type=int, default=12, help='Number of amenities')
+        parser.add_argument('--bookings', type=int, default=50000, help='Number of bookings')
+        parser.add_argument('--years', type=int, default=5, help='Years of bookings, starting at --start-date')
+        parser.add_argument(
+            '--start-date',
+            help='First booking day (YYYY-MM-DD); by default 1 January, so the span ends this year'
+        )
+        parser.add_argument('--audit-logs', type=int, default=100000, help='Number of audit log entries')
+        parser.add_argument('--login-attempts', type=int, default=50000, help='Number of login attempts')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per bulk_create batch')
+        parser.add_argument('--prefix', default='load', help='Marks the generated rows, so --clear can find them')
+        parser.add_argument('--password', default='LoadTest-pass-1', help='Password of every generated user')
+        parser.add_argument('--clear', action='store_true', help='Delete data generated with this prefix first')
+
+    def handle(self, *args, **options):
+        for name in ('users', 'rooms', 'amenities', 'years', 'batch_size'):
+            if options[name] < 1:
+                raise CommandError(f'--{name.replace("_", "-")} must be at least 1.')
+
+        today = timezone.now().date()
+        try:
+            self.start_date = (
+                datetime.strptime(options['start_date'], '%Y-%m-%d').date() if options['start_date']
+                else date(today.year - options['years'] + 1, 1, 1)
+            )
+        except ValueError:
+            raise CommandError('Dates must use the YYYY-MM-DD format.')
+        self.end_date = self.start_date + timedelta(days=round(365.25 * options['years']) - 1)
+        # Logs describe the past: they stop today even when bookings run into the future
+        self.history_end = min(self.end_date, today)
+
+        self.rng = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        self.batch_size = options['batch_size']
+
+        if options['clear']:
+            self.clear()
+        if User.objects.filter(username__startswith=f'{self.prefix}_').exists():
+            raise CommandError(f'Data with prefix "{self.prefix}" already exists; pass --clear or another --prefix.')
+
+        amenities = self.create_amenities(options['amenities'])
+        rooms = self.create_rooms(options['rooms'], amenities)
+        users = self.create_users(options['users'], rooms, options['password'])
+        self.create_bookings(options['bookings'], rooms, users)
+        self.create_audit_logs(options['audit_logs'], users)
+        self.create_login_attempts(options['login_attempts'], users)
+
+        self.stdout.write(self.style.SUCCESS('\n✅ Load data generated!'))
+
+    def clear(self):
+        rooms = Room.objects.filter(name__startswith=f'[{self.prefix}] ')
+        room_ids = list(rooms.values_list('id', flat=True))
+        # The rooms go too, so skip rebuilding their rollups booking by booking
+        post_delete.disconnect(booking_deleted, sender=Booking)
+        try:
+            with transaction.atomic():
+                Booking.objects.filter(room_id__in=room_ids).delete()
+                rooms.delete()
+        finally:
+            post_delete.connect(booking_deleted, sender=Booking)
+        RoomAmenity.objects.filter(name__startswith=f'[{self.prefix}] ').delete()
+        AuditLog.objects.filter(user_agent=self.marker).delete()
+        LoginAttempt.objects.filter(email__startswith=f'{self.prefix}.').delete()
+        User.objects.filter(username__startswith=f'{self.prefix}_').delete()
+        availability_cache.bump(*room_ids)
+        self.stdout.write(self.style.SUCCESS(f'✓ Cleared data with prefix "{self.prefix}"'))
+
+    @property
+    def marker(self):
+        """User agent of the generated audit log entries"""
+        return f'generate_load_data/{self.prefix}'
+
+    def random_datetime(self, start, end):
+        """Aware datetime uniformly between the start of one day and the end of another"""
+        seconds = ((end - start).days + 1) * 86400
+        moment = datetime.combine(start, time.min) + timedelta(seconds=self.rng.randrange(seconds))
+        return timezone.make_aware(moment, timezone.get_current_timezone())
+
+    def choose(self, weights):
+        return self.rng.choices(list(weights), weights=list(weights.values()))[0]
+
+    def create_amenities(self, count):
+        amenities = [
+            RoomAmenity(
+                name=f'[{self.prefix}] {AMENITY_NAMES[n % len(AMENITY_NAMES)]} {n // len(AMENITY_NAMES) + 1}',
+                description='Generated amenity',
+            )
+            for n in range(count)
+        ]
+        RoomAmenity.objects.bulk_create(amenities, batch_size=self.batch_size)
+        self.stdout.write(self.style.SUCCESS(f'✓ Created {count} amenities'))
+        return [amenity.name for amenity in amenities]
+
+    def create_rooms(self, count, amenities):
+        rooms = []
+        for n in range(count):
+            category = self.rng.choice(list(CATEGORY_CAPACITIES))
+            floor = self.rng.randint(0, 4)
+            rooms.append(Room(
+                name=f'[{self.prefix}] Room {n + 1:03d}',
+                capacity=self.rng.randint(*CATEGORY_CAPACITIES[category]),
+                category=category,
+                floor=str(floor),
+                location=f'Block {chr(65 + n % 4)}, Floor {floor}',
+                description='Generated room',
+                amenities=self.rng.sample(amenities, min(len(amenities), self.rng.randint(2, 6))),
+                advance_booking_days=365 * 5,
+                max_booking_duration=10,
+            ))
+        rooms = Room.objects.bulk_create(rooms, batch_size=self.batch_size)
+        self.stdout.write(self.style.SUCCESS(f'✓ Created {count} rooms'))
+        return rooms
+
+    def create_users(self, count, rooms, password):
+        # One hash for everyone: hashing each password would dominate the run
+        password_hash = make_password(password)
+        created_field = User._meta.get_field('created_at')
+        users = []
+        for n in range(count):
+            if n == 0 or self.rng.random() < 0.01:
+                role = 'super_admin'
+            elif self.rng.random() < 0.05:
+                role = 'room_admin'
+            elif self.rng.random() < 0.02:
+                role = 'procurement_officer'
+            else:
+                role = 'user'
+            joined = self.random_datetime(self.start_date, self.history_end)
+            users.append(User(
+                username=f'{self.prefix}_user{n + 1:05d}',
+                email=f'{self.prefix}.user{n + 1:05d}@icpac.net',
+                password=password_hash,
+                first_name='Load',
+                last_name=f'User {n + 1}',
+                role=role,
+                is_staff=role == 'super_admin',
+                is_email_verified=True,
+                department=self.rng.choice(DEPARTMENTS),
+                date_joined=joined,
+                created_at=joined,
+            ))
+        with keep_given_timestamps(created_field):
+            users = User.objects.bulk_create(users, batch_size=self.batch_size)
+
+        managed = [
+            User.managed_rooms.through(user_id=user.id, room_id=room.id)
+            for user in users if user.role == 'room_admin'
+            for room in self.rng.sample(rooms, min(len(rooms), self.rng.randint(1, 5)))
+        ]
+        User.managed_rooms.through.objects.bulk_create(managed, batch_size=self.batch_size)
+        self.stdout.write(self.style.SUCCESS(f'✓ Created {count} users (password "{password}")'))
+        return users
+
+    def booking_dates(self, booking_type):
+        """(start_date, end_date, selected_dates, recurrence_rule, dates) of a new booking"""
+        span = (self.end_date - self.start_date).days
+        start = self.start_date + timedelta(days=self.rng.randint(0, span))
+        if booking_type == 'weekly':
+            days = [start + timedelta(days=n) for n in range(7)]
+            return start, days[-1], [], '', days
+        if booking_type == 'multi_day':
+            if self.rng.random() < 0.5:
+                # Non-consecutive days picked within two weeks
+                offsets = sorted({0, *self.rng.sample(range(1, 14), self.rng.randint(1, 5))})
+                days = [start + timedelta(days=offset) for offset in offsets]
+                return days[0], days[-1], [day.isoformat() for day in days], '', days
+            days = [start + timedelta(days=n) for n in range(self.rng.randint(2, 6))]
+            return start, days[-1], [], '', days
+        if booking_type == 'recurring':
+            if self.rng.random() < 0.8:
+                weekday = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')[start.weekday()]
+                rule = f'FREQ=WEEKLY;BYDAY={weekday};COUNT={self.rng.randint(4, 26)}'
+            else:
+                rule = f'FREQ=DAILY;COUNT={self.rng.randint(3, 10)}'
+            days = recurrence.expand(rule, start)
+            return days[0], days[-1], [], rule, days
+        return start, start, [], '', [start]
+
+    def booking_slots(self, booking_type):
+        """First and last 30-minute slot of a new booking"""
+        if booking_type == 'full_day':
+            return 0, SLOTS_PER_DAY
+        length = self.rng.randint(2, 6) if booking_type in ('hourly', 'recurring') else self.rng.randint(4, 16)
+        first = self.rng.randint(0, SLOTS_PER_DAY - length)
+        return first, first + length
+
+    def create_bookings(self, count, rooms, users):
+        # Pending and approved bookings hold their slots: the exclusion
+        # constraint on PostgreSQL rejects overlapping occurrences
+        taken = {room.id: set() for room in rooms}
+        admins = [user for user in users if user.role in ('super_admin', 'room_admin')]
+        created_fields = [Booking._meta.get_field('created_at'), Booking._meta.get_field('updated_at')]
+        created = 0
+        last_day = self.end_date
+        batch = []
+        for n in range(count):
+            booking_type = self.choose(BOOKING_TYPE_WEIGHTS)
+            status = self.choose(STATUS_WEIGHTS)
+            # A few attempts to find free slots, then the request is recorded as cancelled
+            for attempt in range(3):
+                room = self.rng.choice(rooms)
+                start_date, end_date, selected_dates, rule, days = self.booking_dates(booking_type)
+                first, last = self.booking_slots(booking_type)
+                slots = {(day, slot) for day in days for slot in range(first, last)}
+                if status not in Booking.ACTIVE_STATUSES or not slots & taken[room.id]:
+                    break
+            else:
+                status = 'cancelled'
+            if status in Booking.ACTIVE_STATUSES:
+                taken[room.id] |= slots
+
+            user = self.rng.choice(users)
+            created_at = self.random_datetime(start_date - timedelta(days=60), start_date - timedelta(days=1))
+            decided_at = None
+            if status in ('approved', 'rejected'):
+                decided_at = created_at + timedelta(hours=self.rng.randint(1, 72))
+            booking = Booking(
+                room=room,
+                user=user,
+                purpose=f'{self.rng.choice(PURPOSES)} {n + 1}',
+                start_date=start_date,
+                end_date=end_date,
+                start_time=slot_time(first),
+                end_time=slot_time(last),
+                selected_dates=selected_dates,
+                recurrence_rule=rule,
+                booking_type=booking_type,
+                expected_attendees=self.rng.randint(1, room.capacity),
+                approval_status=status,
+                approved_by=self.rng.choice(admins) if decided_at else None,
+                approved_at=decided_at,
+                rejection_reason='Room needed for another event' if status == 'rejected' else '',
+                created_at=created_at,
+                updated_at=decided_at or created_at,
+            )
+            booking.generated_dates = days
+            last_day = max(last_day, end_date)
+            batch.append(booking)
+            if len(batch) == self.batch_size:
+                with keep_given_timestamps(*created_fields):
+                    created += self.insert_bookings(batch)
+                batch = []
+                self.stdout.write(f'  {created} bookings...')
+        with keep_given_timestamps(*created_fields):
+            created += self.insert_bookings(batch)
+        self.stdout.write(self.style.SUCCESS(f'✓ Created {created} bookings'))
+
+        # bulk_create skips the post_save signal that keeps the rollups current
+        for room in rooms:
+            RoomOccupancy.rebuild(room.id, self.start_date, last_day)
+            RoomUsageDaily.rebuild(room.id, self.start_date, last_day)
+        availability_cache.bump(*[room.id for room in rooms])
+        self.stdout.write(self.style.SUCCESS('✓ Rebuilt occupancy and room usage'))
+
+    def insert_bookings(self, bookings):
+        """Insert bookings and their occurrence rows in one transaction"""
+        with transaction.atomic():
+            Booking.objects.bulk_create(bookings)
+            BookingOccurrence.objects.bulk_create([
+                BookingOccurrence(
+                    booking_id=booking.id,
+                    room_id=booking.room_id,
+                    date=day,
+                    start_time=booking.start_time,
+                    end_time=booking.end_time,
+                    approval_status=booking.approval_status,
+                )
+                for booking in bookings
+                for day in booking.generated_dates
+            ], batch_size=self.batch_size)
+        return len(bookings)
+
+    def random_ip(self):
+        return f'10.{self.rng.randint(0, 255)}.{self.rng.randint(0, 255)}.{self.rng.randint(1, 254)}'
+
+    def create_audit_logs(self, count, users):
+        entries = []
+        for n in range(count):
+            action_type = self.choose(AUDIT_ACTION_WEIGHTS)
+            user = self.rng.choice(users)
+            object_type = action_type.split('_')[0] if action_type.startswith(('booking', 'room')) else ''
+            entries.append(AuditLog(
+                user=user,
+                action_type=action_type,
+                description=f'{dict(AuditLog.ACTION_TYPES)[action_type]} by {user.email}',
+                object_type=object_type,
+                object_id=str(self.rng.randint(1, 100000)) if object_type else '',
+                ip_address=self.random_ip(),
+                user_agent=self.marker,
+                additional_data={'generated': True},
+                timestamp=self.random_datetime(self.start_date, self.history_end),
+            ))
+        AuditLog.objects.bulk_create(entries, batch_size=self.batch_size)
+        self.ensure_partitions('security_audit_logs')
+        self.stdout.write(self.style.SUCCESS(f'✓ Created {count} audit log entries'))
+
+    def create_login_attempts(self, count, users):
+        attempts = []
+        for n in range(count):
+            attempt_type = self.choose(LOGIN_ATTEMPT_WEIGHTS)
+            user = None if attempt_type == 'failed_user' else self.rng.choice(users)
+            attempts.append(LoginAttempt(
+                user=user,
+                email=user.email if user else f'{self.prefix}.unknown{n}@icpac.net',
+                ip_address=self.random_ip(),
+                user_agent=self.rng.choice(USER_AGENTS),
+                attempt_type=attempt_type,
+                timestamp=self.random_datetime(self.start_date, self.history_end),
+            ))
+        with keep_given_timestamps(LoginAttempt._meta.get_field('timestamp')):
+            LoginAttempt.objects.bulk_create(attempts, batch_size=self.batch_size)
+        self.ensure_partitions('security_login_attempts')
+        self.stdout.write(self.style.SUCCESS(f'✓ Created {count} login attempts'))
+
+    def ensure_partitions(self, table):
+        """Move rows that landed in the default partition into monthly partitions"""
+        if partitions.is_partitioned(connection, table):
+            for name in partitions.ensure_partitions(connection, table):
+                self.stdout.write(self.style.SUCCESS(f'✓ Created partition {name}'))
@@ -0,0 +1,73 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from apps.bookings import loadtest
+
+
+class Command(BaseCommand):
+    help = 'Drive a running server with virtual users following the login, room, availability and booking flow'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000', help='Base URL of the server under test')
+        parser.add_argument('--users', type=int, default=50, help='Concurrent virtual users')
+        parser.add_argument('--spawn-rate', type=float, default=10.0, help='Virtual users started per second')
+        parser.add_argument('--duration', type=float, default=60.0, help='Seconds from the first user starting to the end')
+        parser.add_argument('--think-time', type=float, default=2.0, help='Mean pause in seconds between a user\'s steps')
+        parser.add_argument(
+            '--create-ratio', type=float, default=0.1, help='Share of free slots a user goes on to book'
+        )
+        parser.add_argument('--no-websocket', action='store_true', help='Skip the ws/bookings/ connection')
+        parser.add_argument('--prefix', default='load', help='Prefix of the generate_load_data accounts to log in as')
+        parser.add_argument('--password', default='LoadTest-pass-1', help='Password of those accounts')
+        parser.add_argument('--accounts', type=int, default=500, help='Number of accounts to spread the users over')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Seconds before a request counts as failed')
+        parser.add_argument('--seed', type=int, default=42, help='Seed of the users\' choices')
+        parser.add_argument('--report', help='Also write the report (Markdown) to this file')
+        parser.add_argument('--json', help='Also write the raw results (JSON) to this file')
+        parser.add_argument(
+            '--max-error-rate', type=float, help='Exit with an error when the overall error rate exceeds this (0.01 = 1%%)'
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['accounts'] < 1:
+            raise CommandError('--users and --accounts must be at least 1.')
+        if options['spawn_rate'] <= 0 or options['duration'] <= 0:
+            raise CommandError('--spawn-rate and --duration must be positive.')
+
+        self.stdout.write(
+            f'Starting {options["users"]} virtual users against {options["url"]} '
+            f'at {options["spawn_rate"]}/s for {options["duration"]} s...'
+        )
+        summary = loadtest.LoadTest(
+            options['url'],
+            users=options['users'],
+            spawn_rate=options['spawn_rate'],
+            duration=options['duration'],
+            think_time=options['think_time'],
+            create_ratio=options['create_ratio'],
+            websocket=not options['no_websocket'],
+            prefix=options['prefix'],
+            password=options['password'],
+            accounts=options['accounts'],
+            timeout=options['timeout'],
+            seed=options['seed'],
+        ).run()
+
+        report = loadtest.format_report(summary)
+        self.stdout.write('\n' + report)
+        if options['report']:
+            Path(options['report']).write_text(report)
+            self.stdout.write(self.style.SUCCESS(f'✓ Wrote report to {options["report"]}'))
+        if options['json']:
+            Path(options['json']).write_text(json.dumps(summary, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'✓ Wrote results to {options["json"]}'))
+
+        total = summary['total']
+        if total is None:
+            raise CommandError('No request completed; is the server running?')
+        if options['max_error_rate'] is not None and total['error_rate'] > options['max_error_rate']:
+            raise CommandError(
+                f'Error rate {total["error_rate"]:.2%} is above {options["max_error_rate"]:.2%}.'
+            )
+        self.stdout.write(self.style.SUCCESS('\n✅ Load test complete!'))
@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from apps.bookings.models import Booking, RoomUsageDaily
+from apps.rooms.models import Room
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily room usage rollup from bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--room', type=int, help='Only rebuild this room id')
+        parser.add_argument('--start-date', help='First day to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end-date', help='Last day to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        rooms = Room.objects.all()
+        if options['room']:
+            rooms = rooms.filter(id=options['room'])
+
+        try:
+            start_date = self.parse_date(options['start_date'])
+            end_date = self.parse_date(options['end_date'])
+        except ValueError:
+            raise CommandError('Dates must use the YYYY-MM-DD format.')
+
+        for room in rooms:
+            span = Booking.objects.filter(room=room).aggregate(
+                first=Min('start_date'),
+                last=Max('end_date')
+            )
+            first = start_date or span['first']
+            last = end_date or span['last']
+            if not first or not last:
+                RoomUsageDaily.objects.filter(room=room).delete()
+                self.stdout.write(f'  No bookings for {room.name}')
+                continue
+
+            if not start_date and not end_date:
+                # Full rebuild: drop days no booking covers any more
+                RoomUsageDaily.objects.filter(room=room).exclude(date__range=[first, last]).delete()
+            RoomUsageDaily.rebuild(room.id, first, last)
+            self.stdout.write(self.style.SUCCESS(f'✓ Rebuilt usage for {room.name} ({first} to {last})'))
+
+        self.stdout.write(self.style.SUCCESS('\n✅ Room usage rollup rebuilt!'))
+
+    def parse_date(self, value):
+        if not value:
+            return None
+        return datetime.strptime(value, '%Y-%m-%d').date()
@@ -0,0 +1,64 @@
+# Generated by Django 5.0.7 on 2026-10-17 11:25
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from apps.bookings import occupancy
+
+
+def build_occupancy(apps, schema_editor):
+    """Index the pending/approved bookings that already exist"""
+    Booking = apps.get_model('bookings', 'Booking')
+    RoomOccupancy = apps.get_model('bookings', 'RoomOccupancy')
+
+    bitmaps = {}
+    bookings = Booking.objects.filter(
+        approval_status__in=['pending', 'approved']
+    ).values_list('room_id', 'start_date', 'end_date', 'start_time', 'end_time')
+    for room_id, start_date, end_date, start_time, end_time in bookings.iterator():
+        mask = occupancy.slot_mask(start_time, end_time)
+        day = start_date
+        while day <= end_date:
+            bitmaps[(room_id, day)] = bitmaps.get((room_id, day), 0) | mask
+            day += timedelta(days=1)
+
+    RoomOccupancy.objects.bulk_create(
+        [
+            RoomOccupancy(room_id=room_id, date=day, bitmap=occupancy.to_bytes(bitmap))
+            for (room_id, day), bitmap in bitmaps.items() if bitmap
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0004_booking_selected_dates'),
+        ('rooms', '0003_alter_room_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='Day covered by the bitmap')),
+                ('bitmap', models.BinaryField(help_text='One bit per 5-minute slot, set when the slot is booked', max_length=36)),
+                ('room', models.ForeignKey(help_text='Room this occupancy bitmap belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='rooms.room')),
+            ],
+            options={
+                'verbose_name': 'Room Occupancy',
+                'verbose_name_plural': 'Room Occupancy',
+                'db_table': 'booking_room_occupancy',
+                'ordering': ['room', 'date'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='roomoccupancy',
+            constraint=models.UniqueConstraint(fields=('room', 'date'), name='unique_room_occupancy_day'),
+        ),
+        migrations.RunPython(build_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,119 @@
+# Generated by Django 5.0.7 on 2026-10-17 11:33
+
+from datetime import datetime, timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from apps.bookings import conflicts, occupancy
+
+
+def build_occurrences(apps, schema_editor):
+    """Materialize the dates of existing bookings and re-index their occupancy"""
+    Booking = apps.get_model('bookings', 'Booking')
+    BookingOccurrence = apps.get_model('bookings', 'BookingOccurrence')
+    RoomOccupancy = apps.get_model('bookings', 'RoomOccupancy')
+
+    occurrences = []
+    bitmaps = {}
+    bookings = Booking.objects.order_by('created_at').values_list(
+        'id', 'room_id', 'booking_type', 'start_date', 'end_date',
+        'start_time', 'end_time', 'selected_dates', 'approval_status'
+    )
+    for (booking_id, room_id, booking_type, start_date, end_date,
+         start_time, end_time, selected_dates, approval_status) in bookings.iterator():
+        if booking_type == 'multi_day' and selected_dates:
+            dates = sorted({datetime.strptime(str(d), '%Y-%m-%d').date() for d in selected_dates})
+        else:
+            dates = [start_date + timedelta(days=n) for n in range((end_date - start_date).days + 1)]
+
+        mask = occupancy.slot_mask(start_time, end_time)
+        for day in dates:
+            occurrences.append(BookingOccurrence(
+                booking_id=booking_id, room_id=room_id, date=day,
+                start_time=start_time, end_time=end_time, approval_status=approval_status
+            ))
+            if approval_status in ('pending', 'approved'):
+                bitmaps[(room_id, day)] = bitmaps.get((room_id, day), 0) | mask
+
+    BookingOccurrence.objects.bulk_create(occurrences, batch_size=1000)
+
+    RoomOccupancy.objects.all().delete()
+    RoomOccupancy.objects.bulk_create(
+        [
+            RoomOccupancy(room_id=room_id, date=day, bitmap=occupancy.to_bytes(bitmap))
+            for (room_id, day), bitmap in bitmaps.items() if bitmap
+        ],
+        batch_size=1000
+    )
+
+
+def add_exclusion_constraint(apps, schema_editor):
+    """
+    Enforce overlaps on the backfilled occurrences. Existing overlaps are
+    reported rather than dropped, so no booking loses its dates.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        pairs = conflicts.overlapping_bookings(cursor)
+    if pairs:
+        raise RuntimeError(
+            'Cannot enforce booking overlaps: these active bookings overlap in the same room: '
+            + ', '.join(f'{booking_id} and {other_id}' for booking_id, other_id in pairs)
+            + '. Reject or cancel one booking of each pair, then run migrate again.'
+        )
+
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    schema_editor.execute(f"""
+        ALTER TABLE {conflicts.OCCURRENCES_TABLE}
+        ADD CONSTRAINT {conflicts.OVERLAP_CONSTRAINT} EXCLUDE USING gist (
+            room_id WITH =,
+            tsrange(date + start_time, date + end_time) WITH &&
+        ) WHERE (approval_status IN ('pending', 'approved'))
+    """)
+
+
+def drop_exclusion_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'ALTER TABLE {conflicts.OCCURRENCES_TABLE} DROP CONSTRAINT IF EXISTS {conflicts.OVERLAP_CONSTRAINT}'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0005_room_occupancy'),
+        ('rooms', '0003_alter_room_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingOccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='Booked date')),
+                ('start_time', models.TimeField(help_text='Start time')),
+                ('end_time', models.TimeField(help_text='End time')),
+                ('approval_status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('cancelled', 'Cancelled')], help_text='Approval status of the booking', max_length=20)),
+                ('booking', models.ForeignKey(help_text='Booking this occurrence belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='occurrences', to='bookings.booking')),
+                ('room', models.ForeignKey(help_text='Room being booked', on_delete=django.db.models.deletion.CASCADE, related_name='booking_occurrences', to='rooms.room')),
+            ],
+            options={
+                'verbose_name': 'Booking Occurrence',
+                'verbose_name_plural': 'Booking Occurrences',
+                'db_table': 'booking_occurrences',
+                'ordering': ['date', 'start_time'],
+                'indexes': [models.Index(fields=['room', 'date', 'start_time', 'end_time'], name='occurrence_room_slot_idx'), models.Index(fields=['date', 'approval_status'], name='occurrence_date_status_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='bookingoccurrence',
+            constraint=models.UniqueConstraint(fields=('booking', 'date'), name='unique_booking_occurrence_date'),
+        ),
+        migrations.RunPython(build_occurrences, migrations.RunPython.noop),
+        migrations.RunPython(add_exclusion_constraint, drop_exclusion_constraint),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-17 11:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0006_booking_occurrences'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='recurrence_rule',
+            field=models.CharField(blank=True, help_text='RRULE for recurring bookings (e.g., "FREQ=WEEKLY;BYDAY=TU;COUNT=104")', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='booking_type',
+            field=models.CharField(choices=[('hourly', 'Hourly'), ('full_day', 'Full Day'), ('multi_day', 'Multi Day'), ('weekly', 'Weekly'), ('recurring', 'Recurring')], default='hourly', help_text='Type of booking', max_length=20),
+        ),
+    ]
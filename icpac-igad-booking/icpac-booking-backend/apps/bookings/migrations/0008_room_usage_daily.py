@@ -0,0 +1,64 @@
+# Generated by Django 5.0.7 on 2026-10-17 11:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_room_usage(apps, schema_editor):
+    """Roll up the occurrences of existing bookings per room and day"""
+    BookingOccurrence = apps.get_model('bookings', 'BookingOccurrence')
+    RoomUsageDaily = apps.get_model('bookings', 'RoomUsageDaily')
+
+    days = {}
+    occurrences = BookingOccurrence.objects.values_list(
+        'room_id', 'date', 'start_time', 'end_time', 'approval_status'
+    )
+    for room_id, day, start_time, end_time, approval_status in occurrences.iterator():
+        usage = days.get((room_id, day))
+        if usage is None:
+            usage = days[(room_id, day)] = RoomUsageDaily(room_id=room_id, date=day)
+        usage.booking_count += 1
+        count_field = f'{approval_status}_count'
+        setattr(usage, count_field, getattr(usage, count_field) + 1)
+        if approval_status == 'approved':
+            usage.booked_minutes += (
+                (end_time.hour * 60 + end_time.minute) - (start_time.hour * 60 + start_time.minute)
+            )
+
+    RoomUsageDaily.objects.bulk_create(days.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0007_booking_recurrence_rule'),
+        ('rooms', '0003_alter_room_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomUsageDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='Day covered by the rollup')),
+                ('booked_minutes', models.PositiveIntegerField(default=0, help_text='Minutes held by approved bookings')),
+                ('booking_count', models.PositiveIntegerField(default=0, help_text='Bookings of any status on this day')),
+                ('pending_count', models.PositiveIntegerField(default=0)),
+                ('approved_count', models.PositiveIntegerField(default=0)),
+                ('rejected_count', models.PositiveIntegerField(default=0)),
+                ('cancelled_count', models.PositiveIntegerField(default=0)),
+                ('room', models.ForeignKey(help_text='Room this rollup belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='usage', to='rooms.room')),
+            ],
+            options={
+                'verbose_name': 'Room Usage',
+                'verbose_name_plural': 'Room Usage',
+                'db_table': 'booking_room_usage_daily',
+                'ordering': ['room', 'date'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='roomusagedaily',
+            constraint=models.UniqueConstraint(fields=('room', 'date'), name='unique_room_usage_day'),
+        ),
+        migrations.RunPython(build_room_usage, migrations.RunPython.noop),
+    ]
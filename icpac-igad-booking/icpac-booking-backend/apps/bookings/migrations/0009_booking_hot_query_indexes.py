@@ -0,0 +1,72 @@
+# Generated by Django 5.0.7 on 2026-10-17 11:51
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class AddIndexConcurrentlyOnPostgres(AddIndexConcurrently):
+    """
+    CREATE INDEX CONCURRENTLY on PostgreSQL, so the bookings table stays
+    writable while the index builds; a plain CREATE INDEX elsewhere
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    # CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('bookings', '0008_room_usage_daily'),
+        ('rooms', '0003_alter_room_options'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyOnPostgres(
+            model_name='booking',
+            index=models.Index(fields=['room', 'approval_status', 'start_date', 'end_date', 'start_time', 'end_time'], name='booking_room_status_dates_idx'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='booking',
+            index=models.Index(fields=['user', 'approval_status'], name='booking_user_status_idx'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='booking',
+            index=models.Index(fields=['user', 'start_date', 'start_time'], name='booking_user_start_idx'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='booking',
+            index=models.Index(fields=['approval_status', 'created_at'], name='booking_status_created_idx'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='booking',
+            index=models.Index(fields=['created_at', 'id'], name='booking_created_id_idx'),
+        ),
+        # The composite indexes above lead with room and user, so the
+        # single-column foreign key indexes are redundant
+        migrations.AlterField(
+            model_name='booking',
+            name='room',
+            field=models.ForeignKey(db_index=False, help_text='Room being booked', on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='rooms.room'),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='user',
+            field=models.ForeignKey(db_index=False, help_text='User making the booking', on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
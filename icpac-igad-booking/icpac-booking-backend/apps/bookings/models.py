@@ -1,12 +1,13 @@
 """
 Booking models for ICPAC Booking System
 """
-from django.db import models
+from django.db import connection, models, transaction
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from datetime import datetime, time, timedelta
+from . import occupancy, recurrence
 
 User = get_user_model()
 
@@ -20,6 +21,7 @@ class Booking(models.Model):
         ('full_day', 'Full Day'),
         ('multi_day', 'Multi Day'),
         ('weekly', 'Weekly'),
+        ('recurring', 'Recurring'),
     ]
     
     APPROVAL_STATUS_CHOICES = [
@@ -28,12 +30,17 @@ class Booking(models.Model):
         ('rejected', 'Rejected'),
         ('cancelled', 'Cancelled'),
     ]
+
+    # Statuses that hold a room's time slot
+    ACTIVE_STATUSES = ['pending', 'approved']
     
     # Basic booking information
     room = models.ForeignKey(
         'rooms.Room',
         on_delete=models.CASCADE,
         related_name='bookings',
+        # Indexed by booking_room_status_dates_idx, which starts with this column
+        db_index=False,
         help_text='Room being booked'
     )
     
@@ -41,6 +48,8 @@ class Booking(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='bookings',
+        # Indexed by booking_user_status_idx, which starts with this column
+        db_index=False,
         help_text='User making the booking'
     )
     
@@ -67,6 +76,13 @@ class Booking(models.Model):
         help_text='Array of selected dates for multi-day bookings (e.g., ["2025-10-06", "2025-10-08", "2025-10-10"])'
     )
 
+    # For recurring bookings: one rule instead of one row per meeting
+    recurrence_rule = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text='RRULE for recurring bookings (e.g., "FREQ=WEEKLY;BYDAY=TU;COUNT=104")'
+    )
+
     # Booking configuration
     booking_type = models.CharField(
         max_length=20,
@@ -118,6 +134,22 @@ class Booking(models.Model):
         verbose_name = 'Booking'
         verbose_name_plural = 'Bookings'
         ordering = ['-created_at']
+        # Indexes for the hot queries; BookingIndexPlanTests checks the planner uses them
+        indexes = [
+            # Room schedules, conflict checks and room/status/date list filters
+            models.Index(
+                fields=['room', 'approval_status', 'start_date', 'end_date', 'start_time', 'end_time'],
+                name='booking_room_status_dates_idx'
+            ),
+            # Per-user counters and status filters
+            models.Index(fields=['user', 'approval_status'], name='booking_user_status_idx'),
+            # A user's upcoming bookings
+            models.Index(fields=['user', 'start_date', 'start_time'], name='booking_user_start_idx'),
+            # Pending approvals, oldest first
+            models.Index(fields=['approval_status', 'created_at'], name='booking_status_created_idx'),
+            # Keyset pagination on (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='booking_created_id_idx'),
+        ]
         
         # Prevent double booking (same room, overlapping times)
         constraints = [
@@ -145,10 +177,61 @@ class Booking(models.Model):
         else:
             return f"{self.purpose} - {self.room.name} ({self.start_date} to {self.end_date})"
     
+    @staticmethod
+    def expand_dates(booking_type, start_date, end_date, selected_dates=None, recurrence_rule=''):
+        """
+        Dates a booking occupies: the dates generated by a recurring booking's
+        rule, the selected dates of a non-consecutive multi_day booking,
+        otherwise every day from start_date to end_date.
+        Raises RecurrenceError for an unusable recurrence rule.
+        """
+        if booking_type == 'recurring':
+            return recurrence.expand(recurrence_rule, start_date)
+
+        if booking_type == 'multi_day' and selected_dates:
+            return sorted({
+                datetime.strptime(d, '%Y-%m-%d').date() if isinstance(d, str) else d
+                for d in selected_dates
+            })
+
+        dates = []
+        day = start_date
+        while day <= end_date:
+            dates.append(day)
+            day += timedelta(days=1)
+        return dates
+
+    def occurrence_dates(self):
+        """Dates this booking occupies"""
+        return self.expand_dates(
+            self.booking_type, self.start_date, self.end_date,
+            self.selected_dates, self.recurrence_rule
+        )
+
+    def dates_between(self, window_start, window_end):
+        """Dates this booking occupies within window_start..window_end"""
+        if self.booking_type == 'recurring':
+            return list(recurrence.iter_dates(self.recurrence_rule, self.start_date, window_start, window_end))
+        return [day for day in self.occurrence_dates() if window_start <= day <= window_end]
+
     def clean(self):
         """Validate booking data"""
         errors = {}
 
+        # A recurring booking spans from its first to its last occurrence
+        if self.booking_type == 'recurring':
+            if not self.recurrence_rule:
+                errors['recurrence_rule'] = 'Recurring booking must have a recurrence rule.'
+            elif self.start_date:
+                try:
+                    dates = recurrence.expand(self.recurrence_rule, self.start_date)
+                except recurrence.RecurrenceError as exc:
+                    errors['recurrence_rule'] = str(exc)
+                else:
+                    self.start_date, self.end_date = dates[0], dates[-1]
+        elif self.recurrence_rule:
+            errors['recurrence_rule'] = 'Only recurring bookings can have a recurrence rule.'
+
         # Validate dates
         if self.start_date and self.end_date and self.start_date > self.end_date:
             errors['end_date'] = 'End date must be after start date.'
@@ -227,38 +310,44 @@ class Booking(models.Model):
         if self.room and self.expected_attendees > self.room.capacity:
             errors['expected_attendees'] = f'Attendee count ({self.expected_attendees}) exceeds room capacity ({self.room.capacity}).'
 
-        # Check for overlapping bookings (only for approved/pending bookings)
-        if self.room:
-            overlapping = Booking.objects.filter(
-                room=self.room,
-                approval_status__in=['pending', 'approved'],
-                start_date__lte=self.end_date,
-                end_date__gte=self.start_date,
-            ).exclude(pk=self.pk if self.pk else None)
-
-            # Check time overlap for same dates
-            for booking in overlapping:
-                if (self.start_date <= booking.end_date and self.end_date >= booking.start_date):
-                    # Same day, check time overlap
-                    if (self.start_time < booking.end_time and self.end_time > booking.start_time):
-                        errors['start_time'] = f'Time slot conflicts with existing booking: {booking.purpose}'
-                        break
+        # Check for overlapping bookings (only for approved/pending bookings).
+        # Skipped while saving when the exclusion constraint enforces it instead.
+        dates_valid = 'selected_dates' not in errors and 'recurrence_rule' not in errors
+        if self.room and not getattr(self, '_overlaps_enforced_by_database', False) and dates_valid:
+            conflict = BookingOccurrence.overlapping(
+                self.room, self.occurrence_dates(), self.start_time, self.end_time,
+                exclude_booking=self.pk
+            ).select_related('booking').first()
+            if conflict:
+                errors['start_time'] = f'Time slot conflicts with existing booking: {conflict.booking.purpose}'
 
         if errors:
             raise ValidationError(errors)
     
     def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
+        from .conflicts import BookingConflictError, database_conflict_check_enabled
+
+        self._overlaps_enforced_by_database = database_conflict_check_enabled()
+        try:
+            self.full_clean()
+        finally:
+            self._overlaps_enforced_by_database = False
+
+        # Occurrences are written by the post_save signal; a conflict there
+        # must roll the booking back with them
+        adding = self._state.adding
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+        except BookingConflictError:
+            if adding:
+                self.pk = None
+                self._state.adding = True
+            raise
     
     def get_duration_hours(self):
         """Calculate booking duration in hours"""
-        if self.start_time and self.end_time:
-            start_datetime = datetime.combine(self.start_date, self.start_time)
-            end_datetime = datetime.combine(self.end_date, self.end_time)
-            duration = end_datetime - start_datetime
-            return duration.total_seconds() / 3600
-        return 0
+        return duration_hours(self.start_date, self.end_date, self.start_time, self.end_time)
     
     @property
     def duration_hours(self):
@@ -341,19 +430,7 @@ class Booking(models.Model):
     
     def can_be_modified_by(self, user):
         """Check if user can modify this booking"""
-        # Super admin can modify any booking
-        if user.role == 'super_admin':
-            return True
-        
-        # Room admin can modify bookings for their rooms
-        if user.role == 'room_admin':
-            return True
-        
-        # User can modify their own bookings (pending or approved)
-        if self.user == user and self.approval_status in ['pending', 'approved']:
-            return True
-        
-        return False
+        return can_modify(user, self.user_id, self.approval_status)
     
     def can_approve_booking(self, user):
         """Check if user can approve this booking"""
@@ -399,3 +476,375 @@ class BookingNote(models.Model):
         return f"Note for {self.booking.purpose} by {self.user.get_full_name()}"
 
 
+# Columns identifying an occurrence row when a booking's rows are compared
+OCCURRENCE_FIELDS = ('room_id', 'date', 'start_time', 'end_time', 'approval_status')
+
+
+class BookingOccurrence(models.Model):
+    """
+    One row per date a booking occupies its room.
+    Derived from Booking rows and brought in line whenever a booking is saved.
+    """
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.CASCADE,
+        related_name='occurrences',
+        help_text='Booking this occurrence belongs to'
+    )
+
+    room = models.ForeignKey(
+        'rooms.Room',
+        on_delete=models.CASCADE,
+        related_name='booking_occurrences',
+        help_text='Room being booked'
+    )
+
+    date = models.DateField(help_text='Booked date')
+    start_time = models.TimeField(help_text='Start time')
+    end_time = models.TimeField(help_text='End time')
+
+    # Copied from the booking so conflict and calendar queries need no join
+    approval_status = models.CharField(
+        max_length=20,
+        choices=Booking.APPROVAL_STATUS_CHOICES,
+        help_text='Approval status of the booking'
+    )
+
+    class Meta:
+        db_table = 'booking_occurrences'
+        verbose_name = 'Booking Occurrence'
+        verbose_name_plural = 'Booking Occurrences'
+        ordering = ['date', 'start_time']
+        constraints = [
+            models.UniqueConstraint(fields=['booking', 'date'], name='unique_booking_occurrence_date'),
+        ]
+        indexes = [
+            models.Index(fields=['room', 'date', 'start_time', 'end_time'], name='occurrence_room_slot_idx'),
+            models.Index(fields=['date', 'approval_status'], name='occurrence_date_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Occurrence of booking {self.booking_id} on {self.date}"
+
+    @classmethod
+    def overlapping(cls, room, dates, start_time, end_time, exclude_booking=None):
+        """Active occurrences in a room overlapping start_time..end_time on any of the dates"""
+        occurrences = cls.objects.filter(
+            room=room,
+            approval_status__in=Booking.ACTIVE_STATUSES,
+            date__in=dates,
+            start_time__lt=end_time,
+            end_time__gt=start_time
+        )
+        if exclude_booking:
+            occurrences = occurrences.exclude(booking_id=exclude_booking)
+        return occurrences
+
+    @classmethod
+    def stored_rows(cls, booking):
+        """{(room_id, date, start_time, end_time, approval_status): pk} of a booking's occurrences"""
+        rows = cls.objects.filter(booking=booking).order_by().values_list('pk', *OCCURRENCE_FIELDS)
+        return {row[1:]: row[0] for row in rows}
+
+    @classmethod
+    def sync_booking(cls, booking, created=False):
+        """
+        Bring the occurrences of a booking in line with its dates, deleting
+        the rows that no longer match and inserting only the missing ones.
+        Returns (removed, added) as (room_id, date, start_time, end_time,
+        approval_status) tuples, so derived tables can follow just those days.
+        Raises BookingConflictError when the exclusion constraint rejects them.
+        """
+        from .conflicts import reserve_occurrences
+
+        stored = {} if created else cls.stored_rows(booking)
+        wanted = [
+            (booking.room_id, day, booking.start_time, booking.end_time, booking.approval_status)
+            for day in booking.occurrence_dates()
+        ]
+        removed = [row for row in stored if row not in set(wanted)]
+        added = [row for row in wanted if row not in stored]
+
+        if removed:
+            cls.objects.filter(pk__in=[stored[row] for row in removed]).delete()
+        if added:
+            reserve_occurrences(booking, [cls(booking=booking, **dict(zip(OCCURRENCE_FIELDS, row))) for row in added])
+        return removed, added
+
+    @classmethod
+    def update_status(cls, booking_ids, approval_status):
+        """
+        Follow a bulk status change made with QuerySet.update().
+        Returns (removed, added) rows like sync_booking.
+        """
+        occurrences = cls.objects.filter(booking_id__in=booking_ids).exclude(approval_status=approval_status)
+        removed = list(occurrences.order_by().values_list(*OCCURRENCE_FIELDS))
+        occurrences.update(approval_status=approval_status)
+        return removed, [(*row[:-1], approval_status) for row in removed]
+
+
+class RoomOccupancy(models.Model):
+    """
+    Per-room, per-day occupancy bitmap of pending and approved bookings.
+    Derived from Booking rows and rebuilt whenever a booking changes.
+    """
+    room = models.ForeignKey(
+        'rooms.Room',
+        on_delete=models.CASCADE,
+        related_name='occupancy',
+        help_text='Room this occupancy bitmap belongs to'
+    )
+
+    date = models.DateField(help_text='Day covered by the bitmap')
+
+    bitmap = models.BinaryField(
+        max_length=occupancy.BITMAP_BYTES,
+        help_text=f'One bit per {occupancy.SLOT_MINUTES}-minute slot, set when the slot is booked'
+    )
+
+    class Meta:
+        db_table = 'booking_room_occupancy'
+        verbose_name = 'Room Occupancy'
+        verbose_name_plural = 'Room Occupancy'
+        ordering = ['room', 'date']
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'date'], name='unique_room_occupancy_day'),
+        ]
+
+    def __str__(self):
+        return f"Occupancy for room {self.room_id} on {self.date}"
+
+    @property
+    def slots(self):
+        """Bitmap as an integer"""
+        return occupancy.from_bytes(self.bitmap)
+
+    @classmethod
+    def bitmaps_for_room(cls, room, start_date, end_date=None):
+        """Get {date: bitmap} for a room; days without bookings are omitted"""
+        end_date = end_date or start_date
+        rows = cls.objects.filter(
+            room=room,
+            date__range=[start_date, end_date]
+        ).order_by().values_list('date', 'bitmap')
+        return {day: occupancy.from_bytes(bitmap) for day, bitmap in rows}
+
+    @classmethod
+    def bitmap_for(cls, room, date):
+        """Get the bitmap for a single room and day (0 when nothing is booked)"""
+        return cls.bitmaps_for_room(room, date).get(date, 0)
+
+    @classmethod
+    def rebuild(cls, room_id, start_date, end_date):
+        """Recompute the bitmaps of a room for every day in start_date..end_date"""
+        cls.refresh(room_id, date__range=[start_date, end_date])
+
+    @classmethod
+    def rebuild_days(cls, room_id, days):
+        """Recompute the bitmaps of a room for the given days only"""
+        cls.refresh(room_id, date__in=days)
+
+    @classmethod
+    def refresh(cls, room_id, **dates):
+        """
+        Recompute the bitmaps of a room on the days matching the dates lookups,
+        writing only the days whose bitmap changed. The room stays locked
+        until the transaction ends, so concurrent bookings of it are applied
+        one after the other.
+        """
+        with transaction.atomic():
+            lock_room(room_id)
+            occurrences = BookingOccurrence.objects.filter(
+                room_id=room_id,
+                approval_status__in=Booking.ACTIVE_STATUSES,
+                **dates
+            ).values_list('date', 'start_time', 'end_time')
+
+            bitmaps = {}
+            for day, start_time, end_time in occurrences:
+                bitmaps[day] = bitmaps.get(day, 0) | occupancy.slot_mask(start_time, end_time)
+
+            rows = cls.objects.filter(room_id=room_id, **dates).order_by().values_list('date', 'bitmap')
+            stored = {day: occupancy.from_bytes(bitmap) for day, bitmap in rows}
+            changed = [
+                cls(room_id=room_id, date=day, bitmap=occupancy.to_bytes(bitmap))
+                for day, bitmap in bitmaps.items() if bitmap and stored.get(day) != bitmap
+            ]
+            emptied = [day for day in stored if not bitmaps.get(day)]
+            if changed:
+                cls.objects.bulk_create(
+                    changed, update_conflicts=True, unique_fields=['room', 'date'], update_fields=['bitmap']
+                )
+            if emptied:
+                cls.objects.filter(room_id=room_id, date__in=emptied).delete()
+
+    @classmethod
+    def sync_booking(cls, removed, added):
+        """Refresh the days whose occurrences a booking sync removed or added"""
+        for room_id, days in touched_days(removed, added).items():
+            cls.rebuild_days(room_id, days)
+
+
+class RoomUsageDaily(models.Model):
+    """
+    Daily rollup of how a room is used: booked minutes and occurrence counts
+    per approval status. Derived from booking occurrences and kept up to date
+    incrementally: each occurrence row a booking change removes or adds is
+    subtracted from or added to its day.
+    """
+    room = models.ForeignKey(
+        'rooms.Room',
+        on_delete=models.CASCADE,
+        related_name='usage',
+        help_text='Room this rollup belongs to'
+    )
+
+    date = models.DateField(help_text='Day covered by the rollup')
+
+    booked_minutes = models.PositiveIntegerField(
+        default=0,
+        help_text='Minutes held by approved bookings'
+    )
+    booking_count = models.PositiveIntegerField(
+        default=0,
+        help_text='Bookings of any status on this day'
+    )
+    pending_count = models.PositiveIntegerField(default=0)
+    approved_count = models.PositiveIntegerField(default=0)
+    rejected_count = models.PositiveIntegerField(default=0)
+    cancelled_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'booking_room_usage_daily'
+        verbose_name = 'Room Usage'
+        verbose_name_plural = 'Room Usage'
+        ordering = ['room', 'date']
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'date'], name='unique_room_usage_day'),
+        ]
+
+    def __str__(self):
+        return f"Usage of room {self.room_id} on {self.date}"
+
+    @classmethod
+    def rebuild(cls, room_id, start_date, end_date):
+        """
+        Recompute the rollup of a room for every day in start_date..end_date
+        from its occurrences, writing only the days that changed
+        """
+        with transaction.atomic():
+            lock_room(room_id)
+            occurrences = BookingOccurrence.objects.filter(
+                room_id=room_id,
+                date__range=[start_date, end_date]
+            ).values_list('room_id', 'date', 'start_time', 'end_time', 'approval_status')
+            days = {}
+            for row in occurrences:
+                add_usage(days.setdefault(row[1], dict.fromkeys(USAGE_FIELDS, 0)), row, 1)
+
+            stored = {
+                usage.date: usage
+                for usage in cls.objects.filter(room_id=room_id, date__range=[start_date, end_date])
+            }
+            changed = [
+                cls(room_id=room_id, date=day, **counts) for day, counts in days.items()
+                if day not in stored or any(getattr(stored[day], field) != counts[field] for field in USAGE_FIELDS)
+            ]
+            cls.save_days(room_id, changed, [day for day in stored if day not in days])
+
+    @classmethod
+    def sync_booking(cls, removed, added):
+        """
+        Fold occurrence rows a booking change removed or added into the
+        rollup of their days, one room at a time under the room's lock
+        """
+        deltas = {}
+        for rows, sign in ((removed, -1), (added, 1)):
+            for row in rows:
+                add_usage(deltas.setdefault((row[0], row[1]), dict.fromkeys(USAGE_FIELDS, 0)), row, sign)
+
+        for room_id, days in touched_days(removed, added).items():
+            days = [day for day in days if any(deltas[(room_id, day)].values())]
+            if not days:
+                continue
+            with transaction.atomic():
+                lock_room(room_id)
+                stored = {usage.date: usage for usage in cls.objects.filter(room_id=room_id, date__in=days)}
+                changed, emptied = [], []
+                for day in days:
+                    usage = stored.get(day) or cls(room_id=room_id, date=day)
+                    for field, change in deltas[(room_id, day)].items():
+                        setattr(usage, field, max(getattr(usage, field) + change, 0))
+                    if usage.booking_count:
+                        changed.append(usage)
+                    elif day in stored:
+                        emptied.append(day)
+                cls.save_days(room_id, changed, emptied)
+
+    @classmethod
+    def save_days(cls, room_id, changed, emptied):
+        """Upsert the changed days of a room's rollup and delete the emptied ones"""
+        if changed:
+            cls.objects.bulk_create(
+                changed, update_conflicts=True, unique_fields=['room', 'date'], update_fields=list(USAGE_FIELDS)
+            )
+        if emptied:
+            cls.objects.filter(room_id=room_id, date__in=emptied).delete()
+
+
+# Counters of a RoomUsageDaily row
+USAGE_FIELDS = (
+    'booked_minutes', 'booking_count', 'pending_count', 'approved_count', 'rejected_count', 'cancelled_count',
+)
+
+
+def add_usage(counts, row, sign):
+    """Add (sign=1) or subtract (sign=-1) one occurrence row to a day's counters"""
+    room_id, day, start_time, end_time, approval_status = row
+    counts['booking_count'] += sign
+    counts[f'{approval_status}_count'] += sign
+    if approval_status == 'approved':
+        counts['booked_minutes'] += sign * minutes_between(start_time, end_time)
+
+
+def lock_room(room_id):
+    """
+    Lock a room's row until the current transaction ends, serializing the
+    writers of its derived tables (a no-op on databases without row locks)
+    """
+    from apps.rooms.models import Room
+
+    if connection.features.has_select_for_update:
+        list(Room.objects.select_for_update().filter(pk=room_id).values_list('pk', flat=True))
+
+
+def touched_days(removed, added):
+    """{room_id: sorted dates} of the occurrence rows a booking sync removed or added"""
+    days = {}
+    for room_id, day, *_ in [*removed, *added]:
+        days.setdefault(room_id, set()).add(day)
+    # Rooms in id order, so writers locking several rooms cannot deadlock
+    return {room_id: sorted(days[room_id]) for room_id in sorted(days)}
+
+
+def minutes_between(start_time, end_time):
+    """Minutes between two times on the same day"""
+    return (end_time.hour * 60 + end_time.minute) - (start_time.hour * 60 + start_time.minute)
+
+
+def duration_hours(start_date, end_date, start_time, end_time):
+    """Hours from start_date at start_time to end_date at end_time, 0 without times"""
+    if start_time and end_time:
+        duration = datetime.combine(end_date, end_time) - datetime.combine(start_date, start_time)
+        return duration.total_seconds() / 3600
+    return 0
+
+
+def can_modify(user, owner_id, approval_status):
+    """Whether user may modify a booking owned by owner_id in approval_status"""
+    # Super admins and room admins can modify any booking
+    if user.role in ('super_admin', 'room_admin'):
+        return True
+
+    # Users can modify their own bookings (pending or approved)
+    return owner_id == user.pk and approval_status in ('pending', 'approved')
@@ -0,0 +1,88 @@
+"""
+Occupancy bitmap helpers for ICPAC Booking System
+
+A room's day is divided into fixed slots of ``SLOT_MINUTES``. Bit ``n`` of a
+day's bitmap is set when a pending or approved booking covers slot ``n``, so
+availability questions reduce to bitwise operations on a single integer.
+"""
+from datetime import time
+
+SLOT_MINUTES = 5
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+BITMAP_BYTES = SLOTS_PER_DAY // 8
+
+# Working hours used for availability levels and free slots (8 AM to 6 PM)
+WORKING_START = time(8, 0)
+WORKING_END = time(18, 0)
+
+
+def time_to_slot(value, round_up=False):
+    """Convert a time to a slot index, rounding partial slots down (or up)"""
+    minutes = value.hour * 60 + value.minute
+    slot, remainder = divmod(minutes, SLOT_MINUTES)
+    if round_up and (remainder or value.second or value.microsecond):
+        slot += 1
+    return min(slot, SLOTS_PER_DAY)
+
+
+def slot_to_time(slot):
+    """Convert a slot index back to the time it starts at"""
+    if slot >= SLOTS_PER_DAY:
+        return time.max
+    hours, minutes = divmod(slot * SLOT_MINUTES, 60)
+    return time(hours, minutes)
+
+
+def slot_mask(start_time, end_time):
+    """
+    Bitmask covering every slot touched by start_time..end_time.
+    Unaligned boundaries are widened, so the mask never under-reports.
+    """
+    start = time_to_slot(start_time)
+    end = time_to_slot(end_time, round_up=True)
+    if end <= start:
+        return 0
+    return ((1 << (end - start)) - 1) << start
+
+
+def to_bytes(bitmap):
+    """Serialize a bitmap for storage"""
+    return bitmap.to_bytes(BITMAP_BYTES, 'little')
+
+
+def from_bytes(data):
+    """Deserialize a stored bitmap (bytes or memoryview)"""
+    if not data:
+        return 0
+    return int.from_bytes(bytes(data), 'little')
+
+
+def booked_minutes(bitmap, start_time=WORKING_START, end_time=WORKING_END):
+    """Number of occupied minutes between start_time and end_time"""
+    return (bitmap & slot_mask(start_time, end_time)).bit_count() * SLOT_MINUTES
+
+
+def availability_level(bitmap):
+    """
+    Availability level for a day bitmap
+    Returns: 'available', 'partially_booked', or 'fully_booked'
+    """
+    working_mask = slot_mask(WORKING_START, WORKING_END)
+    occupied = bitmap & working_mask
+    if not occupied:
+        return 'available'
+    if occupied == working_mask:
+        return 'fully_booked'
+    return 'partially_booked'
+
+
+def free_runs(bitmap, start_time=WORKING_START, end_time=WORKING_END):
+    """Yield (start, end) time pairs for each free run between start_time and end_time"""
+    free = ~bitmap & slot_mask(start_time, end_time)
+    while free:
+        # Lowest free slot, then length of the run of free slots starting there
+        first = (free & -free).bit_length() - 1
+        shifted = free >> first
+        length = (shifted ^ (shifted + 1)).bit_length() - 1
+        yield slot_to_time(first), slot_to_time(first + length)
+        free &= ~(((1 << length) - 1) << first)
@@ -0,0 +1,80 @@
+"""
+Recurring booking rules for ICPAC Booking System
+
+A recurring booking is a single Booking row holding an RFC 5545 RRULE such as
+``FREQ=WEEKLY;BYDAY=TU;COUNT=104``. Its dates are generated from the rule on
+demand: iter_dates() walks only the part of the series a caller asks for, and
+expand() lists the whole (bounded) series when its occurrences are written.
+"""
+from datetime import datetime, time
+from itertools import islice, takewhile
+
+from dateutil.rrule import rrule, rrulestr
+from django.conf import settings
+
+SUPPORTED_FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+
+
+class RecurrenceError(ValueError):
+    """Raised for recurrence rules a booking cannot use"""
+
+
+def max_occurrences():
+    """Upper bound on the number of dates in one recurring booking"""
+    return getattr(settings, 'BOOKING_RECURRENCE_MAX_OCCURRENCES', 104)
+
+
+def parse_rule(rule, start_date):
+    """Parse an RRULE starting on start_date into a dateutil rrule"""
+    text = (rule or '').strip()
+    if text.upper().startswith('RRULE:'):
+        text = text[len('RRULE:'):]
+
+    parts = {}
+    for part in text.upper().split(';'):
+        key, separator, value = part.partition('=')
+        if not separator:
+            raise RecurrenceError(f'Invalid recurrence rule part: {part or "(empty)"}')
+        parts[key] = value
+
+    if parts.get('FREQ') not in SUPPORTED_FREQUENCIES:
+        raise RecurrenceError('Recurrence must repeat daily, weekly, monthly or yearly.')
+    if 'COUNT' not in parts and 'UNTIL' not in parts:
+        raise RecurrenceError('Recurrence must end: set COUNT or UNTIL.')
+
+    try:
+        recurrence = rrulestr(text, dtstart=datetime.combine(start_date, time.min))
+    except (ValueError, TypeError) as exc:
+        raise RecurrenceError(f'Invalid recurrence rule: {exc}') from exc
+
+    if not isinstance(recurrence, rrule):
+        raise RecurrenceError('Only a single RRULE is supported.')
+    return recurrence
+
+
+def iter_dates(rule, start_date, window_start=None, window_end=None):
+    """
+    Lazily yield the dates of a rule, limited to window_start..window_end
+    when given. Dates outside the window are never generated.
+    """
+    recurrence = parse_rule(rule, start_date)
+    after = datetime.combine(max(window_start or start_date, start_date), time.min)
+
+    occurrences = recurrence.xafter(after, inc=True)
+    if window_end:
+        occurrences = takewhile(lambda value: value.date() <= window_end, occurrences)
+
+    for value in occurrences:
+        yield value.date()
+
+
+def expand(rule, start_date):
+    """All dates of a rule, refusing series longer than max_occurrences()"""
+    limit = max_occurrences()
+    dates = list(islice(iter_dates(rule, start_date), limit + 1))
+
+    if not dates:
+        raise RecurrenceError('Recurrence rule does not produce any dates.')
+    if len(dates) > limit:
+        raise RecurrenceError(f'Recurring bookings are limited to {limit} occurrences.')
+    return dates
@@ -1,17 +1,30 @@
 """
 Booking serializers for ICPAC Booking System
 """
+import logging
+
 from rest_framework import serializers
 from django.utils import timezone
 from datetime import datetime, timedelta
-from .models import Booking
+from .models import Booking, BookingOccurrence, can_modify, duration_hours
+from .conflicts import BookingConflictError, database_conflict_check_enabled
+from .recurrence import RecurrenceError
 from apps.rooms.models import Room
 from django.contrib.auth import get_user_model
+from icpac_booking.serializers import SparseFieldsSerializerMixin, ValuesSerializer
+
+logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
 
-class BookingSerializer(serializers.ModelSerializer):
+BOOKING_EXPANDABLE_FIELDS = {
+    'room': 'apps.rooms.serializers.RoomListSerializer',
+    'user': 'apps.authentication.serializers.UserSummarySerializer',
+}
+
+
+class BookingSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for bookings
     """
@@ -21,6 +34,12 @@ class BookingSerializer(serializers.ModelSerializer):
     approval_status_display = serializers.CharField(source='get_approval_status_display', read_only=True)
     duration_hours = serializers.SerializerMethodField()
     can_modify = serializers.SerializerMethodField()
+    expandable_fields = BOOKING_EXPANDABLE_FIELDS
+    field_sources = {
+        'user_name': ('user__first_name', 'user__last_name'),
+        'duration_hours': ('start_date', 'end_date', 'start_time', 'end_time'),
+        'can_modify': ('user', 'approval_status'),
+    }
     
     class Meta:
         model = Booking
@@ -28,7 +47,7 @@ class BookingSerializer(serializers.ModelSerializer):
             'id', 'room', 'room_id', 'room_name', 'user', 'user_name',
             'start_date', 'end_date', 'start_time', 'end_time',
             'purpose', 'expected_attendees', 'special_requirements',
-            'booking_type', 'approval_status', 'approval_status_display', 'approved_by',
+            'booking_type', 'recurrence_rule', 'approval_status', 'approval_status_display', 'approved_by',
             'approved_at', 'rejection_reason', 'duration_hours',
             'can_modify', 'created_at', 'updated_at'
         ]
@@ -103,21 +122,22 @@ class BookingSerializer(serializers.ModelSerializer):
                     'end_time': f'Maximum booking duration is {room.max_booking_duration} hours.'
                 })
         
-        # Check for overlapping bookings
-        if room:
-            overlapping_bookings = Booking.objects.filter(
-                room=room,
-                approval_status__in=['approved', 'pending'],
-                start_date__lte=end_date,
-                end_date__gte=start_date,
-                start_time__lt=end_time,
-                end_time__gt=start_time
+        # Check for overlapping bookings (the exclusion constraint does it on save when enabled)
+        if room and not database_conflict_check_enabled():
+            try:
+                dates = Booking.expand_dates(
+                    attrs.get('booking_type', getattr(self.instance, 'booking_type', 'hourly')),
+                    start_date, end_date,
+                    attrs.get('selected_dates', getattr(self.instance, 'selected_dates', None)),
+                    attrs.get('recurrence_rule', getattr(self.instance, 'recurrence_rule', ''))
+                )
+            except RecurrenceError as exc:
+                raise serializers.ValidationError({'recurrence_rule': str(exc)})
+            overlapping_bookings = BookingOccurrence.overlapping(
+                room, dates, start_time, end_time,
+                exclude_booking=self.instance.pk if self.instance else None
             )
             
-            # Exclude current instance if updating
-            if self.instance:
-                overlapping_bookings = overlapping_bookings.exclude(pk=self.instance.pk)
-            
             if overlapping_bookings.exists():
                 raise serializers.ValidationError({
                     'non_field_errors': 'This time slot conflicts with an existing booking.'
@@ -126,7 +146,7 @@ class BookingSerializer(serializers.ModelSerializer):
         return attrs
 
 
-class BookingListSerializer(serializers.ModelSerializer):
+class BookingListSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """
     Simplified serializer for booking listings
     """
@@ -134,6 +154,10 @@ class BookingListSerializer(serializers.ModelSerializer):
     room_name = serializers.CharField(source='room.name', read_only=True)
     room_id = serializers.IntegerField(source='room.id', read_only=True)  # Add room ID for frontend matching
     approval_status_display = serializers.CharField(source='get_approval_status_display', read_only=True)
+    expandable_fields = BOOKING_EXPANDABLE_FIELDS
+    field_sources = {
+        'user_name': ('user__first_name', 'user__last_name'),
+    }
     
     class Meta:
         model = Booking
@@ -144,6 +168,59 @@ class BookingListSerializer(serializers.ModelSerializer):
         ]
 
 
+APPROVAL_STATUS_LABELS = dict(Booking.APPROVAL_STATUS_CHOICES)
+
+
+def full_name(row):
+    """User.get_full_name() of a values() row"""
+    return f"{row['user__first_name']} {row['user__last_name']}".strip()
+
+
+class BookingValuesSerializer(ValuesSerializer):
+    """
+    BookingSerializer output from values() rows, for read-only lists
+    """
+    serializer_class = BookingSerializer
+    getter_columns = {
+        'user_name': ('user__first_name', 'user__last_name'),
+        'approval_status_display': ('approval_status',),
+        'duration_hours': ('start_date', 'end_date', 'start_time', 'end_time'),
+        'can_modify': ('user_id', 'approval_status'),
+    }
+
+    def get_user_name(self, row):
+        return full_name(row)
+
+    def get_approval_status_display(self, row):
+        return APPROVAL_STATUS_LABELS.get(row['approval_status'], row['approval_status'])
+
+    def get_duration_hours(self, row):
+        return duration_hours(row['start_date'], row['end_date'], row['start_time'], row['end_time'])
+
+    def get_can_modify(self, row):
+        request = self.context.get('request')
+        if not request or not request.user:
+            return False
+        return can_modify(request.user, row['user_id'], row['approval_status'])
+
+
+class BookingListValuesSerializer(ValuesSerializer):
+    """
+    BookingListSerializer output from values() rows
+    """
+    serializer_class = BookingListSerializer
+    getter_columns = {
+        'user_name': ('user__first_name', 'user__last_name'),
+        'approval_status_display': ('approval_status',),
+    }
+
+    def get_user_name(self, row):
+        return full_name(row)
+
+    def get_approval_status_display(self, row):
+        return APPROVAL_STATUS_LABELS.get(row['approval_status'], row['approval_status'])
+
+
 class BookingCreateUpdateSerializer(serializers.ModelSerializer):
     """
     Serializer for creating and updating bookings
@@ -161,9 +238,12 @@ class BookingCreateUpdateSerializer(serializers.ModelSerializer):
         fields = [
             'room', 'start_date', 'end_date', 'start_time', 'end_time',
             'purpose', 'expected_attendees', 'special_requirements',
-            'booking_type', 'selected_dates', 'approval_status', 'approved_by', 'approved_at'
+            'booking_type', 'selected_dates', 'recurrence_rule',
+            'approval_status', 'approved_by', 'approved_at'
         ]
         read_only_fields = ['approval_status', 'approved_by', 'approved_at']
+        # Recurring bookings take their end date from the recurrence rule
+        extra_kwargs = {'end_date': {'required': False}}
 
     def validate(self, attrs):
         """Validate booking data"""
@@ -179,6 +259,21 @@ class BookingCreateUpdateSerializer(serializers.ModelSerializer):
             attrs['start_date'] = min(date_objects)
             attrs['end_date'] = max(date_objects)
 
+        # For recurring bookings, the whole series is expanded once from the rule
+        series_dates = None
+        if booking_type == 'recurring':
+            try:
+                series_dates = Booking.expand_dates(
+                    booking_type, attrs.get('start_date'), None,
+                    recurrence_rule=attrs.get('recurrence_rule', '')
+                )
+            except RecurrenceError as exc:
+                raise serializers.ValidationError({'recurrence_rule': str(exc)})
+            attrs['start_date'] = series_dates[0]
+            attrs['end_date'] = series_dates[-1]
+        elif 'end_date' not in attrs and not self.partial:
+            raise serializers.ValidationError({'end_date': 'This field is required.'})
+
         start_date = attrs.get('start_date')
         end_date = attrs.get('end_date', start_date)
         start_time = attrs.get('start_time')
@@ -213,21 +308,24 @@ class BookingCreateUpdateSerializer(serializers.ModelSerializer):
                 'expected_attendees': f'Exceeds room capacity ({room.capacity}).'
             })
         
-        # Check overlapping bookings
-        if room:
-            overlapping = Booking.objects.filter(
-                room=room,
-                approval_status__in=['approved', 'pending'],
-                start_date__lte=end_date,
-                end_date__gte=start_date,
-                start_time__lt=end_time,
-                end_time__gt=start_time
+        # Check overlapping bookings (the exclusion constraint does it on save when enabled)
+        if room and not database_conflict_check_enabled():
+            dates = series_dates or Booking.expand_dates(booking_type, start_date, end_date, selected_dates)
+            overlapping = BookingOccurrence.overlapping(
+                room, dates, start_time, end_time,
+                exclude_booking=self.instance.pk if self.instance else None
             )
             
-            if self.instance:
-                overlapping = overlapping.exclude(pk=self.instance.pk)
-            
-            if overlapping.exists():
+            # One query checks every date of a series and names the clashes
+            if series_dates:
+                conflict_dates = sorted(set(overlapping.values_list('date', flat=True)))
+                if conflict_dates:
+                    raise serializers.ValidationError({
+                        'non_field_errors': 'Time slot is already booked on: ' + ', '.join(
+                            day.strftime('%Y-%m-%d') for day in conflict_dates
+                        )
+                    })
+            elif overlapping.exists():
                 raise serializers.ValidationError({
                     'non_field_errors': 'Time slot is already booked.'
                 })
@@ -239,19 +337,32 @@ class BookingCreateUpdateSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         validated_data['user'] = request.user
 
-        # Debug logging for weekly bookings
         if validated_data.get('booking_type') == 'weekly':
-            print(f"DEBUG Weekly booking dates: start={validated_data.get('start_date')}, end={validated_data.get('end_date')}")
-            if validated_data.get('start_date') and validated_data.get('end_date'):
-                duration = (validated_data['end_date'] - validated_data['start_date']).days + 1
-                print(f"DEBUG Duration calculation: {duration} days")
+            logger.debug(
+                'Weekly booking dates: start=%s, end=%s',
+                validated_data.get('start_date'), validated_data.get('end_date')
+            )
 
         # Auto-approve bookings since validation already checked for conflicts
         validated_data['approval_status'] = 'approved'
         validated_data['approved_by'] = request.user
         validated_data['approved_at'] = timezone.now()
 
-        return super().create(validated_data)
+        try:
+            return super().create(validated_data)
+        except BookingConflictError:
+            raise serializers.ValidationError({
+                'non_field_errors': 'Time slot is already booked.'
+            })
+
+    def update(self, instance, validated_data):
+        """Update booking, reporting database-detected overlaps as validation errors"""
+        try:
+            return super().update(instance, validated_data)
+        except BookingConflictError:
+            raise serializers.ValidationError({
+                'non_field_errors': 'Time slot is already booked.'
+            })
 
 
 class BookingApprovalSerializer(serializers.Serializer):
@@ -1,23 +1,50 @@
 """
-Django signals for booking notifications (WebSocket disabled for now)
+Django signals for ICPAC Booking System
+
+Keep the derived booking tables and the availability cache in step with
+bookings and rooms.
 """
-from django.db.models.signals import post_save, post_delete
+import logging
+
+from django.db.models.signals import post_save, pre_delete, post_delete
 from django.dispatch import receiver
-from .models import Booking
+from apps.rooms.models import Room
+from . import cache as availability_cache
+from .models import Booking, BookingOccurrence, RoomOccupancy, RoomUsageDaily
+
+logger = logging.getLogger(__name__)
 
 
 @receiver(post_save, sender=Booking)
 def booking_saved(sender, instance, created, **kwargs):
-    """Handle booking save - WebSocket disabled for now"""
-    # WebSocket functionality temporarily disabled due to Redis dependency
-    # TODO: Re-enable when Redis is properly configured
-    if created:
-        print(f"New booking created: {instance.purpose} in {instance.room.name}")
-    else:
-        print(f"Booking updated: {instance.purpose} in {instance.room.name}")
+    """Handle booking save"""
+    # Keep the occurrence table, occupancy index and usage rollup in step with the booking
+    removed, added = BookingOccurrence.sync_booking(instance, created)
+    RoomOccupancy.sync_booking(removed, added)
+    RoomUsageDaily.sync_booking(removed, added)
+    # A booking moved to another room changes the old room's answers too
+    availability_cache.bump_on_commit(instance.room_id, *{row[0] for row in removed})
+    logger.info('Booking %s %s in room %s', instance.pk, 'created' if created else 'updated', instance.room_id)
+
+
+@receiver(pre_delete, sender=Booking)
+def booking_pre_delete(sender, instance, **kwargs):
+    """Remember the occurrences of a booking; they are gone by post_delete"""
+    instance._deleted_occurrences = list(BookingOccurrence.stored_rows(instance))
 
 
 @receiver(post_delete, sender=Booking)
 def booking_deleted(sender, instance, **kwargs):
     """Handle booking deletion"""
-    print(f"Booking cancelled: {instance.purpose} in {instance.room.name}")
\ No newline at end of file
+    removed = getattr(instance, '_deleted_occurrences', [])
+    RoomOccupancy.sync_booking(removed, [])
+    RoomUsageDaily.sync_booking(removed, [])
+    availability_cache.bump_on_commit(instance.room_id)
+    logger.info('Booking %s cancelled in room %s', instance.pk, instance.room_id)
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def room_changed(sender, instance, **kwargs):
+    """Drop cached availability of a room whose details or status changed"""
+    availability_cache.bump_on_commit(instance.pk)
@@ -0,0 +1,86 @@
+"""
+Booking statistics service for ICPAC Booking System
+
+All dashboard counters for a set of bookings (per status, recent, today and
+this week) come from a single aggregate query using conditional counts.
+Results are cached per scope for BOOKING_STATS_CACHE_TTL seconds, so a burst
+of dashboard loads costs one query per scope instead of one per counter.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import Booking, BookingOccurrence
+
+CACHE_PREFIX = 'booking_stats'
+
+
+def cache_ttl():
+    """Seconds a scope's statistics stay cached"""
+    return getattr(settings, 'BOOKING_STATS_CACHE_TTL', 30)
+
+
+def compute_stats(bookings, today):
+    """Every counter for a booking queryset in one aggregate query"""
+    def approved_on(dates):
+        return Exists(BookingOccurrence.objects.filter(
+            booking=OuterRef('pk'),
+            approval_status='approved',
+            **dates
+        ))
+
+    return bookings.order_by().aggregate(
+        total=Count('id'),
+        approved=Count('id', filter=Q(approval_status='approved')),
+        pending=Count('id', filter=Q(approval_status='pending')),
+        rejected=Count('id', filter=Q(approval_status='rejected')),
+        cancelled=Count('id', filter=Q(approval_status='cancelled')),
+        recent=Count('id', filter=Q(start_date__range=[today - timedelta(days=30), today])),
+        today=Count('id', filter=approved_on({'date': today})),
+        this_week=Count('id', filter=approved_on({'date__range': [today, today + timedelta(days=7)]})),
+    )
+
+
+def scope_stats(scope, bookings):
+    """Counters for the bookings of a named scope, served from cache when fresh"""
+    today = timezone.now().date()
+    key = f'{CACHE_PREFIX}:{scope}:{today.isoformat()}'
+
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_stats(bookings, today)
+        cache.set(key, stats, cache_ttl())
+    return stats
+
+
+def user_stats(user):
+    """Counters for the bookings a user made"""
+    return scope_stats(f'user:{user.pk}', Booking.objects.filter(user=user))
+
+
+def managed_stats(user):
+    """
+    Counters for the bookings an admin oversees: every booking for a super
+    admin, bookings in their managed rooms for a room admin
+    """
+    if user.role == 'super_admin':
+        return system_stats()
+    return scope_stats(
+        f'rooms:{user.pk}',
+        Booking.objects.filter(room_id__in=user.managed_rooms.values('id'))
+    )
+
+
+def system_stats():
+    """Counters for all bookings"""
+    return scope_stats('all', Booking.objects.all())
+
+
+def role_stats(user):
+    """Counters for the bookings a user's dashboard covers"""
+    if user.role in ['super_admin', 'room_admin']:
+        return managed_stats(user)
+    return user_stats(user)
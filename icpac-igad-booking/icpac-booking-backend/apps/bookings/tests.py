@@ -1,3 +1,1632 @@
-from django.test import TestCase
+import asyncio
+from datetime import date, time, timedelta
+from importlib import import_module
+import io
+import json
+import random
+import re
+import tempfile
+import threading
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection
+from django.db.models import F
+from django.test import (
+    LiveServerTestCase, SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.authentication.models import User
+from apps.authentication.serializers import UserSummarySerializer
+from apps.rooms.models import Room
+from apps.rooms.serializers import RoomListSerializer
+from apps.security.models import AuditLog, LoginAttempt
+from .models import Booking, BookingOccurrence, RoomOccupancy, RoomUsageDaily
+from . import benchmarks, cache as availability_cache, conflicts, loadtest, occupancy, recurrence, stats as booking_stats
+from .admin import BookingAdmin
+from .availability import AvailabilityWindow, free_time_slots, sweep_schedule
+from .serializers import (
+    BookingListSerializer, BookingListValuesSerializer, BookingSerializer, BookingValuesSerializer,
+)
+from .views import BookingListView, calendar_occurrences, filter_bookings, pending_bookings_for, visible_bookings
+from icpac_booking.querybudget import QueryBudgetTestMixin
+from icpac_booking.serializers import ValuesSerializer
+
+
+class BookingIndexPlanTests(TestCase):
+    """
+    The hot booking queries must be answered from an index, not a full table
+    scan. Each test runs the real query builder on a large synthetic dataset
+    and inspects EXPLAIN for every statement it sends, so a new filter that
+    the index set does not cover fails here instead of in production.
+    """
+    ROOMS = 30
+    USERS = 300
+    BOOKINGS = 20000
+    FIRST_DAY = date(2024, 1, 1)
+    DAYS = 3 * 365
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(7)
+        cls.rooms = Room.objects.bulk_create([
+            Room(name=f'Room {n}', capacity=20, category='meeting') for n in range(cls.ROOMS)
+        ])
+        cls.users = User.objects.bulk_create([
+            User(username=f'user{n}', email=f'user{n}@icpac.net', role='user') for n in range(cls.USERS)
+        ])
+        cls.admin = User.objects.create(username='admin', email='admin@icpac.net', role='super_admin')
+        cls.room_admin = User.objects.create(username='roomadmin', email='roomadmin@icpac.net', role='room_admin')
+        cls.room_admin.managed_rooms.set(cls.rooms[:2])
+
+        statuses = ['approved'] * 17 + ['pending', 'rejected', 'cancelled']
+        # Distinct (room, day, hour) slots, so no two bookings overlap
+        slots = rng.sample(range(cls.ROOMS * cls.DAYS * 9), cls.BOOKINGS)
+        bookings = []
+        for slot in slots:
+            room_index, slot = divmod(slot, cls.DAYS * 9)
+            day_offset, hour_offset = divmod(slot, 9)
+            day = cls.FIRST_DAY + timedelta(days=day_offset)
+            start_hour = 8 + hour_offset
+            bookings.append(Booking(
+                room=cls.rooms[room_index],
+                user=rng.choice(cls.users),
+                start_date=day,
+                end_date=day,
+                start_time=time(start_hour),
+                end_time=time(start_hour + 1),
+                purpose='Synthetic booking',
+                approval_status=rng.choice(statuses),
+            ))
+        # bulk_create skips save() and its signals, so occurrences are written directly
+        Booking.objects.bulk_create(bookings, batch_size=2000)
+        BookingOccurrence.objects.bulk_create([
+            BookingOccurrence(
+                booking=booking, room_id=booking.room_id, date=booking.start_date,
+                start_time=booking.start_time, end_time=booking.end_time,
+                approval_status=booking.approval_status,
+            )
+            for booking in Booking.objects.all()
+        ], batch_size=2000)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def explain(self, sql):
+        prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql)
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
+    def assertIndexed(self, run, table, indexes):
+        """Every statement run() sends to table reads it through one of indexes"""
+        with CaptureQueriesContext(connection) as queries:
+            run()
+        statements = [query['sql'] for query in queries if f'"{table}"' in query['sql']]
+        self.assertTrue(statements, f'No query touched {table}')
+
+        for sql in statements:
+            plan = self.explain(sql)
+            self.assertNotRegex(plan, rf'Seq Scan on {table}\b|SCAN {table}(?! USING)', f'{sql}\n{plan}')
+            self.assertTrue(any(index in plan for index in indexes), f'{sql}\n{plan}')
+
+    def test_overlap_check_uses_room_slot_index(self):
+        room = self.rooms[3]
+        dates = [date(2025, 3, 4), date(2025, 3, 11), date(2025, 3, 18)]
+        self.assertIndexed(
+            lambda: list(BookingOccurrence.overlapping(room, dates, time(10), time(12))),
+            'booking_occurrences', {'occurrence_room_slot_idx'}
+        )
+
+    def test_room_status_date_filter_uses_room_index(self):
+        params = {'room': str(self.rooms[5].id), 'status': 'pending', 'date_from': '2025-01-01', 'date_to': '2025-02-01'}
+        self.assertIndexed(
+            lambda: list(filter_bookings(visible_bookings(self.admin), params)),
+            'bookings', {'booking_room_status_dates_idx'}
+        )
+
+    def test_calendar_window_uses_date_status_index(self):
+        self.assertIndexed(
+            lambda: list(calendar_occurrences(self.admin, date(2025, 6, 1), date(2025, 6, 30))),
+            'booking_occurrences', {'occurrence_date_status_idx'}
+        )
+
+    def test_room_admin_calendar_uses_indexes(self):
+        self.assertIndexed(
+            lambda: list(calendar_occurrences(self.room_admin, date(2025, 6, 1), date(2025, 6, 30))),
+            'booking_occurrences', {'occurrence_date_status_idx', 'occurrence_room_slot_idx'}
+        )
+
+    def test_pending_approvals_use_status_created_index(self):
+        self.assertIndexed(
+            lambda: list(pending_bookings_for(self.admin)[:20]),
+            'bookings', {'booking_status_created_idx'}
+        )
+
+    def test_room_admin_pending_approvals_use_indexes(self):
+        self.assertIndexed(
+            lambda: list(pending_bookings_for(self.room_admin)),
+            'bookings', {'booking_status_created_idx', 'booking_room_status_dates_idx'}
+        )
+
+    def test_per_user_counts_use_user_index(self):
+        user = self.users[42]
+        self.assertIndexed(
+            lambda: booking_stats.compute_stats(Booking.objects.filter(user=user), date(2025, 6, 1)),
+            'bookings', {'booking_user_status_idx', 'booking_user_start_idx'}
+        )
+
+
+@override_settings(AUDIT_LOG_ASYNC=False, LOG_API_REQUESTS=False)
+class BookingEndpointBudgetTests(QueryBudgetTestMixin, APITestCase):
+    """
+    Every booking endpoint stays within its query budget, with more rows
+    than a page so that a per-row query shows up as a repeated shape.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rooms = [
+            Room.objects.create(name=f'Room {n}', capacity=20, category='meeting')
+            for n in range(3)
+        ]
+        cls.admin = User.objects.create(username='admin', email='admin@icpac.net', role='super_admin')
+        cls.room_admin = User.objects.create(username='roomadmin', email='roomadmin@icpac.net', role='room_admin')
+        cls.room_admin.managed_rooms.set(cls.rooms[:2])
+        cls.users = [
+            User.objects.create(username=f'user{n}', email=f'user{n}@icpac.net', first_name='User', last_name=str(n))
+            for n in range(3)
+        ]
+
+        cls.day = timezone.now().date() + timedelta(days=3)
+        cls.bookings = []
+        for n in range(12):
+            cls.bookings.append(Booking.objects.create(
+                room=cls.rooms[n % 2],
+                user=cls.users[n % 3],
+                start_date=cls.day + timedelta(days=n // 6),
+                end_date=cls.day + timedelta(days=n // 6),
+                start_time=time(8 + n % 6),
+                end_time=time(9 + n % 6),
+                purpose=f'Meeting {n}',
+                approval_status='pending' if n % 2 else 'approved',
+            ))
+
+    def setUp(self):
+        super().setUp()
+        caches['default'].clear()
+
+    def login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+    def test_booking_crud(self):
+        self.login(self.users[0])
+        response = self.client.post('/api/bookings/', {
+            'room': self.rooms[2].id,
+            'start_date': str(self.day),
+            'end_date': str(self.day),
+            'start_time': '10:00',
+            'end_time': '11:00',
+            'purpose': 'Planning',
+            'booking_type': 'hourly',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertWithinBudget(response)
+        created = Booking.objects.get(purpose='Planning')
+        self.assertEqual((created.user, created.approval_status), (self.users[0], 'approved'))
+        self.assertTrue(BookingOccurrence.objects.filter(booking=created, date=self.day).exists())
+
+        url = f'/api/bookings/{self.bookings[0].id}/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        self.assertEqual(
+            (response.data['id'], response.data['room_name'], response.data['purpose']),
+            (self.bookings[0].id, 'Room 0', 'Meeting 0')
+        )
+
+        response = self.client.patch(url, {
+            'room': self.rooms[0].id,
+            'start_date': str(self.day),
+            'end_date': str(self.day),
+            'start_time': '08:00',
+            'end_time': '09:00',
+            'purpose': 'Renamed',
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertWithinBudget(response)
+        # Editing an approved booking sends it back for approval
+        booking = Booking.objects.get(pk=self.bookings[0].pk)
+        self.assertEqual((booking.purpose, booking.approval_status, booking.approved_by), ('Renamed', 'pending', None))
+
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, 204)
+        self.assertWithinBudget(response)
+        self.assertEqual(Booking.objects.get(pk=self.bookings[0].pk).approval_status, 'cancelled')
+
+    def test_booking_lists(self):
+        self.login(self.admin)
+        response = self.client.get('/api/bookings/', {'page_size': 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        self.assertEqual(set(response.data), {'next', 'previous', 'results'})
+        self.assertIsNone(response.data['previous'])
+        newest_first = [booking.id for booking in reversed(self.bookings)]
+        self.assertEqual([booking['id'] for booking in response.data['results']], newest_first[:10])
+
+        response = self.client.get(response.data['next'])
+        self.assertWithinBudget(response)
+        self.assertEqual([booking['id'] for booking in response.data['results']], newest_first[10:])
+        self.assertIsNone(response.data['next'])
+
+        self.login(self.room_admin)
+        response = self.client.get('/api/bookings/', {'page': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        self.assertEqual(response.data['count'], 12)
+
+        self.login(self.users[0])
+        response = self.client.get('/api/bookings/my-bookings/')
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        self.assertEqual(response.data['statistics'], {
+            'total_bookings': 4, 'approved_bookings': 2, 'pending_bookings': 2,
+        })
+        self.assertEqual(
+            [booking['id'] for booking in response.data['upcoming_bookings']],
+            [booking.id for booking in (self.bookings[0], self.bookings[3], self.bookings[6], self.bookings[9])]
+        )
+
+    def test_approvals(self):
+        pending = [booking.id for booking in self.bookings if booking.approval_status == 'pending']
+        for user in (self.admin, self.room_admin):
+            self.login(user)
+            response = self.client.get('/api/bookings/pending-approvals/')
+            self.assertEqual(response.status_code, 200)
+            self.assertWithinBudget(response)
+            self.assertEqual(response.data['count'], 6)
+            self.assertEqual([booking['id'] for booking in response.data['pending_bookings']], pending)
+
+        self.login(self.admin)
+        response = self.client.post(
+            f'/api/bookings/{self.bookings[1].id}/approve-reject/', {'action': 'approve'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertWithinBudget(response)
+        self.assertEqual(response.data['booking']['approval_status'], 'approved')
+        self.assertEqual(Booking.objects.get(pk=self.bookings[1].pk).approved_by, self.admin)
+        self.assertEqual(self.client.get('/api/bookings/pending-approvals/').data['count'], 5)
+
+    def test_dashboard_and_calendar(self):
+        expected = {self.admin: (12, 6, 6), self.room_admin: (12, 6, 6), self.users[0]: (4, 2, 2)}
+        for user, (total, approved, pending) in expected.items():
+            self.login(user)
+            response = self.client.get('/api/bookings/dashboard/stats/')
+            self.assertEqual(response.status_code, 200)
+            self.assertWithinBudget(response)
+            statistics = response.data['statistics']
+            self.assertEqual(
+                (statistics['total_bookings'], statistics['approved_bookings'], statistics['pending_bookings']),
+                (total, approved, pending)
+            )
+            self.assertEqual('most_popular_room' in statistics, user.role != 'user')
+
+        window = {'start': str(self.day), 'end': str(self.day + timedelta(days=1))}
+        # Admins see approved bookings of every room, users all of their own
+        expected = {self.admin: self.bookings[::2], self.users[0]: self.bookings[::3]}
+        for user, bookings in expected.items():
+            self.login(user)
+            response = self.client.get('/api/bookings/calendar/events/', window)
+            self.assertEqual(response.status_code, 200)
+            self.assertWithinBudget(response)
+            self.assertEqual(
+                sorted(event['extendedProps']['booking_id'] for event in response.data['events']),
+                sorted(booking.id for booking in bookings)
+            )
+            self.assertEqual(response.data['total_events'], len(bookings))
+
+    def test_availability(self):
+        response = self.client.post('/api/bookings/check-availability/', {
+            'room_id': self.rooms[0].id,
+            'start_date': str(self.day),
+            'end_date': str(self.day + timedelta(days=1)),
+            'start_time': '08:00',
+            'end_time': '16:00',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        self.assertFalse(response.data['available'])
+        self.assertEqual(
+            sorted(conflict['id'] for conflict in response.data['conflicts']),
+            sorted(booking.id for booking in self.bookings[::2])
+        )
+
+        response = self.client.get('/api/bookings/availability-levels/', {'date': str(self.day)})
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        levels = {room['room_id']: room['availability_level'] for room in response.data['rooms']}
+        self.assertEqual(levels[self.rooms[2].id], 'available')
+        self.assertEqual(levels[self.rooms[0].id], 'partially_booked')
+
+        response = self.client.get('/api/bookings/available-rooms/', {
+            'date': str(self.day), 'start_time': '08:00', 'end_time': '10:00',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        self.assertEqual([room['id'] for room in response.data['available_rooms']], [self.rooms[2].id])
+
+        response = self.client.get(f'/api/bookings/room/{self.rooms[0].id}/schedule/', {
+            'start_date': str(self.day),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        day = response.data['schedule'][str(self.day)]
+        self.assertEqual([booking['start_time'] for booking in day['bookings']], ['08:00', '10:00', '12:00'])
+        self.assertFalse(day['is_fully_booked'])
+
+    def test_export(self):
+        self.login(self.admin)
+        for export_format in ('csv', 'xlsx'):
+            response = self.client.get(f'/api/bookings/export/{export_format}/')
+            self.assertEqual(response.status_code, 200)
+            b''.join(response.streaming_content)
+            self.assertWithinBudget(response)
+
+
+@override_settings(AUDIT_LOG_ASYNC=False, LOG_API_REQUESTS=False)
+class BookingSparseFieldsTests(APITestCase):
+    """?fields= and ?expand= on booking lists and details"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rooms = [Room.objects.create(name=f'Room {n}', capacity=20, category='meeting') for n in range(2)]
+        cls.admin = User.objects.create(username='admin', email='admin@icpac.net', role='super_admin')
+        cls.users = [
+            User.objects.create(username=f'user{n}', email=f'user{n}@icpac.net', first_name='User', last_name=str(n))
+            for n in range(3)
+        ]
+        day = timezone.now().date() + timedelta(days=3)
+        cls.bookings = [
+            Booking.objects.create(
+                room=cls.rooms[n % 2], user=cls.users[n % 3], start_date=day, end_date=day,
+                start_time=time(8 + n), end_time=time(9 + n), purpose=f'Meeting {n}',
+            )
+            for n in range(8)
+        ]
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+
+    def get(self, path, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        booking_queries = [query['sql'] for query in queries if 'FROM "bookings"' in query['sql']]
+        return response.data, booking_queries
+
+    def test_list_fields(self):
+        full = self.client.get('/api/bookings/', {'page_size': 5}).data['results']
+        data, sql = self.get('/api/bookings/', {'fields': 'id,room_name', 'page_size': 5})
+        self.assertEqual(data['results'], [{'id': row['id'], 'room_name': row['room_name']} for row in full])
+        # The projection reads the requested columns and the keyset ordering
+        select = sql[-1].split(' FROM ')[0]
+        self.assertEqual(
+            re.findall(r'"\w+"\."\w+"', select), ['"bookings"."id"', '"rooms"."name"', '"bookings"."created_at"']
+        )
+
+        # The cursor taken from the trimmed rows resumes after the page
+        rest, _ = self.get(data['next'], {})
+        self.assertEqual(
+            [row['id'] for row in data['results'] + rest['results']],
+            list(Booking.objects.order_by('-created_at', '-id').values_list('id', flat=True)),
+        )
+
+    def test_list_expand(self):
+        data, sql = self.get('/api/bookings/', {'fields': 'id,room,user', 'expand': 'room,user', 'page_size': 2})
+        many, more_sql = self.get('/api/bookings/', {'fields': 'id,room,user', 'expand': 'room,user', 'page_size': 8})
+        # Expanded relations are joined, not fetched per row
+        self.assertEqual(len(sql), len(more_sql))
+        by_id = {booking.id: booking for booking in self.bookings}
+        for row in many['results']:
+            booking = by_id[row['id']]
+            self.assertEqual(set(row), {'id', 'room', 'user'})
+            self.assertEqual(row['room'], RoomListSerializer(booking.room).data)
+            self.assertEqual(row['user'], UserSummarySerializer(booking.user).data)
+
+    def test_detail_fields(self):
+        booking = self.bookings[0]
+        full = self.client.get(f'/api/bookings/{booking.id}/').data
+        data, sql = self.get(f'/api/bookings/{booking.id}/', {
+            'fields': 'id,duration_hours,can_modify,room', 'expand': 'room',
+        })
+        self.assertEqual(data, {
+            'id': booking.id, 'duration_hours': full['duration_hours'], 'can_modify': full['can_modify'],
+            'room': RoomListSerializer(booking.room).data,
+        })
+        self.assertEqual(data['duration_hours'], 1.0)
+        self.assertNotIn('"purpose"', sql[0])
+
+    def test_unknown_names_are_rejected(self):
+        response = self.client.get('/api/bookings/', {'fields': 'id,email'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Unknown field(s): email', response.data['fields'])
+        response = self.client.get(f'/api/bookings/{self.bookings[0].id}/', {'expand': 'approved_by'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['expand'], 'Unknown field(s): approved_by. Available: room, user.')
+
+
+@override_settings(AUDIT_LOG_ASYNC=False, LOG_API_REQUESTS=False)
+class ValuesSerializerTests(APITestCase):
+    """The values() serializers render exactly the JSON of the ModelSerializers they replace"""
+
+    @classmethod
+    def setUpTestData(cls):
+        rooms = [Room.objects.create(name=f'Room {n}', capacity=20, category='meeting') for n in range(2)]
+        cls.admin = User.objects.create(
+            username='admin', email='admin@icpac.net', first_name='Ada', last_name='Admin', role='super_admin'
+        )
+        cls.owner = User.objects.create(username='owner', email='owner@icpac.net', first_name='Owen')
+        cls.other = User.objects.create(username='other', email='other@icpac.net', first_name=' ', last_name='Other')
+        day = timezone.now().date() + timedelta(days=2)
+        for n, status in enumerate(['pending', 'approved', 'rejected', 'cancelled', 'pending', 'approved']):
+            Booking.objects.create(
+                room=rooms[n % 2],
+                user=cls.owner if n % 3 else cls.other,
+                start_date=day + timedelta(days=n),
+                end_date=day + timedelta(days=n + n % 2),
+                start_time=time(8 + n, 30 if n % 2 else 0),
+                end_time=time(10 + n, 15),
+                purpose=f'Meeting {n}',
+                special_requirements='Projector' if n % 2 else '',
+                booking_type='multi_day' if n % 2 else 'hourly',
+                approval_status=status,
+                approved_by=cls.admin if status in ('approved', 'rejected') else None,
+                approved_at=timezone.now() if status in ('approved', 'rejected') else None,
+            )
+
+    def render(self, data):
+        return JSONRenderer().render(data)
+
+    def test_rows_match_model_serializers(self):
+        queryset = Booking.objects.select_related('room', 'user').order_by('-created_at')
+        pairs = [(BookingListSerializer, BookingListValuesSerializer), (BookingSerializer, BookingValuesSerializer)]
+        for user in (None, self.admin, self.owner, self.other):
+            request = APIRequestFactory().get('/api/bookings/')
+            request.user = user
+            context = {'request': request} if user else {}
+            for model_serializer, values_serializer in pairs:
+                with self.subTest(user=user and user.username, serializer=values_serializer.__name__):
+                    self.assertEqual(
+                        self.render(values_serializer(queryset, context=context).data),
+                        self.render(model_serializer(queryset, many=True, context=context).data),
+                    )
+
+    def test_booking_list_matches_model_serializer_path(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+        for params in ({'page_size': 4}, {'page': 2, 'page_size': 4}, {'status': 'approved'}):
+            with self.subTest(params=params):
+                fast = self.client.get('/api/bookings/', params)
+                with mock.patch.object(BookingListView, 'values_serializer_class', None):
+                    regular = self.client.get('/api/bookings/', params)
+                self.assertEqual(fast.status_code, 200)
+                self.assertEqual(fast.content, regular.content)
+
+        # The keyset cursor taken from a values() row resumes where the page ended
+        first = self.client.get('/api/bookings/', {'page_size': 4}).json()
+        second = self.client.get(first['next']).json()
+        self.assertEqual(len(first['results']) + len(second['results']), Booking.objects.count())
+
+    def test_sparse_rows_match_model_serializers(self):
+        queryset = Booking.objects.select_related('room', 'user').order_by('-created_at')
+        request = APIRequestFactory().get('/api/bookings/')
+        request.user = self.owner
+        pairs = [(BookingListSerializer, BookingListValuesSerializer), (BookingSerializer, BookingValuesSerializer)]
+        for model_serializer, values_serializer in pairs:
+            for name, column, field, getter in values_serializer.plan():
+                with self.subTest(serializer=values_serializer.__name__, field=name):
+                    fields = ['id', name]
+                    self.assertEqual(
+                        self.render(values_serializer(queryset, context={'request': request}, fields=fields).data),
+                        self.render(model_serializer(
+                            queryset, many=True, context={'request': request}, fields=fields
+                        ).data),
+                    )
+
+    def test_row_getters_apply_the_model_rules(self):
+        room_admin = User.objects.create(username='rooms', email='rooms@icpac.net', role='room_admin')
+        fields = ['id', 'duration_hours', 'can_modify']
+        columns = BookingValuesSerializer.columns(fields)
+        self.assertEqual(
+            set(columns), {'id', 'start_date', 'end_date', 'start_time', 'end_time', 'user_id', 'approval_status'}
+        )
+        bookings = Booking.objects.order_by('pk')
+        rows = list(bookings.values(*columns))
+        for user in (self.admin, room_admin, self.owner, self.other):
+            request = APIRequestFactory().get('/api/bookings/')
+            request.user = user
+            data = BookingValuesSerializer(rows, context={'request': request}, fields=fields).data
+            with self.subTest(user=user.username):
+                self.assertEqual(
+                    [(item['duration_hours'], item['can_modify']) for item in data],
+                    [(booking.get_duration_hours(), booking.can_be_modified_by(user)) for booking in bookings],
+                )
+        # Owners keep their pending and approved bookings only
+        owned = [
+            item['can_modify'] for item, row in zip(data, rows) if row['user_id'] == self.other.pk
+        ]
+        self.assertEqual(owned, [True, False])
+        # Multi-day bookings count the hours between the first start and the last end
+        self.assertEqual(data[1]['duration_hours'], 24 + 11.25 - 9.5)
+
+    def test_method_fields_need_a_row_getter(self):
+        class Incomplete(ValuesSerializer):
+            serializer_class = BookingListSerializer
+
+        with self.assertRaisesMessage(ImproperlyConfigured, 'get_user_name'):
+            Incomplete.plan()
+
+
+@override_settings(AUDIT_LOG_ASYNC=False, LOG_API_REQUESTS=False)
+class GenerateLoadDataTests(TestCase):
+    """generate_load_data writes the requested volume without double-booking any room"""
+    options = dict(
+        users=20, rooms=4, amenities=3, bookings=150, years=1, audit_logs=30, login_attempts=25,
+        start_date='2025-01-01', batch_size=40, prefix='gen',
+    )
+
+    def generate(self, **options):
+        call_command('generate_load_data', stdout=io.StringIO(), **{**self.options, **options})
+
+    def test_row_counts(self):
+        self.generate()
+        self.assertEqual(User.objects.filter(username__startswith='gen_').count(), 20)
+        self.assertEqual(Room.objects.filter(name__startswith='[gen] ').count(), 4)
+        self.assertEqual(Booking.objects.count(), 150)
+        self.assertEqual(AuditLog.objects.filter(user_agent='generate_load_data/gen').count(), 30)
+        self.assertEqual(LoginAttempt.objects.filter(email__startswith='gen.').count(), 25)
+        # Every booking has an occurrence on its first and last day
+        self.assertFalse(Booking.objects.exclude(occurrences__date=F('start_date')).exists())
+        self.assertFalse(Booking.objects.exclude(occurrences__date=F('end_date')).exists())
+
+        with self.assertRaisesMessage(CommandError, 'already exists'):
+            self.generate()
+
+    def test_active_occurrences_never_overlap(self):
+        self.generate()
+        days = {}
+        for occurrence in BookingOccurrence.objects.filter(approval_status__in=Booking.ACTIVE_STATUSES):
+            days.setdefault((occurrence.room_id, occurrence.date), []).append(
+                (occurrence.start_time, occurrence.end_time)
+            )
+        self.assertTrue(days)
+        for (room_id, day), slots in days.items():
+            slots.sort()
+            for (_, end), (start, _) in zip(slots, slots[1:]):
+                self.assertLessEqual(end, start, f'Room {room_id} is double-booked on {day}')
+
+    def test_derived_tables_match_a_rebuild(self):
+        self.generate()
+        room_ids = list(Room.objects.values_list('id', flat=True))
+        active_days = set(BookingOccurrence.objects.filter(
+            approval_status__in=Booking.ACTIVE_STATUSES
+        ).values_list('room_id', 'date'))
+        self.assertEqual(set(RoomOccupancy.objects.values_list('room_id', 'date')), active_days)
+        self.assertEqual(
+            set(RoomUsageDaily.objects.values_list('room_id', 'date')),
+            set(BookingOccurrence.objects.values_list('room_id', 'date'))
+        )
+
+        last_day = BookingOccurrence.objects.order_by('-date').values_list('date', flat=True)[0]
+        with CaptureQueriesContext(connection) as queries:
+            for room_id in room_ids:
+                RoomOccupancy.rebuild(room_id, date(2025, 1, 1), last_day)
+                RoomUsageDaily.rebuild(room_id, date(2025, 1, 1), last_day)
+        writes = [query['sql'] for query in queries if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        self.assertEqual(writes, [])
+
+    def test_same_seed_gives_the_same_data(self):
+        def snapshot():
+            return list(Booking.objects.order_by('purpose').values_list(
+                'purpose', 'room__name', 'start_date', 'end_date', 'start_time', 'end_time', 'approval_status'
+            ))
+
+        self.generate()
+        first = snapshot()
+        self.generate(clear=True)
+        self.assertEqual(snapshot(), first)
+        self.assertEqual(Room.objects.count(), 4)
+
+
+@override_settings(AUDIT_LOG_ASYNC=False, LOG_API_REQUESTS=False)
+class EndpointBenchmarkTests(TestCase):
+    """
+    The benchmark scenarios keep working against generated data, and their
+    results round-trip through the baselines into the report
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        options = benchmarks.dataset_options('small')
+        options.update(users=10, rooms=3, bookings=200)
+        call_command('generate_load_data', stdout=io.StringIO(), **options)
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_scenario_requests_hit_the_dataset(self):
+        context = benchmarks.BenchmarkContext()
+        self.assertEqual(len(context.rooms), 3)
+        self.assertEqual((context.admin.role, context.user.role), ('super_admin', 'user'))
+
+        rng = random.Random(1)
+        method, path, data, user, expected = benchmarks.calendar_events(context, rng, 0)
+        self.assertLessEqual(context.first_day, date.fromisoformat(data['start']))
+        self.assertLessEqual(date.fromisoformat(data['end']), context.last_day + timedelta(days=30))
+
+        # New bookings go after the dataset, spread over its rooms
+        requests = [benchmarks.create_booking(context, rng, n) for n in range(4)]
+        self.assertEqual([data['room'] for _, _, data, _, _ in requests], context.rooms + context.rooms[:1])
+        self.assertTrue(all(date.fromisoformat(data['start_date']) > context.last_day for _, _, data, _, _ in requests))
+
+    def test_run_scenario_summarizes_timed_iterations(self):
+        context = benchmarks.BenchmarkContext()
+        for name in benchmarks.SCENARIOS:
+            with self.subTest(name):
+                summary = benchmarks.run_scenario(name, context, iterations=3, warmup=1)
+                self.assertEqual(summary['errors'], 0)
+                self.assertEqual(summary['iterations'], 3)
+                self.assertLessEqual(summary['p50_ms'], summary['p95_ms'])
+                self.assertLessEqual(summary['p95_ms'], summary['max_ms'])
+                self.assertGreater(summary['queries'], 0)
+        # Warmup requests run too, they are only left out of the timings
+        self.assertEqual(Booking.objects.filter(purpose__startswith='Benchmark booking').count(), 4)
+
+    def test_baselines_round_trip_into_the_report(self):
+        results = {'calendar_events': {'p50_ms': 10.0, 'p95_ms': 20.0, 'queries': 2, 'errors': 0}}
+        with tempfile.TemporaryDirectory() as directory:
+            path = benchmarks.save_baseline('small', results, {'bookings': 200}, Path(directory))
+            self.assertEqual(path.name, 'small.json')
+            baseline = benchmarks.load_baseline('small', Path(directory))
+            self.assertIsNone(benchmarks.load_baseline('large', Path(directory)))
+        self.assertEqual(baseline['endpoints'], results)
+        self.assertEqual(baseline['environment']['database'], connection.vendor)
+
+        slower = {'calendar_events': {'p50_ms': 10.0, 'p95_ms': 40.0, 'queries': 1, 'errors': 0}}
+        report = benchmarks.format_report(benchmarks.compare('small', slower, baseline))
+        self.assertIn('| small | calendar_events | p95_ms | 20.0 | 40.0 | +100.0% | **regression** |', report)
+        self.assertIn('| small | calendar_events | queries | 2 | 1 | -1 | improvement |', report)
+
+    def test_compare_flags_slower_endpoints_and_extra_queries(self):
+        baseline = {'endpoints': {'calendar_events': {'p50_ms': 10.0, 'p95_ms': 20.0, 'queries': 2}}}
+        results = {
+            'calendar_events': {'p50_ms': 10.5, 'p95_ms': 31.0, 'queries': 3},
+            'create_booking': {'p50_ms': 5.0, 'p95_ms': 8.0, 'queries': 18},
+        }
+        statuses = {
+            (row['endpoint'], row['metric']): row['status']
+            for row in benchmarks.compare('small', results, baseline)
+        }
+        self.assertEqual(statuses, {
+            ('calendar_events', 'p50_ms'): 'ok',
+            ('calendar_events', 'p95_ms'): 'regression',
+            ('calendar_events', 'queries'): 'regression',
+            ('create_booking', 'p95_ms'): 'new',
+        })
+
+    def test_percentile_uses_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmarks.percentile(values, 50), 50)
+        self.assertEqual(benchmarks.percentile(values, 95), 95)
+        self.assertEqual(benchmarks.percentile([7], 95), 7)
+
+
+# The live server's threads share one SQLite connection, so per-request query counts mix
+@override_settings(AUDIT_LOG_ASYNC=False, LOG_API_REQUESTS=False, QUERY_BUDGET_ENABLED=False)
+class LoadTestHarnessTests(LiveServerTestCase):
+    """The load generator completes the booking flow against a live server"""
+
+    def setUp(self):
+        caches['default'].clear()
+        call_command(
+            'generate_load_data', users=4, rooms=2, bookings=20, years=1, audit_logs=0, login_attempts=0,
+            start_date=str(timezone.now().date()), stdout=io.StringIO(),
+        )
+
+    def test_virtual_users_complete_the_booking_flow(self):
+        summary = loadtest.LoadTest(
+            self.live_server_url, users=2, spawn_rate=20, duration=1.5, think_time=0.05, create_ratio=1.0,
+            websocket=False, accounts=4, timeout=10,
+        ).run()
+
+        operations = summary['operations']
+        self.assertEqual(operations['login']['requests'], 2)
+        for name in ('login', 'browse_rooms', 'calendar_events', 'check_availability', 'create_booking'):
+            self.assertIn(name, operations)
+            self.assertEqual(operations[name]['errors'], 0, operations[name]['statuses'])
+        self.assertEqual(summary['peak_users'], 2)
+        self.assertIn('| check_availability |', loadtest.format_report(summary))
+
+        # Bookings land in the booking horizon, under the virtual users' accounts
+        created = Booking.objects.filter(purpose__startswith='Load test booking').select_related('user')
+        self.assertEqual(created.count(), operations['create_booking']['statuses'].get('201', 0))
+        horizon = timezone.now().date() + timedelta(days=loadtest.BOOKING_HORIZON_DAYS)
+        for booking in created:
+            self.assertIn(f'({booking.user.email})', booking.purpose)
+            self.assertLessEqual(booking.start_date, horizon)
+            self.assertEqual(booking.approval_status, 'approved')
+
+
+class LoadTestReportTests(SimpleTestCase):
+    """Responses and frames are decoded and tallied as the load generator reports them"""
+
+    def read(self, data, reader_call):
+        async def run():
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+            return await reader_call(reader)
+        return asyncio.run(run())
+
+    def test_chunked_and_sized_bodies(self):
+        async def response(reader):
+            status, headers = await loadtest.read_head(reader)
+            return status, headers, await loadtest.read_body(reader, status, headers)
+
+        chunked = b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n4\r\n{"a"\r\n3\r\n: 1\r\n1\r\n}\r\n0\r\n\r\n'
+        self.assertEqual(self.read(chunked, response), (200, {'transfer-encoding': 'chunked'}, b'{"a": 1}'))
+        sized = b'HTTP/1.1 201 Created\r\nContent-Length: 2\r\n\r\n{}extra'
+        self.assertEqual(self.read(sized, response)[2], b'{}')
+        self.assertEqual(self.read(b'HTTP/1.1 204 No Content\r\n\r\n', response)[2], b'')
+
+    def test_statuses_outside_the_expected_set_are_errors(self):
+        stats = loadtest.Stats()
+        for status in (201, 400, 500, 'ConnectionResetError'):
+            stats.record('create_booking', 0.01, status)
+        stats.record('login', 0.02, 200)
+        summary = stats.summary()
+
+        create = summary['operations']['create_booking']
+        self.assertEqual((create['requests'], create['errors'], create['error_rate']), (4, 2, 0.5))
+        self.assertEqual(create['statuses'], {'201': 1, '400': 1, '500': 1, 'ConnectionResetError': 1})
+        self.assertEqual((summary['total']['requests'], summary['total']['errors']), (5, 2))
+        self.assertEqual(list(summary['operations']), ['login', 'create_booking'])
+        self.assertIn('| create_booking | 4 | 2 | 50.00% |', loadtest.format_report(summary))
+
+    def test_websocket_frames_round_trip(self):
+        for payload in (b'{"type": "ping"}', b'x' * 300, b'y' * 70000):
+            fin, opcode, decoded = self.read(loadtest.encode_frame(loadtest.WebSocket.TEXT, payload), loadtest.read_frame)
+            self.assertTrue(fin)
+            self.assertEqual(opcode, loadtest.WebSocket.TEXT)
+            self.assertEqual(decoded, payload)
+
+
+class OccupancyBitmapTests(SimpleTestCase):
+    """Slot masks and free runs of the per-day occupancy bitmaps"""
+
+    def test_slot_mask_covers_every_touched_slot(self):
+        mask = occupancy.slot_mask(time(9), time(10))
+        self.assertEqual(mask.bit_count(), 60 // occupancy.SLOT_MINUTES)
+        self.assertEqual((mask & -mask).bit_length() - 1, occupancy.time_to_slot(time(9)))
+
+        # Unaligned boundaries widen to whole slots
+        self.assertEqual(
+            occupancy.slot_mask(time(9, 2), time(9, 7)), occupancy.slot_mask(time(9), time(9, 10))
+        )
+        self.assertEqual(occupancy.slot_mask(time(10), time(10)), 0)
+        self.assertEqual(occupancy.slot_mask(time(23), time.max).bit_length(), occupancy.SLOTS_PER_DAY)
+
+    def test_bitmaps_survive_storage(self):
+        bitmap = occupancy.slot_mask(time(0), time(0, 5)) | occupancy.slot_mask(time(23, 55), time.max)
+        stored = occupancy.to_bytes(bitmap)
+        self.assertEqual(len(stored), occupancy.BITMAP_BYTES)
+        self.assertEqual(occupancy.from_bytes(memoryview(stored)), bitmap)
+        self.assertEqual(occupancy.from_bytes(None), 0)
+
+    def test_free_runs_and_levels(self):
+        bitmap = occupancy.slot_mask(time(10), time(11)) | occupancy.slot_mask(time(12), time(12, 30))
+        self.assertEqual(list(occupancy.free_runs(bitmap)), [
+            (time(8), time(10)), (time(11), time(12)), (time(12, 30), time(18)),
+        ])
+        self.assertEqual(occupancy.booked_minutes(bitmap), 90)
+        self.assertEqual(occupancy.availability_level(0), 'available')
+        self.assertEqual(occupancy.availability_level(bitmap), 'partially_booked')
+        self.assertEqual(occupancy.availability_level(occupancy.slot_mask(time(7), time(19))), 'fully_booked')
+        self.assertEqual(list(occupancy.free_runs(occupancy.slot_mask(time(8), time(18)))), [])
+
+
+@override_settings(AUDIT_LOG_ASYNC=False)
+class RoomOccupancyTests(TestCase):
+    """Booking writes keep the occupancy bitmaps in step, touching only changed days"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.room = Room.objects.create(name='Room', capacity=20, category='meeting')
+        cls.user = User.objects.create(username='user', email='user@icpac.net')
+        cls.day = timezone.now().date() + timedelta(days=2)
+
+    def book(self, day, start, end, **kwargs):
+        return Booking.objects.create(
+            room=self.room, user=self.user, start_date=day, end_date=day,
+            start_time=start, end_time=end, purpose='Meeting', **kwargs
+        )
+
+    def test_bookings_set_and_clear_their_slots(self):
+        first = self.book(self.day, time(9), time(10))
+        self.book(self.day, time(14), time(15), approval_status='approved')
+        expected = occupancy.slot_mask(time(9), time(10)) | occupancy.slot_mask(time(14), time(15))
+        self.assertEqual(RoomOccupancy.bitmap_for(self.room, self.day), expected)
+
+        first.reject(self.user, 'Room closed')
+        self.assertEqual(RoomOccupancy.bitmap_for(self.room, self.day), occupancy.slot_mask(time(14), time(15)))
+        Booking.objects.filter(approval_status='approved').delete()
+        self.assertFalse(RoomOccupancy.objects.filter(room=self.room).exists())
+
+    def test_rebuild_writes_only_changed_days(self):
+        bookings = [self.book(self.day + timedelta(days=n), time(9), time(10)) for n in range(3)]
+        rows = dict(RoomOccupancy.objects.values_list('date', 'pk'))
+        last_day = self.day + timedelta(days=2)
+
+        with CaptureQueriesContext(connection) as queries:
+            RoomOccupancy.rebuild(self.room.id, self.day, last_day)
+        writes = [query['sql'] for query in queries if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        self.assertEqual(writes, [])
+
+        bookings[1].end_time = time(11)
+        bookings[1].save()
+        self.assertEqual(dict(RoomOccupancy.objects.values_list('date', 'pk')), rows)
+        self.assertEqual(
+            RoomOccupancy.bitmap_for(self.room, self.day + timedelta(days=1)), occupancy.slot_mask(time(9), time(11))
+        )
+
+
+@skipUnlessDBFeature('has_select_for_update')
+@override_settings(AUDIT_LOG_ASYNC=False)
+class ConcurrentOccupancyTests(TransactionTestCase):
+    """Concurrent bookings of one room and day both land in its bitmap"""
+
+    def test_concurrent_bookings_of_one_room(self):
+        room = Room.objects.create(name='Room', capacity=20, category='meeting')
+        user = User.objects.create(username='user', email='user@icpac.net')
+        day = timezone.now().date() + timedelta(days=2)
+        barrier = threading.Barrier(2)
+        errors = []
+
+        def book(hour):
+            try:
+                barrier.wait()
+                Booking.objects.create(
+                    room=room, user=user, start_date=day, end_date=day,
+                    start_time=time(hour), end_time=time(hour + 1), purpose=f'Meeting at {hour}'
+                )
+            except Exception as exc:  # reported below
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=book, args=(hour,)) for hour in (9, 11)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            RoomOccupancy.bitmap_for(room, day),
+            occupancy.slot_mask(time(9), time(10)) | occupancy.slot_mask(time(11), time(12)),
+        )
+        self.assertEqual(RoomUsageDaily.objects.get(room=room, date=day).booking_count, 2)
+
+
+def integrity_error(code=None, message='violates constraint'):
+    """IntegrityError as raised by the database driver, with its SQLSTATE"""
+    cause = type('DriverError', (Exception,), {'pgcode': code})(message)
+    try:
+        raise IntegrityError(message) from cause
+    except IntegrityError as exc:
+        return exc
+
+
+@override_settings(AUDIT_LOG_ASYNC=False)
+class BookingConflictTests(APITestCase):
+    """Overlaps rejected by the database surface as booking validation errors"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.room = Room.objects.create(name='Room', capacity=20, category='meeting')
+        cls.user = User.objects.create(username='user', email='user@icpac.net')
+        cls.day = timezone.now().date() + timedelta(days=2)
+        cls.held = Booking.objects.create(
+            room=cls.room, user=cls.user, start_date=cls.day, end_date=cls.day,
+            start_time=time(9), end_time=time(10), purpose='Board meeting'
+        )
+
+    def overlapping_booking(self):
+        return Booking(
+            room=self.room, user=self.user, start_date=self.day, end_date=self.day,
+            start_time=time(9, 30), end_time=time(11), purpose='Clash'
+        )
+
+    def test_overlap_violations_are_recognised(self):
+        self.assertTrue(conflicts.is_overlap_violation(integrity_error(conflicts.EXCLUSION_VIOLATION)))
+        self.assertTrue(conflicts.is_overlap_violation(integrity_error(message=conflicts.OVERLAP_CONSTRAINT)))
+        self.assertFalse(conflicts.is_overlap_violation(integrity_error('23505', 'unique_booking_occurrence_date')))
+
+    def test_reserve_translates_only_overlap_violations(self):
+        booking = self.overlapping_booking()
+        occurrences = [BookingOccurrence(
+            booking=booking, room=self.room, date=self.day, start_time=booking.start_time,
+            end_time=booking.end_time, approval_status='pending'
+        )]
+        with mock.patch.object(
+            BookingOccurrence.objects, 'bulk_create', side_effect=integrity_error(conflicts.EXCLUSION_VIOLATION)
+        ):
+            with self.assertRaisesMessage(conflicts.BookingConflictError, 'Board meeting'):
+                conflicts.reserve_occurrences(booking, occurrences)
+
+        with mock.patch.object(BookingOccurrence.objects, 'bulk_create', side_effect=integrity_error('23505')):
+            with self.assertRaises(IntegrityError) as raised:
+                conflicts.reserve_occurrences(booking, occurrences)
+            self.assertNotIsInstance(raised.exception, conflicts.BookingConflictError)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Exclusion constraints need PostgreSQL')
+    @override_settings(BOOKING_DB_CONFLICT_CHECK=True)
+    def test_database_rejects_overlapping_save(self):
+        booking = self.overlapping_booking()
+        with self.assertRaisesMessage(conflicts.BookingConflictError, 'Board meeting'):
+            booking.save()
+        self.assertIsNone(booking.pk)
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(RoomOccupancy.bitmap_for(self.room, self.day), occupancy.slot_mask(time(9), time(10)))
+
+        # Rejected bookings no longer hold the slot
+        self.held.reject(self.user)
+        booking.save()
+        self.assertIsNotNone(booking.pk)
+
+    def test_existing_overlaps_block_the_constraint_migration(self):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # Deferred foreign key checks would block the ALTER TABLE
+                cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+                cursor.execute(f'ALTER TABLE booking_occurrences DROP CONSTRAINT {conflicts.OVERLAP_CONSTRAINT}')
+        # Saving validates against the held slot, so overlaps are moved in afterwards as legacy data
+        def legacy(start, end, status):
+            booking = Booking.objects.create(
+                room=self.room, user=self.user, start_date=self.day, end_date=self.day,
+                start_time=time(18), end_time=time(19), purpose='Legacy', approval_status=status,
+            )
+            for model, lookup in ((Booking, 'pk'), (BookingOccurrence, 'booking')):
+                model.objects.filter(**{lookup: booking.pk}).update(start_time=start, end_time=end)
+            return booking
+
+        clash = legacy(time(9, 30), time(11), 'pending')
+        # Adjacent and rejected bookings do not overlap
+        legacy(time(11), time(12), 'approved')
+        legacy(time(9), time(10), 'rejected')
+        self.assertEqual(BookingOccurrence.objects.count(), 4)
+        with connection.cursor() as cursor:
+            self.assertEqual(conflicts.overlapping_bookings(cursor), [(self.held.pk, clash.pk)])
+
+        migration = import_module('apps.bookings.migrations.0006_booking_occurrences')
+        schema_editor = mock.Mock(connection=mock.Mock(vendor='postgresql', cursor=connection.cursor))
+        message = f'overlap in the same room: {self.held.pk} and {clash.pk}. Reject or cancel'
+        with self.assertRaisesMessage(RuntimeError, message):
+            migration.add_exclusion_constraint(None, schema_editor)
+        schema_editor.execute.assert_not_called()
+
+    def test_api_reports_overlap_as_validation_error(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/bookings/', {
+            'room': self.room.id, 'start_date': str(self.day), 'end_date': str(self.day),
+            'start_time': '09:30', 'end_time': '11:00', 'purpose': 'Clash', 'booking_type': 'hourly',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('already booked', str(response.data))
+        self.assertEqual(Booking.objects.count(), 1)
+
+
+@override_settings(AUDIT_LOG_ASYNC=False, LOG_API_REQUESTS=False)
+class AvailabilityWindowTests(APITestCase):
+    """One window answers availability for many rooms from shared queries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.free, cls.partial, cls.full = [
+            Room.objects.create(name=name, capacity=capacity, category='meeting')
+            for name, capacity in (('Free', 10), ('Partial', 20), ('Full', 30))
+        ]
+        cls.user = User.objects.create(username='user', email='user@icpac.net')
+        cls.day = timezone.now().date() + timedelta(days=2)
+        cls.meeting = cls.book(cls.partial, time(9), time(10))
+        cls.book(cls.full, time(8), time(18), approval_status='approved')
+        cls.book(cls.free, time(9), time(10), approval_status='rejected')
+
+    @classmethod
+    def book(cls, room, start, end, **kwargs):
+        return Booking.objects.create(
+            room=room, user=cls.user, start_date=cls.day, end_date=cls.day,
+            start_time=start, end_time=end, purpose=f'{room.name} meeting', **kwargs
+        )
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_levels_of_every_room_from_one_query(self):
+        window = AvailabilityWindow([self.free, self.partial, self.full], self.day)
+        with self.assertNumQueries(1):
+            levels = [window.availability_level(room.id, self.day) for room in (self.free, self.partial, self.full)]
+        self.assertEqual(levels, ['available', 'partially_booked', 'fully_booked'])
+
+    def test_conflicts_load_bookings_only_on_overlap(self):
+        window = AvailabilityWindow([self.free, self.partial], self.day)
+        with self.assertNumQueries(1):
+            self.assertTrue(window.is_free(self.partial.id, self.day, time(10), time(11)))
+            self.assertTrue(window.is_free(self.free.id, self.day, time(9), time(10)))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                window.conflicts(self.partial.id, self.day, self.day, time(9, 30), time(11)), [self.meeting]
+            )
+        self.assertEqual(window.bookings_on(self.partial.id, self.day), [self.meeting])
+        self.assertEqual(window.bookings_on(self.free.id, self.day), [])
+
+    def test_available_rooms_excludes_booked_rooms(self):
+        response = self.client.get('/api/bookings/available-rooms/', {
+            'date': str(self.day), 'start_time': '09:00', 'end_time': '10:00',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([room['name'] for room in response.data['available_rooms']], ['Free'])
+
+        response = self.client.get('/api/bookings/available-rooms/', {
+            'date': str(self.day), 'start_time': '10:00', 'end_time': '11:00', 'min_capacity': 15,
+        })
+        self.assertEqual([room['name'] for room in response.data['available_rooms']], ['Partial'])
+
+    def test_availability_levels_endpoint(self):
+        response = self.client.get('/api/bookings/availability-levels/', {'date': str(self.day)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {room['room_name']: (room['availability_level'], room['color']) for room in response.data['rooms']},
+            {
+                'Free': ('available', 'green'),
+                'Partial': ('partially_booked', 'orange'),
+                'Full': ('fully_booked', 'red'),
+            }
+        )
+
+
+@override_settings(AUDIT_LOG_ASYNC=False, LOG_API_REQUESTS=False)
+class RoomScheduleTests(APITestCase):
+    """Room schedules come from one pass over the ordered occurrences"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.room = Room.objects.create(name='Room', capacity=20, category='meeting')
+        cls.user = User.objects.create(username='user', email='user@icpac.net', first_name='Amina', last_name='Otieno')
+        cls.day = timezone.now().date() + timedelta(days=2)
+        for offset, start, end in ((0, 9, 10), (0, 13, 14), (2, 8, 18)):
+            day = cls.day + timedelta(days=offset)
+            Booking.objects.create(
+                room=cls.room, user=cls.user, start_date=day, end_date=day,
+                start_time=time(start), end_time=time(end), purpose=f'Meeting at {start}'
+            )
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_sweep_emits_every_day_with_its_occurrences(self):
+        occurrences = BookingOccurrence.objects.order_by('date', 'start_time')
+        days = list(sweep_schedule(self.room, occurrences, self.day - timedelta(days=1), self.day + timedelta(days=3)))
+
+        self.assertEqual([day for day, _, _ in days], [self.day + timedelta(days=n) for n in range(-1, 4)])
+        self.assertEqual([len(day_occurrences) for _, day_occurrences, _ in days], [0, 2, 0, 1, 0])
+        self.assertEqual(
+            [(slot['start_time'], slot['end_time']) for slot in days[1][2]],
+            [('08:00', '09:00'), ('10:00', '13:00'), ('14:00', '18:00')]
+        )
+        self.assertEqual(days[3][2], [])
+
+    def test_sweep_skips_occurrences_before_the_range(self):
+        occurrences = BookingOccurrence.objects.order_by('date', 'start_time')
+        days = list(sweep_schedule(self.room, occurrences, self.day + timedelta(days=1), self.day + timedelta(days=2)))
+        self.assertEqual([len(day_occurrences) for _, day_occurrences, _ in days], [0, 1])
+
+    def test_free_slots_shorter_than_minimum_duration_are_dropped(self):
+        room = Room(name='Long', capacity=10, min_booking_duration=3)
+        bitmap = occupancy.slot_mask(time(9), time(10)) | occupancy.slot_mask(time(13), time(14))
+        self.assertEqual(
+            [(slot['start_time'], slot['end_time']) for slot in free_time_slots(room, self.day, bitmap)],
+            [('10:00', '13:00'), ('14:00', '18:00')]
+        )
+
+    def test_schedule_endpoint(self):
+        response = self.client.get(f'/api/bookings/room/{self.room.id}/schedule/', {
+            'start_date': str(self.day), 'end_date': str(self.day + timedelta(days=2)),
+        })
+        self.assertEqual(response.status_code, 200)
+        schedule = response.data['schedule']
+        self.assertEqual(list(schedule), [str(self.day + timedelta(days=n)) for n in range(3)])
+
+        first = schedule[str(self.day)]
+        self.assertEqual([booking['start_time'] for booking in first['bookings']], ['09:00', '13:00'])
+        self.assertEqual(first['bookings'][0]['user'], 'Amina Otieno')
+        self.assertFalse(first['is_fully_booked'])
+        self.assertEqual(schedule[str(self.day + timedelta(days=1))]['bookings'], [])
+        self.assertTrue(schedule[str(self.day + timedelta(days=2))]['is_fully_booked'])
+
+
+@override_settings(AUDIT_LOG_ASYNC=False, LOG_API_REQUESTS=False)
+class BookingOccurrenceTests(APITestCase):
+    """Every booked date has an occurrence row that follows its booking"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.room = Room.objects.create(name='Room', capacity=20, category='meeting')
+        cls.user = User.objects.create(username='user', email='user@icpac.net')
+        cls.day = timezone.now().date() + timedelta(days=2)
+
+    def book(self, start_date, end_date, **kwargs):
+        kwargs.setdefault('booking_type', 'hourly' if start_date == end_date else 'multi_day')
+        return Booking.objects.create(
+            room=self.room, user=self.user, start_date=start_date, end_date=end_date,
+            start_time=time(9), end_time=time(10), purpose='Meeting', **kwargs
+        )
+
+    def occurrence_dates(self, booking):
+        return list(booking.occurrences.values_list('date', flat=True))
+
+    def test_one_row_per_booked_date(self):
+        span = self.book(self.day, self.day + timedelta(days=2))
+        self.assertEqual(self.occurrence_dates(span), [self.day + timedelta(days=n) for n in range(3)])
+
+        selected = [self.day + timedelta(days=4), self.day + timedelta(days=6)]
+        picked = self.book(selected[0], selected[-1], selected_dates=[str(day) for day in selected])
+        self.assertEqual(self.occurrence_dates(picked), selected)
+
+        # The day skipped by selected_dates stays free
+        self.book(self.day + timedelta(days=5), self.day + timedelta(days=5))
+
+    def test_rows_follow_edits_and_status(self):
+        booking = self.book(self.day, self.day + timedelta(days=1))
+        booking.start_date = booking.end_date = self.day + timedelta(days=3)
+        booking.booking_type = 'hourly'
+        booking.save()
+        self.assertEqual(self.occurrence_dates(booking), [self.day + timedelta(days=3)])
+
+        booking.approve(self.user)
+        self.assertEqual(list(booking.occurrences.values_list('approval_status', flat=True)), ['approved'])
+        BookingOccurrence.update_status([booking.id], 'cancelled')
+        self.assertFalse(BookingOccurrence.overlapping(self.room, [booking.start_date], time(9), time(10)).exists())
+
+    def test_calendar_shows_each_booked_date(self):
+        booking = self.book(self.day, self.day + timedelta(days=2))
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/bookings/calendar/events/', {
+            'start': str(self.day + timedelta(days=1)), 'end': str(self.day + timedelta(days=5)),
+        })
+        self.assertEqual(response.status_code, 200)
+        days = [self.day + timedelta(days=n) for n in (1, 2)]
+        self.assertEqual(
+            [(event['id'], event['start']) for event in response.data['events']],
+            [(f'{booking.id}:{day}', f'{day}T09:00:00') for day in days]
+        )
+        # Each date is its own event, tied back to the booking
+        self.assertEqual(
+            {(event['groupId'], event['extendedProps']['booking_id']) for event in response.data['events']},
+            {(booking.id, booking.id)}
+        )
+
+
+class RecurrenceRuleTests(SimpleTestCase):
+    """RRULE parsing and bounded expansion of recurring bookings"""
+
+    start = date(2030, 1, 1)  # a Tuesday
+
+    def test_count_and_until_end_a_series(self):
+        self.assertEqual(
+            recurrence.expand('FREQ=WEEKLY;BYDAY=TU;COUNT=3', self.start),
+            [date(2030, 1, 1), date(2030, 1, 8), date(2030, 1, 15)]
+        )
+        self.assertEqual(
+            recurrence.expand('RRULE:FREQ=DAILY;UNTIL=20300104', self.start),
+            [date(2030, 1, n) for n in range(1, 5)]
+        )
+
+    def test_unusable_rules_are_refused(self):
+        for rule, message in (
+            ('FREQ=HOURLY;COUNT=3', 'daily, weekly, monthly or yearly'),
+            ('FREQ=WEEKLY', 'set COUNT or UNTIL'),
+            ('FREQ=WEEKLY;;COUNT=2', 'Invalid recurrence rule part'),
+            ('FREQ=WEEKLY;COUNT=two', 'Invalid recurrence rule'),
+            ('FREQ=DAILY;UNTIL=20291231', 'does not produce any dates'),
+        ):
+            with self.subTest(rule=rule), self.assertRaisesMessage(recurrence.RecurrenceError, message):
+                recurrence.expand(rule, self.start)
+
+    @override_settings(BOOKING_RECURRENCE_MAX_OCCURRENCES=5)
+    def test_series_are_capped(self):
+        self.assertEqual(len(recurrence.expand('FREQ=DAILY;COUNT=5', self.start)), 5)
+        with self.assertRaisesMessage(recurrence.RecurrenceError, 'limited to 5 occurrences'):
+            recurrence.expand('FREQ=DAILY;COUNT=6', self.start)
+
+    def test_windows_generate_only_their_dates(self):
+        dates = recurrence.iter_dates('FREQ=WEEKLY;COUNT=100', self.start, date(2030, 3, 1), date(2030, 3, 31))
+        self.assertEqual(list(dates), [date(2030, 3, n) for n in (5, 12, 19, 26)])
+
+
+@override_settings(AUDIT_LOG_ASYNC=False, LOG_API_REQUESTS=False)
+class RecurringBookingTests(APITestCase):
+    """A recurring booking stores one occurrence per date and rewrites only what changed"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.room = Room.objects.create(name='Room', capacity=20, category='meeting', advance_booking_days=365)
+        cls.user = User.objects.create(username='user', email='user@icpac.net')
+        cls.day = timezone.now().date() + timedelta(days=2)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def create_series(self, rule, **data):
+        return self.client.post('/api/bookings/', {
+            'room': self.room.id, 'start_date': str(self.day), 'start_time': '09:00', 'end_time': '10:00',
+            'purpose': 'Weekly sync', 'booking_type': 'recurring', 'recurrence_rule': rule, **data,
+        }, format='json')
+
+    def test_series_is_materialized_and_checked_for_conflicts(self):
+        response = self.create_series('FREQ=WEEKLY;COUNT=4')
+        self.assertEqual(response.status_code, 201)
+        booking = Booking.objects.get()
+        self.assertEqual(booking.end_date, self.day + timedelta(weeks=3))
+        self.assertEqual(booking.occurrences.count(), 4)
+
+        clash = self.day + timedelta(weeks=2)
+        response = self.client.post('/api/bookings/', {
+            'room': self.room.id, 'start_date': str(clash), 'end_date': str(clash),
+            'start_time': '09:30', 'end_time': '10:30', 'purpose': 'Clash', 'booking_type': 'hourly',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(BOOKING_DB_CONFLICT_CHECK=False)
+    def test_invalid_rule_is_a_validation_error(self):
+        response = self.create_series('FREQ=WEEKLY')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('recurrence_rule', response.data)
+
+        serializer = BookingSerializer(data={
+            'room': self.room.id, 'start_date': str(self.day), 'end_date': str(self.day),
+            'start_time': '09:00', 'end_time': '10:00', 'purpose': 'Weekly sync',
+            'booking_type': 'recurring', 'recurrence_rule': 'FREQ=HOURLY;COUNT=2',
+        })
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('recurrence_rule', serializer.errors)
+
+    def test_saves_rewrite_only_changed_occurrences(self):
+        self.create_series('FREQ=WEEKLY;COUNT=4')
+        booking = Booking.objects.get()
+        rows = dict(booking.occurrences.values_list('date', 'pk'))
+
+        booking.purpose = 'Renamed sync'
+        with CaptureQueriesContext(connection) as queries:
+            booking.save()
+        writes = [query['sql'] for query in queries if query['sql'].startswith(('INSERT', 'DELETE'))]
+        self.assertEqual(writes, [])
+
+        # Shortening the series drops only its tail
+        booking.recurrence_rule = 'FREQ=WEEKLY;COUNT=2'
+        booking.save()
+        self.assertEqual(dict(booking.occurrences.values_list('date', 'pk')), dict(list(rows.items())[:2]))
+        self.assertFalse(RoomOccupancy.objects.filter(date__gt=booking.end_date).exists())
+
+
+@override_settings(AUDIT_LOG_ASYNC=False, LOG_API_REQUESTS=False)
+class RoomUsageDailyTests(TestCase):
+    """The usage rollup follows booking changes by deltas and matches a full rebuild"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.room = Room.objects.create(name='Room', capacity=20, category='meeting')
+        cls.other_room = Room.objects.create(name='Other room', capacity=20, category='meeting')
+        cls.admin = User.objects.create(username='admin', email='admin@icpac.net', role='super_admin')
+        cls.day = timezone.now().date() + timedelta(days=2)
+
+    def book(self, start_date, end_date, start=time(9), end=time(10), **kwargs):
+        return Booking.objects.create(
+            room=self.room, user=self.admin, start_date=start_date, end_date=end_date,
+            start_time=start, end_time=end, purpose='Meeting',
+            booking_type='hourly' if start_date == end_date else 'multi_day', **kwargs
+        )
+
+    def usage(self, room=None):
+        return {
+            usage['date']: usage for usage in RoomUsageDaily.objects.filter(room=room or self.room).values(
+                'date', 'booking_count', 'pending_count', 'approved_count', 'rejected_count', 'booked_minutes'
+            )
+        }
+
+    def assertMatchesRebuild(self):
+        expected = {room: self.usage(room) for room in (self.room, self.other_room)}
+        with CaptureQueriesContext(connection) as queries:
+            for room in (self.room, self.other_room):
+                RoomUsageDaily.rebuild(room.id, self.day, self.day + timedelta(days=10))
+        writes = [query['sql'] for query in queries if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        self.assertEqual(writes, [])
+        self.assertEqual({room: self.usage(room) for room in (self.room, self.other_room)}, expected)
+
+    def test_changes_apply_as_deltas(self):
+        workshop = self.book(self.day, self.day + timedelta(days=2), approval_status='approved')
+        self.book(self.day, self.day, start=time(11), end=time(12))
+        first = self.usage()[self.day]
+        self.assertEqual((first['booking_count'], first['approved_count'], first['pending_count']), (2, 1, 1))
+        self.assertEqual(first['booked_minutes'], 60)
+
+        workshop.end_time = time(11)
+        workshop.save()
+        self.assertEqual([usage['booked_minutes'] for usage in self.usage().values()], [120, 120, 120])
+
+        # Moving a booking to another room leaves no trace in the old one
+        workshop.room = self.other_room
+        workshop.save()
+        self.assertEqual(list(self.usage()), [self.day])
+        self.assertEqual(len(self.usage(self.other_room)), 3)
+        self.assertMatchesRebuild()
+
+        workshop.delete()
+        self.assertEqual(self.usage(self.other_room), {})
+        self.assertMatchesRebuild()
+
+    def test_admin_actions_move_counts_between_statuses(self):
+        bookings = [self.book(self.day + timedelta(days=n), self.day + timedelta(days=n)) for n in range(2)]
+        admin_site = BookingAdmin(Booking, None)
+        request = APIRequestFactory().post('/admin/')
+        request.user = self.admin
+
+        with mock.patch.object(BookingAdmin, 'message_user'):
+            admin_site.approve_bookings(request, Booking.objects.filter(pk=bookings[0].pk))
+            admin_site.reject_bookings(request, Booking.objects.filter(pk=bookings[1].pk))
+
+        usage = self.usage()
+        self.assertEqual((usage[self.day]['approved_count'], usage[self.day]['booked_minutes']), (1, 60))
+        self.assertEqual(
+            (usage[self.day + timedelta(days=1)]['rejected_count'], usage[self.day + timedelta(days=1)]['pending_count']),
+            (1, 0)
+        )
+        self.assertEqual(RoomOccupancy.bitmap_for(self.room, self.day + timedelta(days=1)), 0)
+        self.assertMatchesRebuild()
+
+
+@override_settings(AUDIT_LOG_ASYNC=False, LOG_API_REQUESTS=False)
+class BookingStatsTests(TestCase):
+    """Dashboard counters per scope from one cached aggregate query"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.room, cls.other_room = [
+            Room.objects.create(name=name, capacity=20, category='meeting') for name in ('Room', 'Other room')
+        ]
+        cls.admin = User.objects.create(username='admin', email='admin@icpac.net', role='super_admin')
+        cls.room_admin = User.objects.create(username='roomadmin', email='roomadmin@icpac.net', role='room_admin')
+        cls.room_admin.managed_rooms.set([cls.room])
+        cls.user = User.objects.create(username='user', email='user@icpac.net')
+        cls.today = timezone.now().date()
+
+        def book(room, user, offset, approval_status, hour=9):
+            day = cls.today + timedelta(days=offset)
+            Booking.objects.create(
+                room=room, user=user, start_date=day, end_date=day, start_time=time(hour),
+                end_time=time(hour + 1), purpose='Meeting', approval_status=approval_status
+            )
+
+        # Book today's meeting while it was still in the future
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() - timedelta(days=1)):
+            book(cls.room, cls.user, 0, 'approved')
+        book(cls.room, cls.admin, 3, 'approved')
+        book(cls.room, cls.user, 3, 'pending', hour=11)
+        book(cls.other_room, cls.user, 3, 'rejected')
+        book(cls.other_room, cls.admin, 20, 'approved')
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def counters(self, stats, *names):
+        return tuple(stats[name] for name in names)
+
+    def test_system_stats(self):
+        with self.assertNumQueries(1):
+            stats = booking_stats.system_stats()
+        self.assertEqual(
+            self.counters(stats, 'total', 'approved', 'pending', 'rejected', 'cancelled'), (5, 3, 1, 1, 0)
+        )
+        # recent counts bookings starting in the last 30 days; today and this
+        # week count approved bookings held on those days
+        self.assertEqual(self.counters(stats, 'recent', 'today', 'this_week'), (1, 1, 2))
+
+    def test_scopes(self):
+        self.assertEqual(
+            self.counters(booking_stats.role_stats(self.room_admin), 'total', 'approved', 'pending'), (3, 2, 1)
+        )
+        self.assertEqual(self.counters(booking_stats.role_stats(self.user), 'total', 'today', 'rejected'), (3, 1, 1))
+        self.assertEqual(booking_stats.role_stats(self.admin)['total'], 5)
+
+    def test_stats_are_cached_per_scope(self):
+        booking_stats.user_stats(self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(booking_stats.user_stats(self.user)['total'], 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(booking_stats.user_stats(self.admin)['total'], 2)
+
+
+@override_settings(AUDIT_LOG_ASYNC=False, LOG_API_REQUESTS=False)
+class BookingExportTests(APITestCase):
+    """Exports hold the visible bookings matching the list filters, in every format"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.room, cls.other_room = [
+            Room.objects.create(name=name, capacity=20, category='meeting') for name in ('Room', 'Other room')
+        ]
+        cls.user = User.objects.create(
+            username='user', email='user@icpac.net', first_name='Amina', last_name='Otieno'
+        )
+        cls.other_user = User.objects.create(username='other', email='other@icpac.net')
+        cls.day = timezone.now().date() + timedelta(days=2)
+        cls.bookings = [
+            Booking.objects.create(
+                room=room, user=user, start_date=cls.day + timedelta(days=offset),
+                end_date=cls.day + timedelta(days=offset), start_time=time(9), end_time=time(10),
+                purpose=purpose, approval_status=approval_status,
+            )
+            for room, user, offset, purpose, approval_status in (
+                (cls.room, cls.user, 1, 'Board, "annual"', 'approved'),
+                (cls.room, cls.user, 0, 'Planning', 'pending'),
+                (cls.other_room, cls.user, 2, 'Review', 'approved'),
+                (cls.room, cls.other_user, 3, 'Not mine', 'approved'),
+            )
+        ]
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def export(self, export_format, **params):
+        response = self.client.get(f'/api/bookings/export/{export_format}/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'.{export_format}"', response['Content-Disposition'])
+        return b''.join(response.streaming_content)
+
+    def test_csv(self):
+        lines = self.export('csv').decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['ID', 'Room', 'User'])
+        # Ordered by date; the other user's booking is not visible
+        self.assertEqual(
+            [line.split(',')[0] for line in lines[1:]], [str(self.bookings[n].id) for n in (1, 0, 2)]
+        )
+        self.assertIn('"Board, ""annual"""', lines[2])
+        self.assertIn('Amina Otieno', lines[2])
+
+    def test_ndjson_with_filters(self):
+        records = [json.loads(line) for line in self.export('ndjson', status='approved', room=self.room.id).splitlines()]
+        self.assertEqual([record['id'] for record in records], [self.bookings[0].id])
+        self.assertEqual(records[0]['start_date'], str(self.day + timedelta(days=1)))
+        self.assertEqual(records[0]['user_email'], 'user@icpac.net')
+
+        records = self.export('ndjson', date_from=str(self.day + timedelta(days=1))).splitlines()
+        self.assertEqual(len(records), 2)
+
+    def test_xlsx(self):
+        from openpyxl import load_workbook
+
+        sheet = load_workbook(io.BytesIO(self.export('xlsx', status='approved'))).active
+        rows = list(sheet.values)
+        self.assertEqual(rows[0][:2], ('ID', 'Room'))
+        self.assertEqual([row[0] for row in rows[1:]], [self.bookings[0].id, self.bookings[2].id])
+
+    @override_settings(BOOKING_EXPORT_XLSX_MAX_ROWS=2)
+    def test_large_xlsx_exports_are_refused(self):
+        response = self.client.get('/api/bookings/export/xlsx/')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('csv or ndjson', response.data['error'])
+        self.export('xlsx', status='approved')
+
+    def test_unknown_format(self):
+        response = self.client.get('/api/bookings/export/pdf/')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(AUDIT_LOG_ASYNC=False, LOG_API_REQUESTS=False)
+class AvailabilityCacheTests(APITestCase):
+    """Cached availability is versioned per room and invalidated when writes commit"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.room, cls.other_room = [
+            Room.objects.create(name=name, capacity=20, category='meeting') for name in ('Room', 'Other room')
+        ]
+        cls.user = User.objects.create(username='user', email='user@icpac.net')
+        cls.day = timezone.now().date() + timedelta(days=2)
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def book(self, **kwargs):
+        return Booking.objects.create(
+            room=self.room, user=self.user, start_date=self.day, end_date=self.day,
+            start_time=time(9), end_time=time(10), purpose='Meeting', **kwargs
+        )
+
+    def test_bump_invalidates_a_room_and_multi_room_answers(self):
+        room_key = availability_cache.room_key(self.room.id, 'check', self.day)
+        other_key = availability_cache.room_key(self.other_room.id, 'check', self.day)
+        rooms_key = availability_cache.rooms_key('levels', self.day)
+
+        availability_cache.bump(self.room.id)
+        self.assertNotEqual(availability_cache.room_key(self.room.id, 'check', self.day), room_key)
+        self.assertNotEqual(availability_cache.rooms_key('levels', self.day), rooms_key)
+        self.assertEqual(availability_cache.room_key(self.other_room.id, 'check', self.day), other_key)
+
+    def test_versions_survive_eviction(self):
+        room_key = availability_cache.room_key(self.room.id, 'check', self.day)
+        caches['default'].delete(availability_cache.version_key(self.room.id))
+        availability_cache.bump(self.room.id)
+        self.assertNotEqual(availability_cache.room_key(self.room.id, 'check', self.day), room_key)
+
+    def test_read_racing_a_write_does_not_survive_its_commit(self):
+        def levels_key():
+            return availability_cache.rooms_key('levels', self.day)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book()
+            # A concurrent read cannot see the uncommitted booking yet
+            stale_key = levels_key()
+            availability_cache.get_or_compute(stale_key, lambda: 'available')
+            self.assertEqual(levels_key(), stale_key)
+
+        self.assertNotEqual(levels_key(), stale_key)
+        self.assertEqual(availability_cache.get_or_compute(levels_key(), lambda: 'partially_booked'), 'partially_booked')
+
+    def test_per_process_backends_are_bypassed(self):
+        key = availability_cache.rooms_key('levels', self.day)
+        computed = []
+
+        def compute():
+            computed.append(1)
+            return 'available'
+
+        with override_settings(AVAILABILITY_CACHE_PER_PROCESS=False):
+            # Another worker would never see this worker's version bumps
+            for _ in range(2):
+                self.assertEqual(availability_cache.get_or_compute(key, compute), 'available')
+            self.assertEqual(len(computed), 2)
+            self.assertIsNone(caches['default'].get(key))
+
+            with mock.patch.object(availability_cache, 'PER_PROCESS_BACKENDS', ()):
+                for _ in range(2):
+                    availability_cache.get_or_compute(key, compute)
+            self.assertEqual(len(computed), 3)
+
+    def test_endpoints_answer_afresh_after_a_change(self):
+        def levels():
+            response = self.client.get('/api/bookings/availability-levels/', {'date': str(self.day)})
+            return {room['room_name']: room['availability_level'] for room in response.data['rooms']}
+
+        self.assertEqual(levels()['Room'], 'available')
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = self.book()
+        self.assertEqual(levels()['Room'], 'partially_booked')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.delete()
+        self.assertEqual(levels()['Room'], 'available')
+
+        self.room.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room.save()
+        self.assertNotIn('Room', levels())
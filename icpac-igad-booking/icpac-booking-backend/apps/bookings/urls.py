@@ -10,6 +10,7 @@ urlpatterns = [
     # Booking management endpoints
     path('', views.BookingListView.as_view(), name='booking_list'),
     path('<int:pk>/', views.BookingDetailView.as_view(), name='booking_detail'),
+    path('export/<str:export_format>/', views.export_bookings, name='export_bookings'),
 
     # Booking approval
     path('<int:booking_id>/approve-reject/', views.approve_reject_booking, name='approve_reject_booking'),
@@ -25,6 +26,7 @@ urlpatterns = [
     # Availability endpoints
     path('check-availability/', views.check_availability, name='check_availability'),
     path('availability-levels/', views.get_rooms_availability_levels, name='availability_levels'),
+    path('available-rooms/', views.available_rooms, name='available_rooms'),
     path('room/<int:room_id>/schedule/', views.get_room_schedule, name='room_schedule'),
 
 ]
\ No newline at end of file
@@ -10,11 +10,21 @@ from datetime import datetime, timedelta, time
 import logging
 
 logger = logging.getLogger(__name__)
-from .models import Booking
+from .models import Booking, BookingOccurrence, RoomOccupancy
+from . import cache as availability_cache
+from . import stats as booking_stats
+from .exports import ExportError, export_response
+from .availability import AvailabilityWindow, free_time_slots, sweep_schedule
+from .occupancy import slot_mask
 from apps.rooms.models import Room
+from icpac_booking.pagination import KeysetOrPageNumberPagination
+from icpac_booking.querybudget import query_budget
+from icpac_booking.serializers import SparseFieldsMixin, ValuesListMixin
 from .serializers import (
     BookingSerializer,
     BookingListSerializer,
+    BookingValuesSerializer,
+    BookingListValuesSerializer,
     BookingCreateUpdateSerializer,
     BookingApprovalSerializer,
     BookingStatsSerializer,
@@ -22,10 +32,15 @@ from .serializers import (
 )
 
 
-class BookingListView(generics.ListCreateAPIView):
+class BookingListView(ValuesListMixin, SparseFieldsMixin, generics.ListCreateAPIView):
     """
     List all bookings or create a new booking
     """
+    values_serializer_class = BookingListValuesSerializer
+    pagination_class = KeysetOrPageNumberPagination
+    keyset_ordering = ('-created_at', '-id')
+    query_budget = {'GET': 3, 'POST': 17}
+
     def get_permissions(self):
         """
         Allow anonymous read access, require authentication for create
@@ -40,65 +55,93 @@ class BookingListView(generics.ListCreateAPIView):
         return BookingListSerializer
     
     def get_queryset(self):
-        user = self.request.user
-        queryset = Booking.objects.all().order_by('-created_at')
+        queryset = visible_bookings(self.request.user).select_related('room', 'user').order_by('-created_at')
+        return filter_bookings(queryset, self.request.query_params)
 
-        # Handle anonymous users (for public booking view)
-        if not user.is_authenticated:
-            # Anonymous users can see all bookings for demo purposes
-            return queryset
 
-        # Filter based on user role for authenticated users
-        if hasattr(user, 'role') and user.role == 'super_admin':
-            # Super admin can see all bookings
-            pass
-        elif hasattr(user, 'role') and user.role == 'room_admin':
-            # Room admin can see bookings for their managed rooms
-            managed_room_ids = user.managed_rooms.values_list('id', flat=True)
-            queryset = queryset.filter(
-                Q(room_id__in=managed_room_ids) | Q(user=user)
-            )
-        else:
-            # Regular users can only see their own bookings
-            queryset = queryset.filter(user=user)
-        
-        # Apply filters
-        status_filter = self.request.query_params.get('status')
-        if status_filter:
-            queryset = queryset.filter(approval_status=status_filter)
-        
-        room_id = self.request.query_params.get('room')
-        if room_id:
-            try:
-                queryset = queryset.filter(room_id=int(room_id))
-            except ValueError:
-                pass
-        
-        date_from = self.request.query_params.get('date_from')
-        if date_from:
-            try:
-                date_from = datetime.strptime(date_from, '%Y-%m-%d').date()
-                queryset = queryset.filter(start_date__gte=date_from)
-            except ValueError:
-                pass
-        
-        date_to = self.request.query_params.get('date_to')
-        if date_to:
-            try:
-                date_to = datetime.strptime(date_to, '%Y-%m-%d').date()
-                queryset = queryset.filter(end_date__lte=date_to)
-            except ValueError:
-                pass
-        
+def visible_bookings(user):
+    """Bookings a user may list, based on their role"""
+    queryset = Booking.objects.all()
+
+    # Handle anonymous users (for public booking view)
+    if not user.is_authenticated:
+        # Anonymous users can see all bookings for demo purposes
         return queryset
 
+    # Filter based on user role for authenticated users
+    if hasattr(user, 'role') and user.role == 'super_admin':
+        # Super admin can see all bookings
+        pass
+    elif hasattr(user, 'role') and user.role == 'room_admin':
+        # Room admin can see bookings for their managed rooms
+        managed_room_ids = user.managed_rooms.values_list('id', flat=True)
+        queryset = queryset.filter(
+            Q(room_id__in=managed_room_ids) | Q(user=user)
+        )
+    else:
+        # Regular users can only see their own bookings
+        queryset = queryset.filter(user=user)
+
+    return queryset
+
+
+def filter_bookings(queryset, params):
+    """Apply the status, room and date_from/date_to query filters"""
+    status_filter = params.get('status')
+    if status_filter:
+        queryset = queryset.filter(approval_status=status_filter)
+    
+    room_id = params.get('room')
+    if room_id:
+        try:
+            queryset = queryset.filter(room_id=int(room_id))
+        except ValueError:
+            pass
+    
+    date_from = params.get('date_from')
+    if date_from:
+        try:
+            date_from = datetime.strptime(date_from, '%Y-%m-%d').date()
+            queryset = queryset.filter(start_date__gte=date_from)
+        except ValueError:
+            pass
+    
+    date_to = params.get('date_to')
+    if date_to:
+        try:
+            date_to = datetime.strptime(date_to, '%Y-%m-%d').date()
+            queryset = queryset.filter(end_date__lte=date_to)
+        except ValueError:
+            pass
+    
+    return queryset
+
 
-class BookingDetailView(generics.RetrieveUpdateDestroyAPIView):
+@query_budget(3)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def export_bookings(request, export_format):
+    """
+    Stream the bookings visible to the user as CSV, NDJSON or XLSX.
+    Accepts the same filters as the booking list.
+    """
+    queryset = filter_bookings(visible_bookings(request.user), request.query_params)
+    try:
+        return export_response(queryset, export_format)
+    except ExportError as exc:
+        return Response(
+            {'error': str(exc)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+
+class BookingDetailView(SparseFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update or delete a booking
     """
     queryset = Booking.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'GET': 2, 'PUT': 18, 'PATCH': 18, 'DELETE': 16}
     
     def get_serializer_class(self):
         if self.request.method in ['PUT', 'PATCH']:
@@ -108,18 +151,19 @@ class BookingDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         user = self.request.user
         
+        bookings = Booking.objects.select_related('room', 'user')
         if user.role == 'super_admin':
-            return Booking.objects.all()
+            return bookings
         elif user.role == 'room_admin':
             managed_room_ids = user.managed_rooms.values_list('id', flat=True)
-            return Booking.objects.filter(
+            return bookings.filter(
                 Q(room_id__in=managed_room_ids) | Q(user=user)
             )
         else:
-            return Booking.objects.filter(user=user)
+            return bookings.filter(user=user)
     
     def perform_update(self, serializer):
-        booking = self.get_object()
+        booking = serializer.instance
         
         # Check if user can modify this booking
         if not booking.can_be_modified_by(self.request.user):
@@ -146,6 +190,7 @@ class BookingDetailView(generics.RetrieveUpdateDestroyAPIView):
         instance.save()
 
 
+@query_budget(17)
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def approve_reject_booking(request, booking_id):
@@ -153,7 +198,7 @@ def approve_reject_booking(request, booking_id):
     Approve or reject a booking
     """
     try:
-        booking = Booking.objects.get(id=booking_id)
+        booking = Booking.objects.select_related('room', 'user').get(id=booking_id)
     except Booking.DoesNotExist:
         return Response(
             {'error': 'Booking not found.'}, 
@@ -184,6 +229,7 @@ def approve_reject_booking(request, booking_id):
     })
 
 
+@query_budget(4)
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def my_bookings(request):
@@ -193,30 +239,43 @@ def my_bookings(request):
     user = request.user
     
     # Get upcoming bookings
-    upcoming = Booking.objects.filter(
-        user=user,
+    user_bookings = Booking.objects.filter(user=user).select_related('room', 'user')
+    upcoming = user_bookings.filter(
         start_date__gte=timezone.now().date()
     ).order_by('start_date', 'start_time')[:5]
     
     # Get recent bookings
-    recent = Booking.objects.filter(user=user).order_by('-created_at')[:10]
+    recent = user_bookings.order_by('-created_at')[:10]
     
     # Get statistics
-    total = Booking.objects.filter(user=user).count()
-    approved = Booking.objects.filter(user=user, approval_status='approved').count()
-    pending = Booking.objects.filter(user=user, approval_status='pending').count()
+    counts = booking_stats.user_stats(user)
     
     return Response({
-        'upcoming_bookings': BookingListSerializer(upcoming, many=True).data,
-        'recent_bookings': BookingListSerializer(recent, many=True).data,
+        'upcoming_bookings': BookingListValuesSerializer(upcoming).data,
+        'recent_bookings': BookingListValuesSerializer(recent).data,
         'statistics': {
-            'total_bookings': total,
-            'approved_bookings': approved,
-            'pending_bookings': pending
+            'total_bookings': counts['total'],
+            'approved_bookings': counts['approved'],
+            'pending_bookings': counts['pending']
         }
     })
 
 
+def pending_bookings_for(user):
+    """Bookings awaiting approval that an admin may act on, oldest first"""
+    if user.role == 'super_admin':
+        pending_bookings = Booking.objects.filter(approval_status='pending')
+    else:
+        # Room admin can only see bookings for their managed rooms
+        managed_room_ids = user.managed_rooms.values_list('id', flat=True)
+        pending_bookings = Booking.objects.filter(
+            approval_status='pending',
+            room_id__in=managed_room_ids
+        )
+    return pending_bookings.order_by('created_at')
+
+
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def pending_approvals(request):
@@ -228,25 +287,15 @@ def pending_approvals(request):
     if user.role not in ['super_admin', 'room_admin']:
         raise permissions.PermissionDenied('Only admins can view pending approvals.')
     
-    # Get pending bookings based on user role
-    if user.role == 'super_admin':
-        pending_bookings = Booking.objects.filter(approval_status='pending')
-    else:
-        # Room admin can only see bookings for their managed rooms
-        managed_room_ids = user.managed_rooms.values_list('id', flat=True)
-        pending_bookings = Booking.objects.filter(
-            approval_status='pending',
-            room_id__in=managed_room_ids
-        )
-    
-    pending_bookings = pending_bookings.order_by('created_at')
+    pending_bookings = BookingValuesSerializer(pending_bookings_for(user)).data
     
     return Response({
-        'pending_bookings': BookingSerializer(pending_bookings, many=True).data,
-        'count': pending_bookings.count()
+        'pending_bookings': pending_bookings,
+        'count': len(pending_bookings)
     })
 
 
+@query_budget(4)
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def booking_dashboard_stats(request):
@@ -272,28 +321,21 @@ def booking_dashboard_stats(request):
         start_date__range=[start_date, end_date]
     )
     
-    # Calculate statistics
+    # Calculate statistics in one aggregate query
+    counts = booking_stats.role_stats(user)
     stats = {
-        'total_bookings': all_bookings.count(),
-        'recent_bookings_count': recent_bookings.count(),
-        'approved_bookings': all_bookings.filter(approval_status='approved').count(),
-        'pending_bookings': all_bookings.filter(approval_status='pending').count(),
-        'rejected_bookings': all_bookings.filter(approval_status='rejected').count(),
+        'total_bookings': counts['total'],
+        'recent_bookings_count': counts['recent'],
+        'approved_bookings': counts['approved'],
+        'pending_bookings': counts['pending'],
+        'rejected_bookings': counts['rejected'],
     }
     
     # Add admin-specific stats
     if user.role in ['super_admin', 'room_admin']:
-        today = timezone.now().date()
-        
         stats.update({
-            'todays_bookings': all_bookings.filter(
-                start_date=today,
-                approval_status='approved'
-            ).count(),
-            'this_week_bookings': all_bookings.filter(
-                start_date__range=[today, today + timedelta(days=7)],
-                approval_status='approved'
-            ).count(),
+            'todays_bookings': counts['today'],
+            'this_week_bookings': counts['this_week'],
         })
         
         # Most popular room
@@ -306,11 +348,11 @@ def booking_dashboard_stats(request):
         stats['most_popular_room'] = popular_room['room__name'] if popular_room else 'N/A'
     
     # Recent bookings for timeline
-    recent_list = recent_bookings.order_by('-created_at')[:10]
+    recent_list = recent_bookings.select_related('room', 'user').order_by('-created_at')[:10]
     
     return Response({
         'statistics': stats,
-        'recent_bookings': BookingListSerializer(recent_list, many=True).data,
+        'recent_bookings': BookingListValuesSerializer(recent_list).data,
         'date_range': {
             'start_date': start_date,
             'end_date': end_date
@@ -320,6 +362,7 @@ def booking_dashboard_stats(request):
 
 
 
+@query_budget(3)
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
 def check_availability(request):
@@ -397,22 +440,11 @@ def check_availability(request):
                 'reason': f'Maximum booking duration is {room.max_booking_duration} hours.'
             })
 
-        # Get availability level for the room on this date
-        availability_level = room.get_availability_level(start_date)
-
-        # Check for conflicting bookings
-        conflicting_bookings = Booking.objects.filter(
-            room=room,
-            approval_status__in=['approved', 'pending'],
-            start_date__lte=end_date,
-            end_date__gte=start_date
-        )
-
-        # Check time overlap for bookings on the same day
-        conflicts = []
-        for booking in conflicting_bookings:
-            # Check if there's a time overlap
-            if (booking.start_time < end_time and booking.end_time > start_time):
+        # Answer from the occupancy index; booking rows are only loaded on overlap
+        def compute_answer():
+            window = AvailabilityWindow([room], start_date, end_date)
+            conflicts = []
+            for booking in window.conflicts(room.id, start_date, end_date, start_time, end_time):
                 conflicts.append({
                     'id': booking.id,
                     'purpose': booking.purpose,
@@ -423,6 +455,18 @@ def check_availability(request):
                     'end_date': booking.end_date.strftime('%Y-%m-%d'),
                     'status': booking.approval_status
                 })
+            return {
+                'availability_level': window.availability_level(room.id, start_date),
+                'conflicts': conflicts,
+                'available_slots': [] if conflicts else window.free_slots(room, start_date),
+            }
+
+        answer = availability_cache.get_or_compute(
+            availability_cache.room_key(room.id, 'check', start_date, end_date, start_time, end_time),
+            compute_answer
+        )
+        availability_level = answer['availability_level']
+        conflicts = answer['conflicts']
 
         if conflicts:
             return Response({
@@ -433,7 +477,7 @@ def check_availability(request):
             })
 
         # Get available time slots for the day
-        available_slots = get_available_time_slots(room, start_date)
+        available_slots = answer['available_slots']
 
         return Response({
             'available': True,
@@ -463,6 +507,7 @@ def check_availability(request):
         )
 
 
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
 def get_rooms_availability_levels(request):
@@ -485,21 +530,28 @@ def get_rooms_availability_levels(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    rooms = Room.objects.filter(is_active=True)
-    availability_data = []
-
-    for room in rooms:
-        level = room.get_availability_level(date)
-        availability_data.append({
-            'room_id': room.id,
-            'room_name': room.name,
-            'availability_level': level,
-            'color': {
-                'available': 'green',
-                'partially_booked': 'orange',
-                'fully_booked': 'red'
-            }.get(level, 'gray')
-        })
+    def compute_levels():
+        rooms = list(Room.objects.filter(is_active=True))
+        window = AvailabilityWindow(rooms, date)
+        availability_data = []
+
+        for room in rooms:
+            level = window.availability_level(room.id, date)
+            availability_data.append({
+                'room_id': room.id,
+                'room_name': room.name,
+                'availability_level': level,
+                'color': {
+                    'available': 'green',
+                    'partially_booked': 'orange',
+                    'fully_booked': 'red'
+                }.get(level, 'gray')
+            })
+        return availability_data
+
+    availability_data = availability_cache.get_or_compute(
+        availability_cache.rooms_key('levels', date), compute_levels
+    )
 
     return Response({
         'date': date_str,
@@ -507,6 +559,7 @@ def get_rooms_availability_levels(request):
     })
 
 
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
 def get_room_schedule(request, room_id):
@@ -547,120 +600,74 @@ def get_room_schedule(request, room_id):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-    # Get bookings for the room in the date range
-    bookings = Booking.objects.filter(
-        room=room,
-        approval_status__in=['approved', 'pending'],
-        start_date__lte=end_date,
-        end_date__gte=start_date
-    ).order_by('start_date', 'start_time')
-
-    # Format the schedule
-    schedule = {}
-    current_date = start_date
-    while current_date <= end_date:
-        date_str = current_date.strftime('%Y-%m-%d')
-        day_bookings = []
-
-        for booking in bookings:
-            if booking.start_date <= current_date <= booking.end_date:
-                day_bookings.append({
-                    'id': booking.id,
-                    'purpose': booking.purpose,
-                    'start_time': booking.start_time.strftime('%H:%M'),
-                    'end_time': booking.end_time.strftime('%H:%M'),
-                    'user': booking.user.get_full_name() if booking.user else 'Unknown',
-                    'status': booking.approval_status,
-                    'attendees': booking.expected_attendees
-                })
-
-        # Get available slots for this day
-        available_slots = get_available_time_slots(room, current_date, existing_bookings=day_bookings)
+    def compute_schedule():
+        # Get booked dates for the room in the date range
+        occurrences = BookingOccurrence.objects.filter(
+            room=room,
+            approval_status__in=Booking.ACTIVE_STATUSES,
+            date__range=[start_date, end_date]
+        ).select_related('booking__user').order_by('date', 'start_time')
+
+        # Format the schedule in a single pass over the ordered occurrences
+        schedule = {}
+        for current_date, occurrences_today, available_slots in sweep_schedule(room, occurrences, start_date, end_date):
+            date_str = current_date.strftime('%Y-%m-%d')
+            day_bookings = [
+                {
+                    'id': occurrence.booking.id,
+                    'purpose': occurrence.booking.purpose,
+                    'start_time': occurrence.start_time.strftime('%H:%M'),
+                    'end_time': occurrence.end_time.strftime('%H:%M'),
+                    'user': occurrence.booking.user.get_full_name() if occurrence.booking.user else 'Unknown',
+                    'status': occurrence.approval_status,
+                    'attendees': occurrence.booking.expected_attendees
+                }
+                for occurrence in occurrences_today
+            ]
+
+            schedule[date_str] = {
+                'date': date_str,
+                'day_name': current_date.strftime('%A'),
+                'bookings': day_bookings,
+                'available_slots': available_slots,
+                'is_fully_booked': len(available_slots) == 0
+            }
 
-        schedule[date_str] = {
-            'date': date_str,
-            'day_name': current_date.strftime('%A'),
-            'bookings': day_bookings,
-            'available_slots': available_slots,
-            'is_fully_booked': len(available_slots) == 0
+        return {
+            'room': {
+                'id': room.id,
+                'name': room.name,
+                'capacity': room.capacity,
+                'category': room.category,
+                'amenities': room.amenities
+            },
+            'date_range': {
+                'start_date': start_date.strftime('%Y-%m-%d'),
+                'end_date': end_date.strftime('%Y-%m-%d')
+            },
+            'schedule': schedule
         }
 
-        current_date += timedelta(days=1)
-
-    return Response({
-        'room': {
-            'id': room.id,
-            'name': room.name,
-            'capacity': room.capacity,
-            'category': room.category,
-            'amenities': room.amenities
-        },
-        'date_range': {
-            'start_date': start_date.strftime('%Y-%m-%d'),
-            'end_date': end_date.strftime('%Y-%m-%d')
-        },
-        'schedule': schedule
-    })
+    key = availability_cache.room_key(room.id, 'schedule', start_date, end_date)
+    return Response(availability_cache.get_or_compute(key, compute_schedule))
 
 
 def get_available_time_slots(room, date, existing_bookings=None):
     """
     Helper function to get available time slots for a room on a specific date
     """
-    # Define business hours (8 AM to 6 PM)
-    business_start = time(8, 0)
-    business_end = time(18, 0)
-
     if existing_bookings is None:
-        # Get all bookings for this room on this date
-        bookings = Booking.objects.filter(
-            room=room,
-            approval_status__in=['approved', 'pending'],
-            start_date__lte=date,
-            end_date__gte=date
-        ).order_by('start_time')
-    else:
-        bookings = existing_bookings
+        # Read the day's bitmap from the occupancy index
+        return free_time_slots(room, date, RoomOccupancy.bitmap_for(room, date))
 
-    available_slots = []
-    current_time = business_start
+    bitmap = 0
+    for booking in existing_bookings:
+        bitmap |= slot_mask(booking.start_time, booking.end_time)
 
-    for booking in bookings:
-        if isinstance(booking, dict):
-            # Handle when bookings are already formatted as dicts
-            booking_start = datetime.strptime(booking['start_time'], '%H:%M').time()
-            booking_end = datetime.strptime(booking['end_time'], '%H:%M').time()
-        else:
-            booking_start = booking.start_time
-            booking_end = booking.end_time
-
-        # If there's a gap before this booking, add it as available
-        if current_time < booking_start:
-            duration_hours = (datetime.combine(date, booking_start) - datetime.combine(date, current_time)).total_seconds() / 3600
-            if duration_hours >= room.min_booking_duration:
-                available_slots.append({
-                    'start_time': current_time.strftime('%H:%M'),
-                    'end_time': booking_start.strftime('%H:%M'),
-                    'duration_hours': duration_hours
-                })
-
-        # Move current time to end of this booking
-        if booking_end > current_time:
-            current_time = booking_end
-
-    # Check if there's time available after the last booking
-    if current_time < business_end:
-        duration_hours = (datetime.combine(date, business_end) - datetime.combine(date, current_time)).total_seconds() / 3600
-        if duration_hours >= room.min_booking_duration:
-            available_slots.append({
-                'start_time': current_time.strftime('%H:%M'),
-                'end_time': business_end.strftime('%H:%M'),
-                'duration_hours': duration_hours
-            })
-
-    return available_slots
+    return free_time_slots(room, date, bitmap)
 
 
+@query_budget(17)
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def quick_book(request):
@@ -683,6 +690,7 @@ def quick_book(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@query_budget(3)
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
 def available_rooms(request):
@@ -711,54 +719,70 @@ def available_rooms(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    # Start with all active rooms
-    available_rooms_list = Room.objects.filter(is_active=True)
+    def compute_available():
+        # Start with all active rooms
+        available_rooms_list = Room.objects.filter(is_active=True)
 
-    # Filter by capacity if specified
-    if capacity:
-        try:
-            available_rooms_list = available_rooms_list.filter(capacity__gte=int(capacity))
-        except ValueError:
-            pass
+        # Filter by capacity if specified
+        if capacity:
+            try:
+                available_rooms_list = available_rooms_list.filter(capacity__gte=int(capacity))
+            except ValueError:
+                pass
 
-    # Filter by category if specified
-    if category:
-        available_rooms_list = available_rooms_list.filter(category=category)
+        # Filter by category if specified
+        if category:
+            available_rooms_list = available_rooms_list.filter(category=category)
+
+        # Check every room against one shared availability window
+        available_rooms_list = list(available_rooms_list)
+        window = AvailabilityWindow(available_rooms_list, date)
+        available = []
+        for room in available_rooms_list:
+            if window.is_free(room.id, date, start_time, end_time):
+                available.append({
+                    'id': room.id,
+                    'name': room.name,
+                    'capacity': room.capacity,
+                    'category': room.category,
+                    'category_display': room.category_display,
+                    'floor': room.floor,
+                    'amenities': room.amenities,
+                    'image': room.image.url if room.image else None
+                })
 
-    # Check each room for availability
-    available = []
-    for room in available_rooms_list:
-        # Check for conflicting bookings
-        conflicts = Booking.objects.filter(
-            room=room,
-            approval_status__in=['approved', 'pending'],
-            start_date__lte=date,
-            end_date__gte=date,
-            start_time__lt=end_time,
-            end_time__gt=start_time
-        ).exists()
-
-        if not conflicts:
-            available.append({
-                'id': room.id,
-                'name': room.name,
-                'capacity': room.capacity,
-                'category': room.category,
-                'category_display': room.category_display,
-                'floor': room.floor,
-                'amenities': room.amenities,
-                'image': room.image.url if room.image else None
-            })
+        return {
+            'date': date.strftime('%Y-%m-%d'),
+            'start_time': start_time.strftime('%H:%M'),
+            'end_time': end_time.strftime('%H:%M'),
+            'available_rooms': available,
+            'total_available': len(available)
+        }
 
-    return Response({
-        'date': date.strftime('%Y-%m-%d'),
-        'start_time': start_time.strftime('%H:%M'),
-        'end_time': end_time.strftime('%H:%M'),
-        'available_rooms': available,
-        'total_available': len(available)
-    })
+    key = availability_cache.rooms_key('available', date, start_time, end_time, capacity, category)
+    return Response(availability_cache.get_or_compute(key, compute_available))
 
 
+def calendar_occurrences(user, start_date, end_date):
+    """Booked dates between start_date and end_date a user's calendar shows"""
+    occurrences = BookingOccurrence.objects.filter(
+        date__range=[start_date, end_date]
+    ).select_related('booking__room', 'booking__user').order_by('date', 'start_time')
+
+    if user.role == 'super_admin':
+        occurrences = occurrences.filter(approval_status='approved')
+    elif user.role == 'room_admin':
+        managed_room_ids = user.managed_rooms.values_list('id', flat=True)
+        occurrences = occurrences.filter(
+            Q(room_id__in=managed_room_ids) | Q(booking__user=user),
+            approval_status='approved'
+        )
+    else:
+        occurrences = occurrences.filter(booking__user=user)
+    return occurrences
+
+
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def calendar_events(request):
@@ -787,46 +811,30 @@ def calendar_events(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Get bookings based on user role
-    if user.role == 'super_admin':
-        bookings = Booking.objects.filter(
-            start_date__lte=end_date,
-            end_date__gte=start_date,
-            approval_status='approved'
-        )
-    elif user.role == 'room_admin':
-        managed_room_ids = user.managed_rooms.values_list('id', flat=True)
-        bookings = Booking.objects.filter(
-            Q(room_id__in=managed_room_ids) | Q(user=user),
-            start_date__lte=end_date,
-            end_date__gte=start_date,
-            approval_status='approved'
-        )
-    else:
-        bookings = Booking.objects.filter(
-            user=user,
-            start_date__lte=end_date,
-            end_date__gte=start_date
-        )
+    occurrences = calendar_occurrences(user, start_date, end_date)
     
-    # Format events for calendar
+    # Format events for calendar, one per booked date
     events = []
-    for booking in bookings:
+    for occurrence in occurrences:
+        booking = occurrence.booking
         events.append({
-            'id': booking.id,
+            # A booking has at most one occurrence per date
+            'id': f"{booking.id}:{occurrence.date}",
+            'groupId': booking.id,
             'title': f"{booking.room.name} - {booking.purpose}",
-            'start': f"{booking.start_date}T{booking.start_time}",
-            'end': f"{booking.end_date}T{booking.end_time}",
+            'start': f"{occurrence.date}T{occurrence.start_time}",
+            'end': f"{occurrence.date}T{occurrence.end_time}",
             'backgroundColor': {
                 'approved': '#28a745',
                 'pending': '#ffc107',
                 'rejected': '#dc3545',
                 'cancelled': '#6c757d'
-            }.get(booking.approval_status, '#007bff'),
+            }.get(occurrence.approval_status, '#007bff'),
             'extendedProps': {
+                'booking_id': booking.id,
                 'room': booking.room.name,
                 'user': booking.user.get_full_name(),
-                'status': booking.approval_status,
+                'status': occurrence.approval_status,
                 'attendees': booking.expected_attendees
             }
         })
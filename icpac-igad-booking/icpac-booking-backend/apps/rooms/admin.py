@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.db.models import Count, Q
 from django.db import models
+from apps.bookings import cache as availability_cache
 from .models import Room, RoomAmenity
 
 
@@ -119,13 +120,18 @@ class RoomAdmin(admin.ModelAdmin):
     
     def activate_rooms(self, request, queryset):
         """Activate selected rooms"""
+        room_ids = list(queryset.values_list('id', flat=True))
         updated = queryset.update(is_active=True)
+        # update() skips the Room signals that invalidate cached availability
+        availability_cache.bump_on_commit(*room_ids)
         self.message_user(request, f'{updated} room(s) activated successfully.')
     activate_rooms.short_description = 'Activate selected rooms'
     
     def deactivate_rooms(self, request, queryset):
         """Deactivate selected rooms"""
+        room_ids = list(queryset.values_list('id', flat=True))
         updated = queryset.update(is_active=False)
+        availability_cache.bump_on_commit(*room_ids)
         self.message_user(request, f'{updated} room(s) deactivated.')
     deactivate_rooms.short_description = 'Deactivate selected rooms'
     
@@ -132,8 +132,7 @@ class Room(models.Model):
         from apps.bookings.models import Booking
         return Booking.objects.filter(
             room=self,
-            start_date__lte=date,
-            end_date__gte=date,
+            occurrences__date=date,
             approval_status__in=['pending', 'approved']
         ).order_by('start_time')
 
@@ -142,56 +141,65 @@ class Room(models.Model):
         Get availability level for a specific date
         Returns: 'available', 'partially_booked', or 'fully_booked'
         """
-        from datetime import time
-        from apps.bookings.models import Booking
+        from apps.bookings.models import RoomOccupancy
+        from apps.bookings.occupancy import availability_level
 
-        # Get all approved/pending bookings for this date
-        bookings = self.get_bookings_for_date(date)
+        return availability_level(RoomOccupancy.bitmap_for(self, date))
 
-        if not bookings.exists():
-            return 'available'
+    def get_availability_for_date(self, date, start_time=None, end_time=None):
+        """
+        Get availability details for a specific date, and for a time slot
+        on that date when start_time and end_time are given
+        """
+        from apps.bookings.availability import AvailabilityWindow
 
-        # Define working hours (8 AM to 6 PM = 10 hours)
-        working_start = time(8, 0)
-        working_end = time(18, 0)
-        total_working_minutes = 10 * 60  # 600 minutes
+        window = AvailabilityWindow([self], date)
+        availability = {
+            'availability_level': window.availability_level(self.id, date),
+            'bookings': [
+                {
+                    'id': booking.id,
+                    'purpose': booking.purpose,
+                    'start_time': booking.start_time.strftime('%H:%M'),
+                    'end_time': booking.end_time.strftime('%H:%M'),
+                    'status': booking.approval_status
+                }
+                for booking in window.bookings_on(self.id, date)
+            ],
+            'available_slots': window.free_slots(self, date),
+        }
 
-        # Calculate total booked minutes
-        booked_minutes = 0
-        for booking in bookings:
-            # Get booking time range for this specific date
-            start_time = max(booking.start_time, working_start)
-            end_time = min(booking.end_time, working_end)
-
-            # Calculate duration in minutes
-            start_minutes = start_time.hour * 60 + start_time.minute
-            end_minutes = end_time.hour * 60 + end_time.minute
-            duration = max(0, end_minutes - start_minutes)
-            booked_minutes += duration
-
-        # Calculate booking percentage
-        booking_percentage = (booked_minutes / total_working_minutes) * 100
-
-        # Determine availability level
-        if booking_percentage >= 100:
-            return 'fully_booked'
-        elif booking_percentage > 0:
-            return 'partially_booked'
-        else:
-            return 'available'
+        if start_time and end_time:
+            conflicts = window.conflicts(self.id, date, date, start_time, end_time)
+            availability['is_available'] = self.is_active and not conflicts
+            availability['conflicts'] = [
+                {
+                    'id': booking.id,
+                    'purpose': booking.purpose,
+                    'start_time': booking.start_time.strftime('%H:%M'),
+                    'end_time': booking.end_time.strftime('%H:%M')
+                }
+                for booking in conflicts
+            ]
+
+        return availability
 
     def can_accept_booking(self, date, start_time, end_time, booking_type='hourly'):
         """
         Check if room can accept a new booking
         Returns: (can_book: bool, reason: str, conflicts: list)
         """
-        from apps.bookings.models import Booking
-        from datetime import time as datetime_time
+        from apps.bookings.models import RoomOccupancy
+        from apps.bookings.occupancy import slot_mask
 
         # Check if room is active
         if not self.is_active:
             return False, 'Room is currently unavailable', []
 
+        # Free slots in the occupancy index mean there is nothing to look up
+        if not RoomOccupancy.bitmap_for(self, date) & slot_mask(start_time, end_time):
+            return True, 'Available', []
+
         # Get conflicting bookings
         bookings = self.get_bookings_for_date(date)
         conflicts = []
@@ -2,6 +2,7 @@
 Room serializers for ICPAC Booking System
 """
 from rest_framework import serializers
+from icpac_booking.serializers import SparseFieldsSerializerMixin
 from .models import Room, RoomAmenity
 
 
@@ -15,13 +16,20 @@ class RoomAmenitySerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class RoomSerializer(serializers.ModelSerializer):
+class RoomSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for rooms
     """
     category_display = serializers.CharField(source='get_category_display', read_only=True)
     amenities_list = serializers.CharField(source='get_amenities_list', read_only=True)
     is_large_room = serializers.BooleanField(read_only=True)
+    field_sources = {
+        'amenities_list': ('amenities',),
+        'is_large_room': ('capacity',),
+        # Counted from the room's bookings by its id
+        'total_bookings': (),
+        'upcoming_bookings': (),
+    }
     
     class Meta:
         model = Room
@@ -53,7 +61,7 @@ class RoomSerializer(serializers.ModelSerializer):
         return value
 
 
-class RoomListSerializer(serializers.ModelSerializer):
+class RoomListSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """
     Simplified serializer for room listings
     """
@@ -88,7 +96,7 @@ class RoomDetailSerializer(RoomSerializer):
         upcoming = obj.bookings.filter(
             approval_status='approved',
             start_date__gte=timezone.now().date()
-        ).order_by('start_date', 'start_time')[:5]
+        ).select_related('user').order_by('start_date', 'start_time')[:5]
         
         # Return simple representation to avoid circular imports
         return [
@@ -1,3 +1,265 @@
-from django.test import TestCase
+from datetime import time, timedelta
+import re
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.authentication.models import User
+from apps.bookings.models import Booking
+from icpac_booking.querybudget import QueryBudgetTestMixin
+from .models import Room, RoomAmenity
+
+
+@override_settings(AUDIT_LOG_ASYNC=False, LOG_API_REQUESTS=False)
+class RoomEndpointBudgetTests(QueryBudgetTestMixin, APITestCase):
+    """
+    Every room endpoint family stays within its query budget while
+    returning what it should
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rooms = [
+            Room.objects.create(
+                name=f'Room {n}', capacity=10 + n, category='meeting' if n % 2 else 'conference'
+            )
+            for n in range(12)
+        ]
+        for name in ('Projector', 'Whiteboard', 'Video Conference'):
+            RoomAmenity.objects.create(name=name)
+        cls.admin = User.objects.create(username='admin', email='admin@icpac.net', role='super_admin')
+        cls.room_admin = User.objects.create(username='roomadmin', email='roomadmin@icpac.net', role='room_admin')
+        cls.room_admin.managed_rooms.set(cls.rooms[:3])
+        cls.users = [
+            User.objects.create(username=f'user{n}', email=f'user{n}@icpac.net', first_name='User', last_name=str(n))
+            for n in range(3)
+        ]
+
+        cls.day = timezone.now().date() + timedelta(days=2)
+        for n in range(8):
+            Booking.objects.create(
+                room=cls.rooms[0],
+                user=cls.users[n % 3],
+                start_date=cls.day,
+                end_date=cls.day,
+                start_time=time(8 + n),
+                end_time=time(9 + n),
+                purpose=f'Meeting {n}',
+                approval_status='approved',
+            )
+
+    def setUp(self):
+        super().setUp()
+        caches['default'].clear()
+
+    def login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+    def test_room_crud(self):
+        response = self.client.get('/api/rooms/')
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        names = [room['name'] for room in response.data['results']]
+        self.assertEqual(names, sorted(room.name for room in self.rooms)[:len(names)])
+
+        self.login(self.admin)
+        response = self.client.post('/api/rooms/', {
+            'name': 'Board Room', 'capacity': 12, 'category': 'meeting',
+            'min_booking_duration': 1, 'max_booking_duration': 8,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertWithinBudget(response)
+        self.assertEqual(Room.objects.get(name='Board Room').capacity, 12)
+
+        url = f'/api/rooms/{self.rooms[0].id}/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        self.assertEqual(response.data['name'], 'Room 0')
+        # The five next approved bookings, soonest first
+        self.assertEqual(
+            [booking['purpose'] for booking in response.data['upcoming_bookings']],
+            [f'Meeting {n}' for n in range(5)]
+        )
+
+        response = self.client.patch(f'/api/rooms/{self.rooms[1].id}/', {'capacity': 30}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertWithinBudget(response)
+        self.assertEqual(Room.objects.get(pk=self.rooms[1].pk).capacity, 30)
+
+        response = self.client.delete(f'/api/rooms/{self.rooms[1].id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertWithinBudget(response)
+        self.assertFalse(Room.objects.get(pk=self.rooms[1].pk).is_active)
+        self.assertEqual(self.client.get('/api/rooms/', {'search': 'Room 1'}).data['count'], 2)
+
+    def test_amenities(self):
+        self.login(self.users[0])
+        response = self.client.get('/api/rooms/amenities/')
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        self.assertEqual(
+            [amenity['name'] for amenity in response.data['results']],
+            ['Projector', 'Video Conference', 'Whiteboard']
+        )
+
+        self.login(self.admin)
+        response = self.client.post('/api/rooms/amenities/', {'name': 'Speakers'}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertWithinBudget(response)
+        self.assertTrue(RoomAmenity.objects.filter(name='Speakers', is_active=True).exists())
+
+    def test_availability(self):
+        self.login(self.users[0])
+        response = self.client.post(
+            f'/api/rooms/{self.rooms[0].id}/availability/',
+            {'date': str(self.day), 'start_time': '10:30', 'end_time': '11:30'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertWithinBudget(response)
+        availability = response.data['availability']
+        self.assertEqual(len(availability['bookings']), 8)
+        self.assertFalse(availability['is_available'])
+        self.assertEqual([conflict['purpose'] for conflict in availability['conflicts']], ['Meeting 2', 'Meeting 3'])
+
+    def test_stats(self):
+        for user in (self.admin, self.room_admin):
+            self.login(user)
+            response = self.client.get(f'/api/rooms/{self.rooms[0].id}/stats/', {
+                'start_date': str(self.day), 'end_date': str(self.day),
+            })
+            self.assertEqual(response.status_code, 200)
+            self.assertWithinBudget(response)
+            self.assertEqual(
+                (response.data['total_bookings'], response.data['approved_bookings'], response.data['pending_bookings']),
+                (8, 8, 0)
+            )
+
+            response = self.client.get('/api/rooms/stats/overview/')
+            self.assertEqual(response.status_code, 200)
+            self.assertWithinBudget(response)
+        # Room admins only see the rooms they manage
+        self.assertEqual(response.data['total_rooms'], 3)
+        self.assertEqual(
+            sorted(room['id'] for room in response.data['room_statistics']), [room.id for room in self.rooms[:3]]
+        )
+
+        self.login(self.users[0])
+        response = self.client.get('/api/rooms/categories/')
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        self.assertEqual(
+            [(category['category'], category['count'], category['average_capacity'])
+             for category in response.data['categories']],
+            [('conference', 6, 15.0), ('meeting', 6, 16.0)]
+        )
+
+
+@override_settings(AUDIT_LOG_ASYNC=False, LOG_API_REQUESTS=False)
+class RoomSparseFieldsTests(APITestCase):
+    """?fields= on room lists and details"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rooms = [
+            Room.objects.create(name=f'Room {n}', capacity=10 + 10 * n, category='meeting', description='Quiet')
+            for n in range(4)
+        ]
+        cls.user = User.objects.create(username='user', email='user@icpac.net')
+        day = timezone.now().date() + timedelta(days=2)
+        Booking.objects.create(
+            room=cls.rooms[0], user=cls.user, start_date=day, end_date=day,
+            start_time=time(9), end_time=time(10), purpose='Meeting', approval_status='approved',
+        )
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_list_fields(self):
+        full = self.client.get('/api/rooms/').data['results']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/rooms/', {'fields': 'id,name,category_display'})
+        self.assertEqual(response.data['results'], [
+            {'id': room['id'], 'name': room['name'], 'category_display': room['category_display']} for room in full
+        ])
+        rooms_sql = [query['sql'] for query in queries if 'FROM "rooms"' in query['sql']]
+        select = rooms_sql[-1].split(' FROM ')[0]
+        self.assertEqual(re.findall(r'"rooms"\."(\w+)"', select), ['id', 'name', 'category'])
+
+    def test_detail_fields(self):
+        room = self.rooms[0]
+        full = self.client.get(f'/api/rooms/{room.id}/').data
+        self.assertEqual(full['total_bookings'], 1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/rooms/{room.id}/', {'fields': 'id,name,is_large_room'})
+        self.assertEqual(response.data, {'id': room.id, 'name': full['name'], 'is_large_room': full['is_large_room']})
+        # Unrequested booking counts never run, and the description is not loaded
+        self.assertFalse([query for query in queries if '"bookings"' in query['sql']])
+        self.assertFalse([query for query in queries if '"rooms"."description"' in query['sql']])
+
+        response = self.client.get(f'/api/rooms/{room.id}/', {'fields': 'id,total_bookings'})
+        self.assertEqual(response.data, {'id': room.id, 'total_bookings': 1})
+
+    def test_unknown_names_are_rejected(self):
+        response = self.client.get(f'/api/rooms/{self.rooms[0].id}/', {'expand': 'bookings'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['expand'], 'Unknown field(s): bookings. Available: none.')
+        response = self.client.get('/api/rooms/', {'fields': 'id,total_bookings'})
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.data['fields'].startswith('Unknown field(s): total_bookings. Available: id, name'))
+
+
+@override_settings(AUDIT_LOG_ASYNC=False, LOG_API_REQUESTS=False)
+class RoomStatsTests(APITestCase):
+    """Room statistics count each booking once and take booked hours from the rollup"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.room = Room.objects.create(name='Room', capacity=20, category='meeting')
+        cls.admin = User.objects.create(username='admin', email='admin@icpac.net', role='super_admin')
+        cls.first_day = timezone.now().date() - timedelta(days=8)
+        cls.last_day = cls.first_day + timedelta(days=4)
+
+        # Book "last week" as it was then
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() - timedelta(days=10)):
+            Booking.objects.create(
+                room=cls.room, user=cls.admin, start_date=cls.first_day, end_date=cls.last_day,
+                start_time=time(14), end_time=time(16), purpose='Workshop',
+                booking_type='multi_day', approval_status='approved',
+            )
+            Booking.objects.create(
+                room=cls.room, user=cls.admin, start_date=cls.first_day, end_date=cls.first_day,
+                start_time=time(9), end_time=time(10), purpose='Briefing',
+            )
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client.force_authenticate(self.admin)
+
+    def test_room_stats(self):
+        response = self.client.get(f'/api/rooms/{self.room.id}/stats/', {
+            'start_date': str(self.first_day), 'end_date': str(self.last_day),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            (response.data['total_bookings'], response.data['approved_bookings'], response.data['pending_bookings']),
+            (2, 1, 1)
+        )
+        # 10 booked hours out of 5 days of 8 working hours
+        self.assertEqual(response.data['utilization_rate'], 25.0)
+
+    def test_overview_stats(self):
+        response = self.client.get('/api/rooms/stats/overview/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_bookings_last_30_days'], 2)
+        self.assertEqual(response.data['approved_bookings_last_30_days'], 1)
+        self.assertEqual(response.data['pending_bookings_last_30_days'], 1)
+        [room] = response.data['room_statistics']
+        self.assertEqual(room['total_bookings'], 1)
+        self.assertEqual(room['utilization_rate'], round(10 / (31 * 8) * 100, 2))
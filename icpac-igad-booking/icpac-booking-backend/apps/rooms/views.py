@@ -5,8 +5,11 @@ from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.utils import timezone
-from django.db.models import Q, Count, Avg
+from django.db.models import Q, Count, Avg, Sum
 from datetime import datetime, timedelta
+from apps.bookings import cache as availability_cache
+from icpac_booking.querybudget import query_budget
+from icpac_booking.serializers import SparseFieldsMixin
 from .models import Room, RoomAmenity
 from .serializers import (
     RoomSerializer,
@@ -19,12 +22,13 @@ from .serializers import (
 )
 
 
-class RoomListView(generics.ListCreateAPIView):
+class RoomListView(SparseFieldsMixin, generics.ListCreateAPIView):
     """
     List all rooms or create a new room
     """
     queryset = Room.objects.filter(is_active=True).order_by('name')
     permission_classes = [permissions.AllowAny]  # Allow public access to view rooms
+    query_budget = {'GET': 3, 'POST': 3}
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -74,12 +78,13 @@ class RoomListView(generics.ListCreateAPIView):
         serializer.save()
 
 
-class RoomDetailView(generics.RetrieveUpdateDestroyAPIView):
+class RoomDetailView(SparseFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update or delete a room
     """
     queryset = Room.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'GET': 4, 'PUT': 3, 'PATCH': 3, 'DELETE': 3}
     
     def get_serializer_class(self):
         if self.request.method in ['PUT', 'PATCH']:
@@ -110,6 +115,7 @@ class RoomAmenityListView(generics.ListCreateAPIView):
     queryset = RoomAmenity.objects.filter(is_active=True).order_by('name')
     serializer_class = RoomAmenitySerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'GET': 3, 'POST': 3}
     
     def perform_create(self, serializer):
         # Only super admin can create amenities
@@ -119,6 +125,7 @@ class RoomAmenityListView(generics.ListCreateAPIView):
         serializer.save()
 
 
+@query_budget(4)
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def check_room_availability(request, room_id):
@@ -142,7 +149,10 @@ def check_room_availability(request, room_id):
     end_time = serializer.validated_data.get('end_time')
     
     # Get availability for the entire day or specific time slot
-    availability_data = room.get_availability_for_date(date, start_time, end_time)
+    key = availability_cache.room_key(room.id, 'room_day', date, start_time, end_time)
+    availability_data = availability_cache.get_or_compute(
+        key, lambda: room.get_availability_for_date(date, start_time, end_time)
+    )
     
     return Response({
         'room_id': room.id,
@@ -152,6 +162,7 @@ def check_room_availability(request, room_id):
     })
 
 
+@query_budget(6)
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def room_booking_stats(request, room_id):
@@ -192,29 +203,35 @@ def room_booking_stats(request, room_id):
         except ValueError:
             pass
     
-    # Get bookings in date range
-    bookings = room.bookings.filter(
-        start_date__range=[start_date, end_date]
-    )
+    # Bookings held in the range, each counted once however many days it spans
+    from apps.bookings.models import BookingOccurrence, RoomUsageDaily
+    counts = BookingOccurrence.objects.filter(
+        room=room,
+        date__range=[start_date, end_date]
+    ).aggregate(**booking_counts())
+    
+    total_bookings = counts['total']
+    approved_bookings = counts['approved']
+    pending_bookings = counts['pending']
     
-    total_bookings = bookings.count()
-    approved_bookings = bookings.filter(approval_status='approved').count()
-    pending_bookings = bookings.filter(approval_status='pending').count()
+    # Booked minutes from the daily usage rollup
+    usage = RoomUsageDaily.objects.filter(
+        room=room,
+        date__range=[start_date, end_date]
+    ).aggregate(minutes=Sum('booked_minutes'))
     
     # Calculate utilization rate (simplified)
     total_days = (end_date - start_date).days + 1
     working_hours_per_day = 8  # Assume 8 working hours per day
     total_available_hours = total_days * working_hours_per_day
-    
-    # Sum up approved booking durations
-    total_booked_hours = 0
-    for booking in bookings.filter(approval_status='approved'):
-        duration = booking.get_duration_hours()
-        total_booked_hours += duration
+    total_booked_hours = (usage['minutes'] or 0) / 60
     
     utilization_rate = (total_booked_hours / total_available_hours * 100) if total_available_hours > 0 else 0
     
     # Get popular time slots
+    bookings = room.bookings.filter(
+        start_date__range=[start_date, end_date]
+    )
     popular_slots = bookings.filter(approval_status='approved').values(
         'start_time'
     ).annotate(
@@ -243,6 +260,7 @@ def room_booking_stats(request, room_id):
     return Response(stats_data)
 
 
+@query_budget(5)
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def rooms_overview_stats(request):
@@ -266,36 +284,36 @@ def rooms_overview_stats(request):
     end_date = timezone.now().date()
     start_date = end_date - timedelta(days=30)
     
-    from apps.bookings.models import Booking
+    from apps.bookings.models import BookingOccurrence, RoomUsageDaily
     
-    if request.user.role == 'super_admin':
-        recent_bookings = Booking.objects.filter(
-            start_date__range=[start_date, end_date]
-        )
-    else:
-        room_ids = rooms.values_list('id', flat=True)
-        recent_bookings = Booking.objects.filter(
-            room_id__in=room_ids,
-            start_date__range=[start_date, end_date]
-        )
+    occurrences = BookingOccurrence.objects.filter(date__range=[start_date, end_date])
+    usage = RoomUsageDaily.objects.filter(date__range=[start_date, end_date], room__in=rooms)
+    if request.user.role != 'super_admin':
+        occurrences = occurrences.filter(room__in=rooms)
+    
+    # Distinct bookings per room in one grouped query; a booking has one room,
+    # so the per-room counts add up to the totals
+    counts_by_room = {
+        row['room_id']: row
+        for row in occurrences.values('room_id').annotate(**booking_counts()).order_by()
+    }
+    total_bookings = sum(row['total'] for row in counts_by_room.values())
+    approved_bookings = sum(row['approved'] for row in counts_by_room.values())
+    pending_bookings = sum(row['pending'] for row in counts_by_room.values())
     
-    total_bookings = recent_bookings.count()
-    approved_bookings = recent_bookings.filter(approval_status='approved').count()
-    pending_bookings = recent_bookings.filter(approval_status='pending').count()
+    # Booked minutes per room from the daily usage rollup
+    minutes_by_room = dict(
+        usage.values('room_id').annotate(minutes=Sum('booked_minutes')).order_by().values_list('room_id', 'minutes')
+    )
     
     # Room utilization by category
+    total_days = (end_date - start_date).days + 1
+    working_hours_per_day = 8
+    total_available_hours = total_days * working_hours_per_day
+    
     room_stats = []
     for room in rooms.order_by('name'):
-        room_bookings = recent_bookings.filter(room=room, approval_status='approved')
-        
-        # Calculate utilization
-        total_days = (end_date - start_date).days + 1
-        working_hours_per_day = 8
-        total_available_hours = total_days * working_hours_per_day
-        
-        total_booked_hours = sum([
-            booking.get_duration_hours() for booking in room_bookings
-        ])
+        total_booked_hours = (minutes_by_room.get(room.id) or 0) / 60
         
         utilization_rate = (total_booked_hours / total_available_hours * 100) if total_available_hours > 0 else 0
         
@@ -304,7 +322,7 @@ def rooms_overview_stats(request):
             'name': room.name,
             'category': room.category,
             'capacity': room.capacity,
-            'total_bookings': room_bookings.count(),
+            'total_bookings': counts_by_room.get(room.id, {}).get('approved', 0),
             'utilization_rate': round(utilization_rate, 2)
         })
     
@@ -326,6 +344,16 @@ def rooms_overview_stats(request):
     return Response(overview)
 
 
+def booking_counts():
+    """Aggregates counting distinct bookings (total, approved, pending) over booking occurrences"""
+    return {
+        'total': Count('booking', distinct=True),
+        'approved': Count('booking', distinct=True, filter=Q(approval_status='approved')),
+        'pending': Count('booking', distinct=True, filter=Q(approval_status='pending')),
+    }
+
+
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def room_categories(request):
@@ -0,0 +1,161 @@
+"""
+Asynchronous audit log writer for ICPAC Booking System
+
+AuditLog.log_action hands entries to a bounded in-process queue instead of
+inserting them inside the request. A background thread writes the queue with
+bulk_create once AUDIT_LOG_BATCH_SIZE entries are waiting or every
+AUDIT_LOG_FLUSH_INTERVAL seconds. Batches the database rejects are appended
+to AUDIT_LOG_FALLBACK_FILE as JSON lines, which the replay_audit_fallback
+command loads back. When the queue is full, droppable entries (sampled API
+reads) are dropped and counted rather than slowing requests down; any other
+entry is written at once by the thread that logged it.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, close_old_connections
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_FIELDS = (
+    'id', 'user_id', 'action_type', 'description', 'object_type', 'object_id',
+    'ip_address', 'user_agent', 'additional_data', 'timestamp',
+)
+
+
+def fallback_path():
+    return Path(getattr(settings, 'AUDIT_LOG_FALLBACK_FILE', 'audit-fallback.jsonl'))
+
+
+def to_fallback_line(entry):
+    record = {field: getattr(entry, field) for field in FALLBACK_FIELDS}
+    return json.dumps(record, cls=DjangoJSONEncoder, default=str) + '\n'
+
+
+class AuditQueue:
+    """
+    Bounded buffer of unsaved AuditLog instances drained by a daemon thread
+    """
+
+    def __init__(self):
+        self.events = queue.Queue(maxsize=getattr(settings, 'AUDIT_LOG_QUEUE_SIZE', 10000))
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+        self.counters = {'enqueued': 0, 'written': 0, 'dropped': 0, 'fallback': 0, 'overflow': 0}
+
+    @property
+    def batch_size(self):
+        return getattr(settings, 'AUDIT_LOG_BATCH_SIZE', 200)
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'AUDIT_LOG_FLUSH_INTERVAL', 2)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def enqueue(self, entry, droppable=False):
+        """
+        Queue an unsaved AuditLog. When the queue is full a droppable entry is
+        dropped (returns False) and any other is written synchronously.
+        """
+        self.start()
+        try:
+            self.events.put_nowait(entry)
+        except queue.Full:
+            if droppable:
+                self.count('dropped')
+                return False
+            self.count('overflow')
+            self.write([entry])
+            return True
+
+        self.count('enqueued')
+        if self.events.qsize() >= self.batch_size:
+            self.wakeup.set()
+        return True
+
+    def start(self):
+        """Start the writer thread, again in a child process after a fork"""
+        if self.thread is not None and self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.thread is not None and self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self.run, name='audit-log-writer', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def take_batch(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.events.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self):
+        """Write everything queued so far"""
+        batch = self.take_batch()
+        while batch:
+            self.write(batch)
+            batch = self.take_batch()
+        # The writer thread keeps its own connection; recycle it like a request would
+        close_old_connections()
+
+    def write(self, batch):
+        from .models import AuditLog
+
+        try:
+            AuditLog.objects.bulk_create(batch)
+        except DatabaseError:
+            logger.exception('Could not write %d audit log entries; using fallback file', len(batch))
+            close_old_connections()
+            self.write_fallback(batch)
+        else:
+            self.count('written', len(batch))
+
+    def write_fallback(self, batch):
+        path = fallback_path()
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with path.open('a', encoding='utf-8') as fallback:
+                fallback.writelines(to_fallback_line(entry) for entry in batch)
+                fallback.flush()
+                os.fsync(fallback.fileno())
+        except OSError:
+            logger.exception('Could not write %d audit log entries to %s', len(batch), path)
+            self.count('dropped', len(batch))
+        else:
+            self.count('fallback', len(batch))
+
+    def stats(self):
+        """Counters since the process started, plus the current queue depth"""
+        with self.lock:
+            counters = dict(self.counters)
+        counters['queued'] = self.events.qsize()
+        counters['capacity'] = self.events.maxsize
+        return counters
+
+
+audit_queue = AuditQueue()
+
+# Entries still queued at shutdown are written before the process exits
+atexit.register(audit_queue.flush)
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from apps.security import partitions
+
+
+class Command(BaseCommand):
+    help = 'Archive security log months past their retention and create upcoming partitions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--table',
+            choices=sorted(partitions.SECURITY_LOG_TABLES),
+            help='Only process this table'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='List what would be archived')
+
+    def handle(self, *args, **options):
+        tables = [options['table']] if options['table'] else sorted(partitions.SECURITY_LOG_TABLES)
+        current = partitions.month_start(timezone.now())
+
+        for table in tables:
+            retention = partitions.retention_months(table)
+            if retention < 1:
+                raise CommandError(f'Retention for {table} must be at least one month.')
+            cutoff = partitions.add_months(current, 1 - retention)
+            self.stdout.write(f'{table}: keeping {cutoff:%Y-%m} onwards')
+
+            if partitions.is_partitioned(connection, table):
+                self.archive_partitions(table, cutoff, options['dry_run'])
+            else:
+                self.archive_months(table, cutoff, options['dry_run'])
+
+        self.stdout.write(self.style.SUCCESS('\n✅ Security logs archived!'))
+
+    def archive_partitions(self, table, cutoff, dry_run):
+        if not dry_run:
+            # Give rows that landed in the default partition a monthly partition
+            for name in partitions.ensure_partitions(connection, table):
+                self.stdout.write(self.style.SUCCESS(f'✓ Created partition {name}'))
+
+        expired = {
+            **partitions.detached_partitions(connection, table),
+            **partitions.attached_partitions(connection, table),
+        }
+        for month, name in sorted(expired.items()):
+            if month >= cutoff:
+                continue
+            if dry_run:
+                self.stdout.write(f'  Would archive partition {name}')
+                continue
+            count = partitions.archive_partition(connection, table, name, month)
+            self.stdout.write(self.style.SUCCESS(f'✓ Archived {count} rows from partition {name}'))
+
+    def archive_months(self, table, cutoff, dry_run):
+        for month in partitions.expired_months(connection, table, cutoff):
+            if dry_run:
+                self.stdout.write(f'  Would archive {table} rows from {month:%Y-%m}')
+                continue
+            count = partitions.archive_month(connection, table, month)
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ Moved {count} rows from {month:%Y-%m} to {partitions.archive_table_name(table)}'
+            ))
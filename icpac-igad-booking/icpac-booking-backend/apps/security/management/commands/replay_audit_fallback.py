@@ -0,0 +1,41 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from apps.security.audit import fallback_path
+from apps.security.models import AuditLog
+
+
+class Command(BaseCommand):
+    help = 'Load audit log entries written to the fallback file back into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help='Fallback file to replay (default: AUDIT_LOG_FALLBACK_FILE)')
+        parser.add_argument('--keep', action='store_true', help='Keep the file after replaying it')
+
+    def handle(self, *args, **options):
+        path = Path(options['file']) if options['file'] else fallback_path()
+        if not path.exists():
+            self.stdout.write(f'  No fallback file at {path}')
+            return
+
+        entries = []
+        with path.open(encoding='utf-8') as fallback:
+            for number, line in enumerate(fallback, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    raise CommandError(f'{path}:{number} is not valid JSON.')
+                record['timestamp'] = parse_datetime(record['timestamp'])
+                entries.append(AuditLog(**record))
+
+        # Entries already written by an earlier, interrupted replay keep their ids
+        created = AuditLog.objects.bulk_create(entries, batch_size=500, ignore_conflicts=True)
+        self.stdout.write(self.style.SUCCESS(f'✓ Replayed {len(created)} audit log entries from {path}'))
+
+        if not options['keep']:
+            path.unlink()
+        self.stdout.write(self.style.SUCCESS('\n✅ Audit fallback file replayed!'))
@@ -7,6 +7,7 @@ from django.utils import timezone
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from .models import LoginAttempt, AuditLog
+from .sampling import api_request_sampler, must_log
 import json
 
 User = get_user_model()
@@ -29,6 +30,10 @@ class SecurityMiddleware:
         # Post-process response
         self.process_response(request, response)
         
+        # Log API requests if enabled (after the view, so the route and status are known)
+        if getattr(settings, 'LOG_API_REQUESTS', False) and request.path.startswith('/api/'):
+            self.log_api_request(request, response)
+        
         return response
     
     def process_request(self, request):
@@ -54,10 +59,6 @@ class SecurityMiddleware:
                     status=429
                 )
             return HttpResponseForbidden('Access denied due to too many failed attempts.')
-        
-        # Log API requests if enabled
-        if getattr(settings, 'LOG_API_REQUESTS', False) and request.path.startswith('/api/'):
-            self.log_api_request(request)
     
     def process_response(self, request, response):
         """Process response for additional security"""
@@ -78,19 +79,28 @@ class SecurityMiddleware:
             ip = request.META.get('REMOTE_ADDR')
         return ip
     
-    def log_api_request(self, request):
-        """Log API requests for monitoring"""
+    def log_api_request(self, request, response):
+        """Log API requests for monitoring, sampling high-volume reads"""
+        match = getattr(request, 'resolver_match', None)
+        route = f'/{match.route}' if match and match.route else request.path
+        if not api_request_sampler.should_log(request.method, request.path, route, response.status_code):
+            return
+        
         user = request.user if hasattr(request, 'user') and request.user.is_authenticated else None
         
         AuditLog.log_action(
             user=user,
             action_type='other',
             description=f'API Request: {request.method} {request.path}',
+            # Sampled reads may be shed under load; mutations and security responses may not
+            droppable=not must_log(request.method, request.path, response.status_code),
             ip_address=request.client_ip,
             user_agent=request.META.get('HTTP_USER_AGENT', ''),
             additional_data={
                 'method': request.method,
                 'path': request.path,
+                'route': route,
+                'status_code': response.status_code,
                 'query_params': dict(request.GET),
                 'content_type': request.content_type,
             }
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+from apps.security import partitions
+
+
+def partition_tables(apps, schema_editor):
+    """Partition the security log tables by month on PostgreSQL"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in partitions.SECURITY_LOG_TABLES:
+        partitions.rebuild_table(schema_editor.connection, table, partitioned=True)
+
+
+def unpartition_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in partitions.SECURITY_LOG_TABLES:
+        partitions.rebuild_table(schema_editor.connection, table, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('security', '0002_audit_log_event_timestamp'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_tables, unpartition_tables),
+    ]
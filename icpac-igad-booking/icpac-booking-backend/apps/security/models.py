@@ -9,6 +9,8 @@ from django.core.validators import EmailValidator, RegexValidator
 from django.conf import settings
 import uuid
 
+from . import ratelimit
+
 User = get_user_model()
 
 
@@ -136,39 +138,27 @@ class LoginAttempt(models.Model):
     @classmethod
     def is_ip_blocked(cls, ip_address):
         """Check if IP address is currently blocked due to too many failed attempts"""
-        recent_time = timezone.now() - timezone.timedelta(minutes=settings.LOGIN_LOCKOUT_TIME // 60)
-        
-        failed_attempts = cls.objects.filter(
-            ip_address=ip_address,
-            timestamp__gte=recent_time,
-            attempt_type__startswith='failed'
-        ).count()
-        
-        return failed_attempts >= settings.LOGIN_ATTEMPT_LIMIT
+        return ratelimit.is_blocked('ip', ip_address)
     
     @classmethod
     def is_user_blocked(cls, email):
         """Check if user is currently blocked due to too many failed attempts"""
-        recent_time = timezone.now() - timezone.timedelta(minutes=settings.LOGIN_LOCKOUT_TIME // 60)
-        
-        failed_attempts = cls.objects.filter(
-            email__iexact=email,
-            timestamp__gte=recent_time,
-            attempt_type__startswith='failed'
-        ).count()
-        
-        return failed_attempts >= settings.LOGIN_ATTEMPT_LIMIT
+        return ratelimit.is_blocked('email', email.lower())
     
     @classmethod
     def record_attempt(cls, email, ip_address, user_agent, attempt_type, user=None):
-        """Record a login attempt"""
-        return cls.objects.create(
+        """Record a login attempt and count it against the IP and email if it failed"""
+        attempt = cls.objects.create(
             user=user,
             email=email,
             ip_address=ip_address,
             user_agent=user_agent,
             attempt_type=attempt_type
         )
+        if attempt_type.startswith('failed'):
+            ratelimit.record_failure('ip', ip_address)
+            ratelimit.record_failure('email', email.lower())
+        return attempt
 
 
 class AuditLog(models.Model):
@@ -261,7 +251,8 @@ class AuditLog(models.Model):
         help_text='Additional context data in JSON format'
     )
     
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the action happens, not when the queued entry is written
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         db_table = 'security_audit_logs'
@@ -280,9 +271,14 @@ class AuditLog(models.Model):
         return f"{user_info} - {self.get_action_type_display()} at {self.timestamp}"
     
     @classmethod
-    def log_action(cls, user, action_type, description, **kwargs):
-        """Helper method to log an action"""
-        return cls.objects.create(
+    def log_action(cls, user, action_type, description, droppable=False, **kwargs):
+        """
+        Helper method to log an action. With AUDIT_LOG_ASYNC the entry is
+        queued and written in the background instead of inside the request.
+        Only droppable entries are lost when the queue is full; others are
+        then written at once.
+        """
+        entry = cls(
             user=user,
             action_type=action_type,
             description=description,
@@ -292,6 +288,12 @@ class AuditLog(models.Model):
             user_agent=kwargs.get('user_agent', ''),
             additional_data=kwargs.get('additional_data', {})
         )
+        if getattr(settings, 'AUDIT_LOG_ASYNC', False):
+            from .audit import audit_queue
+            audit_queue.enqueue(entry, droppable=droppable)
+        else:
+            entry.save()
+        return entry
 
 
 class OTPToken(models.Model):
@@ -0,0 +1,321 @@
+"""
+Retention for the security log tables of ICPAC Booking System
+
+On PostgreSQL security_audit_logs and security_login_attempts are partitioned
+by calendar month (UTC) of their timestamp, so queries over recent days only
+scan recent partitions and old months are dropped whole. Partitions are named
+<table>_pYYYYMM; a <table>_default partition catches rows no month covers yet.
+
+Elsewhere (SQLite) the tables stay plain and old months are moved into a
+<table>_archive table instead. Either way archived months are written to
+gzipped NDJSON files under SECURITY_LOG_ARCHIVE_DIR first.
+"""
+import gzip
+import json
+import os
+import re
+from datetime import date, datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+PARTITION_KEY = 'timestamp'
+
+# Partitioned tables and their JSON columns (stored as text, decoded on export)
+SECURITY_LOG_TABLES = {
+    'security_audit_logs': ('additional_data',),
+    'security_login_attempts': (),
+}
+
+
+class ArchiveEncoder(DjangoJSONEncoder):
+    """JSON encoder falling back to str() for driver types such as inet"""
+
+    def default(self, o):
+        try:
+            return super().default(o)
+        except TypeError:
+            return str(o)
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bound(month):
+    """Start of a month as an aware UTC datetime"""
+    return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y%m}'
+
+
+def default_partition_name(table):
+    return f'{table}_default'
+
+
+def archive_table_name(table):
+    return f'{table}_archive'
+
+
+def partition_month(table, name):
+    """Month a partition of table holds, or None for other tables"""
+    match = re.fullmatch(re.escape(table) + r'_p(\d{4})(\d{2})', name)
+    return date(int(match[1]), int(match[2]), 1) if match else None
+
+
+def retention_months(table):
+    """Months of a table kept in the database, counting the current one"""
+    return getattr(settings, 'SECURITY_LOG_RETENTION_MONTHS', {}).get(table, 12)
+
+
+def archive_dir():
+    return Path(getattr(settings, 'SECURITY_LOG_ARCHIVE_DIR', 'archive'))
+
+
+def is_partitioned(connection, table):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table])
+        return cursor.fetchone() is not None
+
+
+def attached_partitions(connection, table):
+    """{month: partition name} of the monthly partitions attached to table"""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+        """, [table])
+        names = [row[0] for row in cursor.fetchall()]
+    return {partition_month(table, name): name for name in names if partition_month(table, name)}
+
+
+def detached_partitions(connection, table):
+    """{month: table name} of monthly partitions detached but not yet archived"""
+    attached = set(attached_partitions(connection, table).values())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relname FROM pg_class WHERE relkind = 'r' AND relname LIKE %s",
+            [f'{table}\\_p%']
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    return {
+        partition_month(table, name): name
+        for name in names if name not in attached and partition_month(table, name)
+    }
+
+
+def create_partition(connection, table, month):
+    """
+    Attach the partition for month, moving its rows out of the default
+    partition first (a new range must not overlap rows already there)
+    """
+    qn = connection.ops.quote_name
+    name = partition_name(table, month)
+    default = default_partition_name(table)
+    lower, upper = month_bound(month), month_bound(add_months(month, 1))
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE {qn(name)} (LIKE {qn(table)} INCLUDING DEFAULTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {qn(default)} WHERE {qn(PARTITION_KEY)} >= %s '
+            f'AND {qn(PARTITION_KEY)} < %s RETURNING *) INSERT INTO {qn(name)} SELECT * FROM moved',
+            [lower, upper]
+        )
+        cursor.execute(
+            f'ALTER TABLE {qn(table)} ATTACH PARTITION {qn(name)} FOR VALUES FROM (%s) TO (%s)',
+            [lower, upper]
+        )
+    return name
+
+
+def months_with_rows(connection, table):
+    """Months (UTC) holding at least one row of a table"""
+    qn = connection.ops.quote_name
+    key = qn(PARTITION_KEY)
+    if connection.vendor == 'postgresql':
+        month = f"date_trunc('month', {key} AT TIME ZONE 'UTC')::date"
+    else:
+        # SQLite stores UTC timestamps as ISO 8601 text
+        month = f"strftime('%%Y-%%m-01', {key})"
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT DISTINCT {month} FROM {qn(table)}', [])
+        return {
+            value if isinstance(value, date) else date.fromisoformat(value)
+            for value, in cursor.fetchall()
+        }
+
+
+def ensure_partitions(connection, table, months=None, months_ahead=None):
+    """
+    Create the monthly partitions for the current month, the months_ahead
+    following ones and the given months (by default, the months of the rows
+    sitting in the default partition)
+    """
+    if months_ahead is None:
+        months_ahead = getattr(settings, 'SECURITY_LOG_PARTITIONS_AHEAD', 3)
+    if months is None:
+        months = months_with_rows(connection, default_partition_name(table))
+    current = month_start(timezone.now())
+    wanted = set(months) | {add_months(current, ahead) for ahead in range(months_ahead + 1)}
+    existing = attached_partitions(connection, table)
+
+    return [
+        create_partition(connection, table, month)
+        for month in sorted(wanted) if month not in existing
+    ]
+
+
+def rebuild_table(connection, table, partitioned):
+    """
+    Recreate a PostgreSQL table as partitioned (or back as a plain table),
+    copying its rows, primary key, indexes, foreign keys and id sequence.
+    The primary key of a partitioned table has to include the partition key.
+    """
+    qn = connection.ops.quote_name
+    old = f'{table}_rebuild'
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'",
+            [table]
+        )
+        primary_key = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() "
+            "AND tablename = %s AND indexname <> %s",
+            [table, primary_key]
+        )
+        index_definitions = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [table]
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            "SELECT is_identity = 'YES', pg_get_serial_sequence(%s, 'id') FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = %s AND column_name = 'id'",
+            [table, table]
+        )
+        identity, sequence = cursor.fetchone()
+
+        cursor.execute(f'ALTER TABLE {qn(table)} RENAME TO {qn(old)}')
+        # Constraint and index names must be free for the new table
+        cursor.execute(f'ALTER TABLE {qn(old)} DROP CONSTRAINT {qn(primary_key)}')
+        for name, _ in foreign_keys:
+            cursor.execute(f'ALTER TABLE {qn(old)} DROP CONSTRAINT {qn(name)}')
+        for definition in index_definitions:
+            cursor.execute('DROP INDEX ' + re.match(r'CREATE (?:UNIQUE )?INDEX (\S+)', definition)[1])
+
+        if identity:
+            # An identity sequence belongs to its column; keep numbering in a plain sequence
+            cursor.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM {qn(old)}')
+            next_id = cursor.fetchone()[0]
+            cursor.execute(f'ALTER TABLE {qn(old)} ALTER COLUMN id DROP IDENTITY')
+            cursor.execute(f'CREATE SEQUENCE {sequence} AS bigint START WITH {next_id}')
+        elif sequence:
+            cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+
+        partition_clause = f' PARTITION BY RANGE ({qn(PARTITION_KEY)})' if partitioned else ''
+        cursor.execute(f'CREATE TABLE {qn(table)} (LIKE {qn(old)} INCLUDING DEFAULTS){partition_clause}')
+        if sequence:
+            cursor.execute(f"ALTER TABLE {qn(table)} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+
+        if partitioned:
+            cursor.execute(f'CREATE TABLE {qn(default_partition_name(table))} PARTITION OF {qn(table)} DEFAULT')
+            ensure_partitions(connection, table, months_with_rows(connection, old))
+
+        cursor.execute(f'INSERT INTO {qn(table)} SELECT * FROM {qn(old)}')
+        cursor.execute(f'DROP TABLE {qn(old)}')
+
+        key_columns = f'id, {qn(PARTITION_KEY)}' if partitioned else 'id'
+        cursor.execute(f'ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(primary_key)} PRIMARY KEY ({key_columns})')
+        for definition in index_definitions:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}')
+        if sequence:
+            cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {qn(table)}.id')
+
+
+def export_rows(connection, table, path, where='', params=()):
+    """Write the rows of a table to a gzipped NDJSON file; returns the row count"""
+    qn = connection.ops.quote_name
+    json_columns = SECURITY_LOG_TABLES.get(re.sub(r'(_p\d{6}|_archive)$', '', table), ())
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + '.part')
+    count = 0
+    with gzip.open(partial, 'wt', encoding='utf-8') as archive, connection.chunked_cursor() as cursor:
+        cursor.execute(f'SELECT * FROM {qn(table)} {where}', params)
+        rows = cursor.fetchmany(2000)
+        # Named (server-side) cursors only describe their columns after a fetch
+        columns = [column[0] for column in cursor.description]
+        while rows:
+            for row in rows:
+                record = dict(zip(columns, row))
+                for column in json_columns:
+                    if isinstance(record.get(column), str):
+                        record[column] = json.loads(record[column])
+                archive.write(json.dumps(record, cls=ArchiveEncoder) + '\n')
+                count += 1
+            rows = cursor.fetchmany(2000)
+    # Only complete archives get their final name
+    os.replace(partial, path)
+    return count
+
+
+def archive_partition(connection, table, name, month):
+    """Detach a monthly partition, write it to its archive file and drop it"""
+    qn = connection.ops.quote_name
+    if name in attached_partitions(connection, table).values():
+        # Detached in its own transaction, so inserts are not blocked during the export
+        with connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {qn(table)} DETACH PARTITION {qn(name)}')
+
+    count = export_rows(connection, name, archive_dir() / table / f'{name}.ndjson.gz')
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE {qn(name)}')
+    return count
+
+
+def archive_month(connection, table, month):
+    """Move one month of a plain table into its archive table and archive file"""
+    qn = connection.ops.quote_name
+    archive = archive_table_name(table)
+    key = qn(PARTITION_KEY)
+    where = f'WHERE {key} >= %s AND {key} < %s'
+    params = [
+        connection.ops.adapt_datetimefield_value(month_bound(month)),
+        connection.ops.adapt_datetimefield_value(month_bound(add_months(month, 1))),
+    ]
+
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            if archive not in connection.introspection.table_names(cursor):
+                cursor.execute(f'CREATE TABLE {qn(archive)} AS SELECT * FROM {qn(table)} WHERE 1 = 0')
+            cursor.execute(f'INSERT INTO {qn(archive)} SELECT * FROM {qn(table)} {where}', params)
+        count = export_rows(
+            connection, table, archive_dir() / table / f'{partition_name(table, month)}.ndjson.gz', where, params
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {qn(table)} {where}', params)
+    return count
+
+
+def expired_months(connection, table, cutoff):
+    """Months before cutoff that still hold rows in a plain table"""
+    return sorted(month for month in months_with_rows(connection, table) if month < cutoff)
@@ -0,0 +1,229 @@
+"""
+On-demand request profiling for ICPAC Booking System
+
+ProfilingMiddleware runs a request under a sampling profiler when an admin
+sends the PROFILING_HEADER header, or for a random PROFILING_SAMPLE_RATE
+share of requests. A background thread records the request thread's stack
+every PROFILING_INTERVAL_MS, and every SQL statement is timed. Each profile
+is written to PROFILING_DIR as two files sharing an id:
+
+- <id>.folded: collapsed stacks ("frame;frame;frame count"), the input of
+  flamegraph.pl and speedscope
+- <id>.json: the request, its response status and the SQL timeline
+
+Admins list and download them at /api/security/profiles/. With
+PROFILING_ENABLED off the middleware removes itself at startup, so it adds
+no work at all to requests.
+"""
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ID = re.compile(r'^\d{8}T\d{6}-[0-9a-f]{8}$')
+PROFILE_FILES = {'folded': '.folded', 'json': '.json'}
+MAX_SQL_LENGTH = 2000
+
+
+def profile_dir():
+    return Path(getattr(settings, 'PROFILING_DIR', Path(settings.BASE_DIR) / 'logs' / 'profiles'))
+
+
+def profile_path(profile_id, kind):
+    """File of a stored profile, or None for an unknown id or kind"""
+    if not PROFILE_ID.match(profile_id) or kind not in PROFILE_FILES:
+        return None
+    path = profile_dir() / f'{profile_id}{PROFILE_FILES[kind]}'
+    return path if path.is_file() else None
+
+
+def list_profiles():
+    """Metadata of the stored profiles, newest first, without the SQL timeline"""
+    profiles = []
+    for path in sorted(profile_dir().glob('*.json'), reverse=True):
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        data.pop('queries', None)
+        profiles.append(data)
+    return profiles
+
+
+def prune_profiles():
+    """Delete the oldest profiles beyond PROFILING_MAX_PROFILES"""
+    keep = getattr(settings, 'PROFILING_MAX_PROFILES', 200)
+    for path in sorted(profile_dir().glob('*.json'), reverse=True)[keep:]:
+        for suffix in PROFILE_FILES.values():
+            path.with_suffix(suffix).unlink(missing_ok=True)
+
+
+def frame_label(code):
+    """function (module path:line) with the interpreter and project prefixes removed"""
+    filename = code.co_filename
+    for prefix in (str(settings.BASE_DIR), *sorted(sys.path, key=len, reverse=True)):
+        if prefix and filename.startswith(prefix):
+            filename = filename[len(prefix):].lstrip('/\\')
+            break
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples the stack of one thread at a fixed interval, counting each
+    distinct stack below root_frame in collapsed form
+    """
+
+    def __init__(self, thread_id, root_frame, interval):
+        super().__init__(name='request-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.root_frame = root_frame
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None and frame is not self.root_frame:
+                labels.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            # A stack taken after stop() shows the profiler, not the request
+            if labels and not self.stopped.is_set():
+                self.stacks[';'.join(reversed(labels))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class SQLTimeline:
+    """execute_wrapper recording when each statement started and how long it ran"""
+
+    def __init__(self, started):
+        self.started = started
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            # Statements only: parameters can hold passwords and OTP codes
+            self.queries.append({
+                'start_ms': round((started - self.started) * 1000, 3),
+                'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+                'sql': sql[:MAX_SQL_LENGTH],
+                'many': many,
+                'database': context['connection'].alias,
+            })
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests that carry the admin header or fall in the sample.
+    Install it after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.header = 'HTTP_' + getattr(settings, 'PROFILING_HEADER', 'X-Profile').upper().replace('-', '_')
+
+    def __call__(self, request):
+        trigger = self.trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        started_at = timezone.now()
+        started = time.perf_counter()
+        timeline = SQLTimeline(started)
+        sampler = StackSampler(
+            threading.get_ident(),
+            sys._getframe(),
+            getattr(settings, 'PROFILING_INTERVAL_MS', 5) / 1000,
+        )
+        sampler.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timeline))
+                response = self.get_response(request)
+        finally:
+            sampler.stop()
+
+        duration = time.perf_counter() - started
+        try:
+            profile_id = self.save(request, response, trigger, started_at, duration, sampler, timeline)
+        except OSError:
+            logger.exception('Could not save the profile of %s %s', request.method, request.path)
+        else:
+            response['X-Profile-Id'] = profile_id
+        return response
+
+    def trigger(self, request):
+        """'header', 'sample' or None when the request is not profiled"""
+        if request.META.get(self.header) and self.is_admin(request):
+            return 'header'
+        rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        if rate and random.random() < rate:
+            return 'sample'
+        return None
+
+    def is_admin(self, request):
+        """Staff user of the session, or of the request's API token"""
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return user.is_staff
+        try:
+            authenticated = JWTAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        return authenticated is not None and authenticated[0].is_staff
+
+    def save(self, request, response, trigger, started_at, duration, sampler, timeline):
+        directory = profile_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        profile_id = f'{started_at:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}'
+
+        (directory / f'{profile_id}.folded').write_text(
+            ''.join(f'{stack} {count}\n' for stack, count in sampler.stacks.most_common())
+        )
+        match = getattr(request, 'resolver_match', None)
+        user = getattr(request, 'user', None)
+        (directory / f'{profile_id}.json').write_text(json.dumps({
+            'id': profile_id,
+            'method': request.method,
+            'path': request.path,
+            'route': f'/{match.route}' if match else None,
+            'status_code': response.status_code,
+            'user': user.email if user is not None and user.is_authenticated else None,
+            'trigger': trigger,
+            'started_at': started_at.isoformat(),
+            'duration_ms': round(duration * 1000, 3),
+            'interval_ms': sampler.interval * 1000,
+            'samples': sum(sampler.stacks.values()),
+            'query_count': len(timeline.queries),
+            'query_time_ms': round(sum(query['duration_ms'] for query in timeline.queries), 3),
+            'queries': timeline.queries,
+        }, indent=2))
+        prune_profiles()
+        return profile_id
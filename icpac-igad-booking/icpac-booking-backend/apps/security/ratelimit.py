@@ -0,0 +1,66 @@
+"""
+Failed login counters for ICPAC Booking System
+
+Failures are counted per IP address and per email in the cache, so checking
+whether a client is blocked costs one cache read instead of a COUNT over
+security_login_attempts. The LoginAttempt table stays the durable log.
+
+Counts use a sliding window approximated by two fixed buckets of
+LOGIN_LOCKOUT_TIME seconds: the current bucket plus the previous one,
+weighted by how much of it still overlaps the window.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+CACHE_PREFIX = 'login_failures'
+
+
+def get_cache():
+    return caches[getattr(settings, 'LOGIN_ATTEMPT_CACHE_ALIAS', 'default')]
+
+
+def window_seconds():
+    return settings.LOGIN_LOCKOUT_TIME
+
+
+def bucket_key(scope, value, bucket):
+    # Emails are user input: hash them into a key every backend accepts
+    digest = hashlib.md5(str(value).encode(), usedforsecurity=False).hexdigest()
+    return f'{CACHE_PREFIX}:{scope}:{digest}:{bucket}'
+
+
+def record_failure(scope, value, now=None):
+    """Count one failed attempt for an IP address or email"""
+    window = window_seconds()
+    bucket = int(now if now is not None else time.time()) // window
+    key = bucket_key(scope, value, bucket)
+
+    cache = get_cache()
+    # Each bucket is read for two windows: while current, then as the previous one
+    cache.add(key, 0, timeout=window * 2)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Expired between add() and incr()
+        cache.set(key, 1, timeout=window * 2)
+
+
+def failure_count(scope, value, now=None):
+    """Failed attempts for an IP address or email within the last window"""
+    window = window_seconds()
+    now = now if now is not None else time.time()
+    bucket = int(now) // window
+
+    current_key = bucket_key(scope, value, bucket)
+    previous_key = bucket_key(scope, value, bucket - 1)
+    counts = get_cache().get_many([current_key, previous_key])
+
+    elapsed = (now % window) / window
+    return counts.get(current_key, 0) + counts.get(previous_key, 0) * (1 - elapsed)
+
+
+def is_blocked(scope, value):
+    return failure_count(scope, value) >= settings.LOGIN_ATTEMPT_LIMIT
@@ -0,0 +1,112 @@
+"""
+API request audit sampling for ICPAC Booking System
+
+Decides which API requests SecurityMiddleware writes to the audit log:
+
+- mutations, auth/security endpoints and 401/403/429 responses are always logged
+- reads are logged at the rate of the first matching AUDIT_API_SAMPLE_RATES rule,
+  and at most AUDIT_API_MAX_SAMPLES_PER_INTERVAL times per route per interval,
+  so a polling burst lowers its own effective rate
+- every read is counted, and each AUDIT_API_SUMMARY_INTERVAL the counts are
+  written as one summary row per route, so sampled-out traffic stays visible
+"""
+import atexit
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from .audit import audit_queue  # noqa: F401 - registers its exit flush before ours
+
+MUTATING_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+SECURITY_STATUS_CODES = {401, 403, 429}
+
+
+def sample_rate(method, path):
+    """Configured share of reads of path logged individually"""
+    for rule_method, prefix, rate in getattr(settings, 'AUDIT_API_SAMPLE_RATES', []):
+        if rule_method in ('*', method) and path.startswith(prefix):
+            return rate
+    return getattr(settings, 'AUDIT_API_DEFAULT_SAMPLE_RATE', 1.0)
+
+
+def must_log(method, path, status_code):
+    """Requests that are logged whatever the sampling rates say"""
+    if method in MUTATING_METHODS or status_code in SECURITY_STATUS_CODES:
+        return True
+    return any(path.startswith(prefix) for prefix in getattr(settings, 'AUDIT_API_ALWAYS_LOG_PATHS', []))
+
+
+class ApiRequestSampler:
+    """
+    Per-process sampling state: request and logged counts per (method, route)
+    since the current summary interval started
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.period_start = timezone.now()
+        self.started = time.monotonic()
+        self.counts = {}
+
+    @property
+    def interval(self):
+        return getattr(settings, 'AUDIT_API_SUMMARY_INTERVAL', 300)
+
+    @property
+    def max_samples(self):
+        return getattr(settings, 'AUDIT_API_MAX_SAMPLES_PER_INTERVAL', 100)
+
+    def should_log(self, method, path, route, status_code):
+        """Count a request and decide whether it gets its own audit row"""
+        if must_log(method, path, status_code):
+            return True
+
+        rate = sample_rate(method, path)
+        with self.lock:
+            counts = self.counts.setdefault((method, route), {'requests': 0, 'logged': 0, 'rate': rate})
+            counts['requests'] += 1
+            selected = counts['logged'] < self.max_samples and random.random() < rate
+            if selected:
+                counts['logged'] += 1
+
+        if time.monotonic() - self.started >= self.interval:
+            self.flush()
+        return selected
+
+    def flush(self):
+        """Write one summary row per route seen since the last flush"""
+        from .models import AuditLog
+
+        with self.lock:
+            counts, self.counts = self.counts, {}
+            period_start, self.period_start = self.period_start, timezone.now()
+            self.started = time.monotonic()
+
+        for (method, route), route_counts in counts.items():
+            AuditLog.log_action(
+                user=None,
+                action_type='other',
+                description=(
+                    f"API Request summary: {method} {route} "
+                    f"({route_counts['requests']} requests, {route_counts['logged']} logged)"
+                ),
+                additional_data={
+                    'summary': True,
+                    'method': method,
+                    'route': route,
+                    'requests': route_counts['requests'],
+                    'logged': route_counts['logged'],
+                    'sample_rate': route_counts['rate'],
+                    'period_start': period_start.isoformat(),
+                    'period_end': self.period_start.isoformat(),
+                }
+            )
+
+
+api_request_sampler = ApiRequestSampler()
+
+# Registered after the audit queue's own flush, so it runs first at exit
+atexit.register(api_request_sampler.flush)
@@ -0,0 +1,455 @@
+import gzip
+import io
+import json
+import tempfile
+import threading
+import time
+from pathlib import Path
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.authentication.models import User
+from icpac_booking.querybudget import QueryBudgetTestMixin
+from . import partitions, profiling, ratelimit
+from .audit import AuditQueue
+from .sampling import ApiRequestSampler, must_log
+from .models import AllowedEmailDomain, AuditLog, LoginAttempt, OTPToken
+
+
+@override_settings(AUDIT_LOG_ASYNC=False, LOG_API_REQUESTS=False)
+class SecurityEndpointBudgetTests(QueryBudgetTestMixin, APITestCase):
+    """
+    Every security endpoint family stays within its query budget while
+    returning what it should
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='admin', email='admin@icpac.net', role='super_admin', is_staff=True)
+        cls.users = [
+            User.objects.create(username=f'user{n}', email=f'user{n}@icpac.net')
+            for n in range(3)
+        ]
+        AllowedEmailDomain.objects.create(domain='icpac.net')
+        AuditLog.objects.bulk_create([
+            AuditLog(user=cls.users[n % 3], action_type='other', description=f'Event {n}', timestamp=timezone.now())
+            for n in range(15)
+        ])
+
+    def setUp(self):
+        super().setUp()
+        caches['default'].clear()
+
+    def login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+    def test_otp(self):
+        self.login(self.users[0])
+        response = self.client.post('/api/security/otp/generate/', {'token_type': 'two_factor'})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertWithinBudget(response)
+        otp = OTPToken.objects.get(user=self.users[0], token_type='two_factor')
+        self.assertEqual(response.data['expires_at'], otp.expires_at)
+
+        response = self.client.post('/api/security/otp/verify/', {'token': otp.token, 'token_type': 'two_factor'})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertWithinBudget(response)
+        otp.refresh_from_db()
+        self.assertTrue(otp.is_used)
+        # A used token cannot be verified twice
+        response = self.client.post('/api/security/otp/verify/', {'token': otp.token, 'token_type': 'two_factor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_public_checks(self):
+        for email, allowed in (('someone@icpac.net', True), ('someone@example.com', False)):
+            response = self.client.post('/api/security/check-domain/', {'email': email})
+            self.assertEqual(response.status_code, 200)
+            self.assertWithinBudget(response)
+            self.assertEqual(response.data['allowed'], allowed)
+
+        response = self.client.post('/api/security/login-attempt/', {'email': self.users[1].email})
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        self.assertEqual(response.data, {'recorded': True, 'ip_blocked': False, 'user_blocked': False})
+        attempt = LoginAttempt.objects.get()
+        self.assertEqual((attempt.user, attempt.attempt_type), (self.users[1], 'failed_password'))
+
+    def test_audit_logs(self):
+        self.login(self.admin)
+        response = self.client.get('/api/security/audit-logs/')
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        newest_first = list(AuditLog.objects.order_by('-timestamp', '-id').values_list('description', flat=True))
+        self.assertEqual([log['description'] for log in response.data['results']], newest_first[:10])
+
+        response = self.client.get(response.data['next'])
+        self.assertWithinBudget(response)
+        self.assertEqual([log['description'] for log in response.data['results']], newest_first[10:])
+
+        response = self.client.get('/api/security/audit-logs/', {'page': 1, 'user_id': self.users[0].id})
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        self.assertEqual(response.data['count'], 5)
+
+        response = self.client.get('/api/security/audit-logs/queue/')
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        self.assertLessEqual({'queued', 'written', 'dropped', 'overflow', 'fallback'}, set(response.data))
+
+
+@override_settings(AUDIT_LOG_ASYNC=False, LOG_API_REQUESTS=False, PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0.0)
+class RequestProfilingTests(APITestCase):
+    """
+    Admins can profile a request with the profiling header and download it
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='admin', email='admin@icpac.net', role='super_admin', is_staff=True)
+        cls.user = User.objects.create(username='user', email='user@icpac.net')
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = self.settings(PROFILING_DIR=directory.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+    def test_admin_header_profiles_the_request(self):
+        self.login(self.admin)
+        response = self.client.get('/api/security/audit-logs/', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+
+        profiles = self.client.get('/api/security/profiles/').data
+        self.assertEqual([profile['id'] for profile in profiles], [profile_id])
+        self.assertEqual(profiles[0]['route'], '/api/security/audit-logs/')
+        self.assertEqual(profiles[0]['trigger'], 'header')
+
+        self.assertNotIn('queries', profiles[0])
+        self.assertEqual((profiles[0]['method'], profiles[0]['status_code']), ('GET', 200))
+        self.assertEqual(profiles[0]['user'], self.admin.email)
+
+        response = self.client.get(f'/api/security/profiles/{profile_id}/json/')
+        self.assertEqual(response.status_code, 200)
+        timeline = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(timeline['query_count'], len(timeline['queries']))
+        # The SQL timeline is in execution order and includes the page query
+        starts = [query['start_ms'] for query in timeline['queries']]
+        self.assertEqual(starts, sorted(starts))
+        self.assertTrue(any('"security_audit_logs"' in query['sql'] for query in timeline['queries']))
+
+        response = self.client.get(f'/api/security/profiles/{profile_id}/folded/')
+        self.assertEqual(response.status_code, 200)
+        for line in b''.join(response.streaming_content).decode().splitlines():
+            self.assertRegex(line, r'^\S.* \d+$')
+        self.assertEqual(self.client.get('/api/security/profiles/20300101T000000-0000000g/json/').status_code, 404)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_MAX_PROFILES=2)
+    def test_sampled_profiles_are_pruned_and_hold_no_parameters(self):
+        for _ in range(3):
+            response = self.client.post('/api/security/login-attempt/', {'email': 'secret-address@icpac.net'})
+            self.assertIn('X-Profile-Id', response)
+
+        self.login(self.admin)
+        with override_settings(PROFILING_SAMPLE_RATE=0.0):
+            profiles = self.client.get('/api/security/profiles/').data
+        self.assertEqual(len(profiles), 2)
+        self.assertEqual({profile['trigger'] for profile in profiles}, {'sample'})
+        self.assertIsNone(profiles[0]['user'])
+        # Statements are stored without their parameters
+        timeline = (profiling.profile_dir() / f'{profiles[0]["id"]}.json').read_text()
+        self.assertNotIn('secret-address', timeline)
+
+    def test_sampler_counts_the_stacks_of_its_thread(self):
+        release = threading.Event()
+
+        def busy_request():
+            release.wait(5)
+
+        worker = threading.Thread(target=busy_request)
+        worker.start()
+        sampler = profiling.StackSampler(worker.ident, None, 0.001)
+        sampler.start()
+        time.sleep(0.05)
+        sampler.stop()
+        release.set()
+        worker.join()
+
+        self.assertTrue(sampler.stacks)
+        self.assertTrue(all('busy_request (' in stack for stack in sampler.stacks))
+
+    def test_header_is_ignored_for_other_users(self):
+        self.login(self.user)
+        response = self.client.get('/api/auth/profile/', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self.client.get('/api/security/profiles/').status_code, 403)
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled_profiler_ignores_the_header(self):
+        self.login(self.admin)
+        response = self.client.get('/api/security/audit-logs/', HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self.client.get('/api/security/profiles/').data, [])
+
+
+@override_settings(AUDIT_LOG_ASYNC=False, LOGIN_LOCKOUT_TIME=600, LOGIN_ATTEMPT_LIMIT=3)
+class LoginRateLimitTests(TestCase):
+    """Failed logins are counted per IP and email over a sliding window"""
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_previous_bucket_fades_over_the_window(self):
+        start = 600 * 1000
+        for _ in range(4):
+            ratelimit.record_failure('ip', '10.0.0.1', now=start + 500)
+
+        self.assertEqual(ratelimit.failure_count('ip', '10.0.0.1', now=start + 599), 4)
+        # A quarter into the next bucket, three quarters of the old one still count
+        self.assertEqual(ratelimit.failure_count('ip', '10.0.0.1', now=start + 750), 3)
+        ratelimit.record_failure('ip', '10.0.0.1', now=start + 750)
+        self.assertEqual(ratelimit.failure_count('ip', '10.0.0.1', now=start + 750), 4)
+        self.assertEqual(ratelimit.failure_count('ip', '10.0.0.1', now=start + 1200), 1)
+        self.assertEqual(ratelimit.failure_count('ip', '10.0.0.1', now=start + 1800), 0)
+
+    def test_failures_lock_out_the_ip_and_email(self):
+        for _ in range(2):
+            LoginAttempt.record_attempt('User@icpac.net', '10.0.0.1', 'tests', 'failed_password')
+        LoginAttempt.record_attempt('user@icpac.net', '10.0.0.1', 'tests', 'success')
+        self.assertFalse(LoginAttempt.is_ip_blocked('10.0.0.1'))
+
+        LoginAttempt.record_attempt('user@icpac.net', '10.0.0.1', 'tests', 'failed_otp')
+        self.assertTrue(LoginAttempt.is_ip_blocked('10.0.0.1'))
+        self.assertTrue(LoginAttempt.is_user_blocked('USER@icpac.net'))
+        self.assertFalse(LoginAttempt.is_ip_blocked('10.0.0.2'))
+        self.assertFalse(LoginAttempt.is_user_blocked('other@icpac.net'))
+        self.assertEqual(LoginAttempt.objects.count(), 4)
+
+    def test_checks_cost_no_queries(self):
+        with self.assertNumQueries(0):
+            LoginAttempt.is_ip_blocked('10.0.0.1')
+            LoginAttempt.is_user_blocked('user@icpac.net')
+
+
+@override_settings(AUDIT_LOG_ASYNC=True, AUDIT_LOG_BATCH_SIZE=3, AUDIT_LOG_QUEUE_SIZE=10)
+class AuditQueueTests(TestCase):
+    """Queued audit entries are written in batches, or to the fallback file"""
+
+    def setUp(self):
+        # The writer thread is driven by hand through flush()
+        patcher = mock.patch.object(AuditQueue, 'start')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.queue = AuditQueue()
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.fallback = Path(directory.name) / 'audit-fallback.jsonl'
+        overrides = self.settings(AUDIT_LOG_FALLBACK_FILE=str(self.fallback))
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def entries(self, count):
+        return [
+            AuditLog(action_type='other', description=f'Event {n}', timestamp=timezone.now(), additional_data={'n': n})
+            for n in range(count)
+        ]
+
+    def test_flush_writes_in_batches(self):
+        for entry in self.entries(7):
+            self.assertTrue(self.queue.enqueue(entry))
+            # A full batch wakes the writer early
+            self.assertEqual(self.queue.wakeup.is_set(), self.queue.events.qsize() >= 3)
+
+        with mock.patch('apps.security.audit.close_old_connections'):
+            with self.assertNumQueries(3):
+                self.queue.flush()
+        self.assertEqual(AuditLog.objects.count(), 7)
+        self.assertEqual(self.queue.stats()['written'], 7)
+        self.assertEqual(self.queue.stats()['queued'], 0)
+
+    def test_rejected_batches_go_to_the_fallback_file_and_replay(self):
+        for entry in self.entries(4):
+            self.queue.enqueue(entry)
+        with mock.patch('apps.security.audit.close_old_connections'), \
+                mock.patch.object(AuditLog.objects, 'bulk_create', side_effect=DatabaseError('database is down')), \
+                self.assertLogs('apps.security.audit', 'ERROR'):
+            self.queue.flush()
+
+        records = [json.loads(line) for line in self.fallback.read_text().splitlines()]
+        self.assertEqual([record['description'] for record in records], [f'Event {n}' for n in range(4)])
+        self.assertEqual(records[3]['additional_data'], {'n': 3})
+        self.assertEqual(self.queue.stats()['fallback'], 4)
+        self.assertFalse(AuditLog.objects.exists())
+
+        call_command('replay_audit_fallback', stdout=io.StringIO())
+        self.assertEqual(AuditLog.objects.filter(description__startswith='Event').count(), 4)
+        self.assertFalse(self.fallback.exists())
+
+    @override_settings(AUDIT_LOG_QUEUE_SIZE=2)
+    def test_full_queue_sheds_only_droppable_entries(self):
+        queue = AuditQueue()
+        for entry in self.entries(2):
+            self.assertTrue(queue.enqueue(entry))
+
+        sampled, violation = self.entries(2)
+        self.assertFalse(queue.enqueue(sampled, droppable=True))
+        self.assertTrue(queue.enqueue(violation))
+        self.assertEqual(list(AuditLog.objects.values_list('description', flat=True)), ['Event 1'])
+        stats = queue.stats()
+        self.assertEqual((stats['dropped'], stats['overflow'], stats['queued']), (1, 1, 2))
+
+        with mock.patch('apps.security.audit.audit_queue', queue):
+            AuditLog.log_action(None, 'security_violation', 'Blocked request')
+            AuditLog.log_action(None, 'other', 'API Request: GET /api/rooms/', droppable=True)
+        self.assertTrue(AuditLog.objects.filter(action_type='security_violation').exists())
+        self.assertFalse(AuditLog.objects.filter(description__startswith='API Request').exists())
+
+
+@override_settings(
+    AUDIT_LOG_ASYNC=False,
+    AUDIT_API_ALWAYS_LOG_PATHS=['/api/security/'],
+    AUDIT_API_SAMPLE_RATES=[('GET', '/api/rooms/', 0.0), ('*', '/api/', 1.0)],
+    AUDIT_API_MAX_SAMPLES_PER_INTERVAL=2,
+    AUDIT_API_SUMMARY_INTERVAL=300,
+)
+class ApiRequestSamplingTests(TestCase):
+    """Reads are sampled per route and summarized; mutations and security events always logged"""
+
+    def setUp(self):
+        self.sampler = ApiRequestSampler()
+
+    def test_must_log(self):
+        self.assertTrue(must_log('POST', '/api/bookings/', 201))
+        self.assertTrue(must_log('GET', '/api/rooms/', 403))
+        self.assertTrue(must_log('GET', '/api/security/audit-logs/', 200))
+        self.assertFalse(must_log('GET', '/api/rooms/', 200))
+
+    def test_reads_are_sampled_and_capped_per_route(self):
+        decisions = [self.sampler.should_log('GET', '/api/bookings/1/', '/api/bookings/<int:pk>/', 200) for _ in range(5)]
+        self.assertEqual(decisions, [True, True, False, False, False])
+        self.assertFalse(self.sampler.should_log('GET', '/api/rooms/', '/api/rooms/', 200))
+        self.assertTrue(self.sampler.should_log('DELETE', '/api/rooms/1/', '/api/rooms/<int:pk>/', 204))
+
+    def test_summaries_count_every_read(self):
+        for _ in range(3):
+            self.sampler.should_log('GET', '/api/bookings/1/', '/api/bookings/<int:pk>/', 200)
+            self.sampler.should_log('GET', '/api/rooms/', '/api/rooms/', 200)
+        self.sampler.flush()
+
+        summaries = {
+            entry['route']: entry
+            for entry in AuditLog.objects.filter(additional_data__summary=True).values_list('additional_data', flat=True)
+        }
+        self.assertEqual(
+            {route: (summary['requests'], summary['logged']) for route, summary in summaries.items()},
+            {'/api/bookings/<int:pk>/': (3, 2), '/api/rooms/': (3, 0)}
+        )
+        self.assertEqual(summaries['/api/rooms/']['sample_rate'], 0.0)
+
+        # Counts restart with each interval
+        self.sampler.flush()
+        self.assertEqual(AuditLog.objects.filter(additional_data__summary=True).count(), 2)
+
+    @override_settings(LOG_API_REQUESTS=True)
+    def test_middleware_logs_sampled_requests(self):
+        with mock.patch('apps.security.middleware.api_request_sampler', self.sampler):
+            for _ in range(2):
+                self.client.get('/api/rooms/')
+            self.client.post('/api/security/check-domain/', {'email': 'someone@icpac.net'})
+        self.assertEqual(
+            list(AuditLog.objects.values_list('description', flat=True)), ['API Request: POST /api/security/check-domain/']
+        )
+
+
+@override_settings(
+    AUDIT_LOG_ASYNC=False,
+    SECURITY_LOG_RETENTION_MONTHS={'security_audit_logs': 12, 'security_login_attempts': 3},
+)
+class SecurityLogArchiveTests(TestCase):
+    """Months past retention move to the archive table and a gzipped NDJSON file"""
+
+    def setUp(self):
+        if partitions.is_partitioned(connection, 'security_audit_logs'):
+            self.skipTest('Partitioned tables are archived a whole partition at a time')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.archive_dir = Path(directory.name)
+        overrides = self.settings(SECURITY_LOG_ARCHIVE_DIR=str(self.archive_dir))
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        self.current = partitions.month_start(timezone.now())
+        self.months = {ago: partitions.add_months(self.current, -ago) for ago in (0, 2, 3, 13)}
+        for ago, month in self.months.items():
+            timestamp = partitions.month_bound(month) + timedelta(days=10)
+            AuditLog.objects.create(
+                action_type='other', description=f'{ago} months ago', timestamp=timestamp,
+                additional_data={'ago': ago}
+            )
+            attempt = LoginAttempt.objects.create(
+                email=f'{ago}@icpac.net', ip_address='10.0.0.1', attempt_type='success'
+            )
+            LoginAttempt.objects.filter(pk=attempt.pk).update(timestamp=timestamp)
+
+    def archived_rows(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT email FROM {connection.ops.quote_name(table)} ORDER BY email')
+            return [row[0] for row in cursor.fetchall()]
+
+    def read_archive(self, table, month):
+        path = self.archive_dir / table / f'{partitions.partition_name(table, month)}.ndjson.gz'
+        with gzip.open(path, 'rt', encoding='utf-8') as archive:
+            return [json.loads(line) for line in archive]
+
+    def test_dry_run_moves_nothing(self):
+        output = io.StringIO()
+        call_command('archive_security_logs', '--dry-run', stdout=output)
+
+        self.assertIn(f'Would archive security_audit_logs rows from {self.months[13]:%Y-%m}', output.getvalue())
+        self.assertIn(f'Would archive security_login_attempts rows from {self.months[3]:%Y-%m}', output.getvalue())
+        self.assertEqual(AuditLog.objects.count(), 4)
+        self.assertEqual(LoginAttempt.objects.count(), 4)
+        self.assertFalse(any(self.archive_dir.iterdir()))
+
+    def test_expired_months_are_archived(self):
+        call_command('archive_security_logs', stdout=io.StringIO())
+
+        self.assertCountEqual(
+            AuditLog.objects.values_list('description', flat=True),
+            ['0 months ago', '2 months ago', '3 months ago']
+        )
+        self.assertCountEqual(LoginAttempt.objects.values_list('email', flat=True), ['0@icpac.net', '2@icpac.net'])
+        self.assertEqual(self.archived_rows('security_login_attempts_archive'), ['13@icpac.net', '3@icpac.net'])
+
+        [record] = self.read_archive('security_audit_logs', self.months[13])
+        self.assertEqual(record['description'], '13 months ago')
+        self.assertEqual(record['additional_data'], {'ago': 13})
+        emails = [
+            record['email'] for month in (self.months[13], self.months[3])
+            for record in self.read_archive('security_login_attempts', month)
+        ]
+        self.assertEqual(emails, ['13@icpac.net', '3@icpac.net'])
+        self.assertEqual(
+            sorted(path.name for path in (self.archive_dir / 'security_login_attempts').iterdir()),
+            sorted(f'{partitions.partition_name("security_login_attempts", month)}.ndjson.gz'
+                   for month in (self.months[13], self.months[3]))
+        )
+
+        # A second run finds nothing left to move
+        call_command('archive_security_logs', '--table', 'security_login_attempts', stdout=io.StringIO())
+        self.assertEqual(self.archived_rows('security_login_attempts_archive'), ['13@icpac.net', '3@icpac.net'])
@@ -17,4 +17,9 @@ urlpatterns = [
     
     # Audit log endpoints (admin only)
     path('audit-logs/', views.AuditLogListView.as_view(), name='audit_logs'),
+    path('audit-logs/queue/', views.AuditQueueStatsView.as_view(), name='audit_queue_stats'),
+    
+    # Request profiles (admin only)
+    path('profiles/', views.ProfileListView.as_view(), name='profiles'),
+    path('profiles/<str:profile_id>/<str:kind>/', views.ProfileDownloadView.as_view(), name='profile_download'),
 ]
\ No newline at end of file
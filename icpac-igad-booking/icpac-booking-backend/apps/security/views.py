@@ -2,19 +2,25 @@
 Security API views for ICPAC Booking System
 """
 import logging
+from datetime import datetime, timedelta
 
 from rest_framework import status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.generics import ListAPIView
+from rest_framework.exceptions import NotFound, ValidationError
 from django.contrib.auth import get_user_model
+from django.http import FileResponse
 from django.utils import timezone
 from django.conf import settings
 from django.core.mail import send_mail
 
+from .audit import audit_queue
 from .models import AllowedEmailDomain, LoginAttempt, AuditLog, OTPToken
+from .profiling import list_profiles, profile_path
 from .serializers import OTPTokenSerializer, AuditLogSerializer
+from icpac_booking.pagination import KeysetOrPageNumberPagination
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -25,6 +31,7 @@ class GenerateOTPView(APIView):
     Generate OTP for user authentication
     """
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 3
     
     def post(self, request):
         user = request.user
@@ -96,6 +103,7 @@ class VerifyOTPView(APIView):
     Verify OTP token
     """
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 5
     
     def post(self, request):
         user = request.user
@@ -154,6 +162,7 @@ class CheckDomainView(APIView):
     Check if email domain is allowed for registration
     """
     permission_classes = [permissions.AllowAny]
+    query_budget = 1
     
     def post(self, request):
         email = request.data.get('email')
@@ -164,8 +173,9 @@ class CheckDomainView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        is_allowed = AllowedEmailDomain.is_domain_allowed(email)
+        # One lookup answers both questions
         domain_info = AllowedEmailDomain.get_domain_info(email)
+        is_allowed = domain_info is not None
         
         return Response({
             'allowed': is_allowed,
@@ -179,6 +189,7 @@ class RecordLoginAttemptView(APIView):
     Record login attempts for security monitoring
     """
     permission_classes = [permissions.AllowAny]
+    query_budget = 2
     
     def post(self, request):
         email = request.data.get('email')
@@ -219,13 +230,27 @@ class RecordLoginAttemptView(APIView):
         })
 
 
+class AuditQueueStatsView(APIView):
+    """
+    Counters of the background audit log writer (admin only)
+    """
+    permission_classes = [permissions.IsAdminUser]
+    query_budget = 1
+    
+    def get(self, request):
+        return Response(audit_queue.stats())
+
+
 class AuditLogListView(ListAPIView):
     """
     List audit logs (admin only)
     """
-    queryset = AuditLog.objects.all()
+    queryset = AuditLog.objects.select_related('user')
     serializer_class = AuditLogSerializer
     permission_classes = [permissions.IsAdminUser]
+    pagination_class = KeysetOrPageNumberPagination
+    keyset_ordering = ('-timestamp', '-id')
+    query_budget = 3
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -240,12 +265,43 @@ class AuditLogListView(ListAPIView):
         if action_type:
             queryset = queryset.filter(action_type=action_type)
         
-        # Filter by date range if specified
+        # Filter by date range if specified. Compare the timestamp itself (not
+        # its date) so PostgreSQL only scans the monthly partitions in range.
         start_date = self.request.query_params.get('start_date')
         end_date = self.request.query_params.get('end_date')
-        if start_date:
-            queryset = queryset.filter(timestamp__date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(timestamp__date__lte=end_date)
+        try:
+            if start_date:
+                start = datetime.strptime(start_date, '%Y-%m-%d')
+                queryset = queryset.filter(timestamp__gte=timezone.make_aware(start))
+            if end_date:
+                end = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
+                queryset = queryset.filter(timestamp__lt=timezone.make_aware(end))
+        except ValueError:
+            raise ValidationError({'error': 'Dates must use the YYYY-MM-DD format.'})
         
         return queryset
+
+
+class ProfileListView(APIView):
+    """
+    Stored request profiles, newest first (admin only)
+    """
+    permission_classes = [permissions.IsAdminUser]
+    query_budget = 1
+    
+    def get(self, request):
+        return Response(list_profiles())
+
+
+class ProfileDownloadView(APIView):
+    """
+    Download a profile's collapsed stacks (folded) or SQL timeline (json) (admin only)
+    """
+    permission_classes = [permissions.IsAdminUser]
+    query_budget = 1
+    
+    def get(self, request, profile_id, kind):
+        path = profile_path(profile_id, kind)
+        if path is None:
+            raise NotFound('Profile not found.')
+        return FileResponse(path.open('rb'), as_attachment=True, filename=path.name)
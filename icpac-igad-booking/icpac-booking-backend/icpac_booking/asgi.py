@@ -11,7 +11,6 @@ import os
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 from django.core.asgi import get_asgi_application
-from apps.bookings.routing import websocket_urlpatterns
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'icpac_booking.settings')
 
@@ -19,6 +18,8 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'icpac_booking.settings')
 # is populated before importing code that may import ORM models.
 django_asgi_app = get_asgi_application()
 
+from apps.bookings.routing import websocket_urlpatterns  # noqa: E402
+
 application = ProtocolTypeRouter({
     # Django's ASGI application to handle traditional HTTP requests
     "http": django_asgi_app,
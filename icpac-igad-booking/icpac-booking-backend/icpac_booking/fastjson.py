@@ -0,0 +1,91 @@
+"""
+Fast JSON encoding for ICPAC Booking System
+
+The REST API renders and parses JSON with orjson when it is installed, and
+the WebSocket consumers encode their frames with dumps(). orjson handles
+datetimes, dates, times and UUIDs natively; anything else goes through the
+same default() as DRF's encoder (Decimal as float, lazy strings, querysets),
+so responses match the stdlib renderer's compact output (except NaN, which
+it refuses and orjson writes as null). Without orjson, or for output orjson
+cannot produce (indented JSON, ensure_ascii, integers beyond 64 bits),
+everything falls back to the stdlib json module.
+
+orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch
+decode errors the same way on either path.
+"""
+import json
+
+from django.conf import settings
+from rest_framework import parsers, renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# 'Z' for UTC like DRF's encoder; int keys become strings like the stdlib's
+OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+encoder = JSONEncoder()
+
+
+def default(obj):
+    """Types orjson does not encode itself, converted as DRF's encoder does"""
+    return encoder.default(obj)
+
+
+def dumps(data):
+    """Compact JSON text of data"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, default=default, option=OPTIONS).decode()
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def loads(data):
+    """Parse JSON text or bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """DRF's JSONRenderer, encoding compact responses with orjson"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=default, option=OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Escaped like the stdlib renderer, keeping the JSON a strict JavaScript subset
+        for raw, escaped in LINE_SEPARATORS:
+            if raw in ret:
+                ret = ret.replace(raw, escaped)
+        return ret
+
+
+class JSONParser(parsers.JSONParser):
+    """DRF's JSONParser, decoding UTF-8 request bodies with orjson"""
+    renderer_class = JSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        # orjson only reads UTF-8, and always rejects NaN and Infinity as strict mode does
+        if orjson is None or not self.strict or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
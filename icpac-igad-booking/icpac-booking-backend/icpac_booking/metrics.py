@@ -0,0 +1,355 @@
+"""
+Prometheus metrics for ICPAC Booking System
+
+A small in-process registry of counters, gauges and histograms, rendered in
+the Prometheus text format at /metrics. Recording a sample is a dict update
+under a lock, so it is cheap enough to run on every request and no external
+service or client library is needed.
+
+MetricsMiddleware records per-route request counts and latency and the SQL
+query count and time of each request. The availability cache, the audit
+queue and the WebSocket consumers report through the metrics defined below.
+
+Under gunicorn every worker keeps its own registry. When METRICS_DIR is set,
+each process also writes a snapshot there (at most every
+METRICS_SNAPSHOT_INTERVAL seconds) and /metrics adds up the snapshots of all
+workers. Gauges of workers that have exited are dropped; their counters and
+histograms are kept, so totals never go backwards.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+REGISTRY = []
+
+
+class Metric:
+    """
+    Base of the metric types. collect, if given, is called at scrape time and
+    its result becomes the metric's (unlabelled) value.
+    """
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        self.lock = threading.Lock()
+        self.values = {}
+        REGISTRY.append(self)
+
+    def key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self):
+        """{label values: value} copy that is safe to serialise"""
+        if self.collect is not None:
+            try:
+                value = self.collect()
+            except Exception:
+                logger.exception('Could not collect %s', self.name)
+            else:
+                with self.lock:
+                    self.values[()] = value
+        with self.lock:
+            return {key: self.copy(value) for key, value in self.values.items()}
+
+    def copy(self, value):
+        return value
+
+    def merge(self, total, value):
+        return total + value
+
+    def samples(self, key, value):
+        yield self.name, key, value
+
+    def sample_labelnames(self, sample_name):
+        return self.labelnames
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                # One count per bucket, then the sum and the total count
+                counts = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def copy(self, value):
+        return list(value)
+
+    def merge(self, total, value):
+        return [a + b for a, b in zip(total, value)]
+
+    def samples(self, key, value):
+        for bound, count in zip(self.buckets, value):
+            yield f'{self.name}_bucket', key + (format_value(bound),), count
+        yield f'{self.name}_bucket', key + ('+Inf',), value[-1]
+        yield f'{self.name}_sum', key, value[-2]
+        yield f'{self.name}_count', key, value[-1]
+
+    def sample_labelnames(self, sample_name):
+        return self.labelnames + ('le',) if sample_name.endswith('_bucket') else self.labelnames
+
+
+http_requests = Counter(
+    'icpac_http_requests_total', 'HTTP requests by route, method and status code',
+    ['method', 'route', 'status'],
+)
+http_latency = Histogram(
+    'icpac_http_request_duration_seconds', 'Time to produce an HTTP response',
+    ['method', 'route'],
+)
+db_queries = Histogram(
+    'icpac_http_request_db_queries', 'SQL queries run by one HTTP request',
+    ['method', 'route'], buckets=QUERY_COUNT_BUCKETS,
+)
+db_time = Histogram(
+    'icpac_http_request_db_seconds', 'Time one HTTP request spent in the database',
+    ['method', 'route'],
+)
+cache_requests = Counter(
+    'icpac_cache_requests_total', 'Application cache lookups by cache and result (hit, miss or bypass)',
+    ['cache', 'result'],
+)
+audit_queue_depth = Gauge(
+    'icpac_audit_queue_depth', 'Audit log entries waiting to be written',
+    collect=lambda: audit_queue_stats()['queued'],
+)
+audit_dropped = Counter(
+    'icpac_audit_entries_dropped_total', 'Audit log entries dropped because the queue was full',
+    collect=lambda: audit_queue_stats()['dropped'],
+)
+websocket_connections = Gauge(
+    'icpac_websocket_connections', 'Open WebSocket connections by consumer',
+    ['consumer'],
+)
+channel_layer_latency = Histogram(
+    'icpac_channel_layer_seconds', 'Channel layer call latency by operation and consumer',
+    ['operation', 'consumer'],
+)
+
+
+def audit_queue_stats():
+    from apps.security.audit import audit_queue
+    return audit_queue.stats()
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return f'{value:.1f}'
+    return repr(value)
+
+
+def escape(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def render(values):
+    """Prometheus text format for {metric name: {label values: value}}"""
+    lines = []
+    for metric in REGISTRY:
+        series = values.get(metric.name, {})
+        lines.append(f'# HELP {metric.name} {escape(metric.documentation)}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for key in sorted(series):
+            for sample_name, sample_key, value in metric.samples(key, series[key]):
+                labels = ','.join(
+                    f'{name}="{escape(label)}"'
+                    for name, label in zip(metric.sample_labelnames(sample_name), sample_key)
+                )
+                lines.append(f'{sample_name}{{{labels}}} {format_value(value)}' if labels
+                             else f'{sample_name} {format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def snapshot():
+    """Values of every metric in this process"""
+    return {metric.name: metric.snapshot() for metric in REGISTRY}
+
+
+def snapshot_dir():
+    directory = getattr(settings, 'METRICS_DIR', '')
+    return Path(directory) if directory else None
+
+
+_last_export = 0.0
+
+
+def export_snapshot(force=False):
+    """Write this process's values to METRICS_DIR, at most once per interval"""
+    global _last_export
+    directory = snapshot_dir()
+    now = time.monotonic()
+    if directory is None or (not force and now - _last_export < getattr(settings, 'METRICS_SNAPSHOT_INTERVAL', 5)):
+        return
+    _last_export = now
+
+    data = {
+        name: [[list(key), value] for key, value in series.items()]
+        for name, series in snapshot().items()
+    }
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'{os.getpid()}.json'
+    temporary = path.with_suffix('.tmp')
+    temporary.write_text(json.dumps(data))
+    os.replace(temporary, path)
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect():
+    """Values of every metric, added up over all processes sharing METRICS_DIR"""
+    values = snapshot()
+    directory = snapshot_dir()
+    if directory is None or not directory.is_dir():
+        return values
+
+    metrics = {metric.name: metric for metric in REGISTRY}
+    for path in directory.glob('*.json'):
+        pid = int(path.stem) if path.stem.isdigit() else None
+        if pid is None or pid == os.getpid():
+            continue
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        alive = process_alive(pid)
+        for name, series in data.items():
+            metric = metrics.get(name)
+            if metric is None or (metric.type == 'gauge' and not alive):
+                continue
+            totals = values.setdefault(name, {})
+            for key, value in series:
+                key = tuple(key)
+                totals[key] = metric.merge(totals[key], value) if key in totals else value
+    return values
+
+
+class DatabaseTimer:
+    """Counts the queries and database time of one request on every connection"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """
+    Records latency, status and database work per route. Install it first in
+    MIDDLEWARE, so the latency covers the whole middleware stack.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            return self.get_response(request)
+
+        timer = DatabaseTimer()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        # Routes, not paths, keep the label set small
+        route = '/' + match.route if match else '<unmatched>'
+        http_requests.inc(method=request.method, route=route, status=response.status_code)
+        http_latency.observe(elapsed, method=request.method, route=route)
+        db_queries.observe(timer.count, method=request.method, route=route)
+        db_time.observe(timer.duration, method=request.method, route=route)
+        export_snapshot()
+        return response
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, limited to METRICS_ALLOWED_IPS"""
+    if not getattr(settings, 'METRICS_ENABLED', True):
+        return HttpResponseNotFound()
+    # REMOTE_ADDR, not X-Forwarded-For, which any client can set
+    if request.META.get('REMOTE_ADDR') not in getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1', '::1']):
+        return HttpResponseForbidden('Metrics are not available from this address.')
+    export_snapshot(force=True)
+    return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
@@ -0,0 +1,183 @@
+"""
+Custom pagination for ICPAC Booking System
+
+KeysetPagination pages through a list by remembering the (sort key, id) of
+the last row served instead of an OFFSET, and never counts the table, so
+page 10,000 of the audit history costs the same as page 1. List views that
+use KeysetOrPageNumberPagination keep the page-number format (with count)
+for clients that ask for it with ?page=, such as the admin UI.
+"""
+import base64
+import binascii
+import json
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+Cursor = namedtuple('Cursor', ['value', 'pk', 'reverse'])
+
+
+def max_page_size():
+    """Largest page a client may ask for with ?page_size="""
+    return getattr(settings, 'API_MAX_PAGE_SIZE', 100)
+
+
+class CappedPageNumberPagination(PageNumberPagination):
+    """Page-number pagination with an opt-in, capped ?page_size="""
+    page_size_query_param = 'page_size'
+
+    @property
+    def max_page_size(self):
+        return max_page_size()
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on a (sort field, primary key) pair. Views choose the
+    pair with a keyset_ordering attribute such as ('-created_at', '-id').
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    default_ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        ordering = getattr(view, 'keyset_ordering', self.default_ordering)
+        self.field, self.pk_field = (name.lstrip('-') for name in ordering)
+        self.descending = ordering[0].startswith('-')
+        model = queryset.model
+
+        cursor = self.decode_cursor(request, model)
+        reverse = bool(cursor and cursor.reverse)
+        # Walking backwards flips both the comparison and the sort order
+        walk_descending = self.descending != reverse
+        prefix = '-' if walk_descending else ''
+        queryset = queryset.order_by(f'{prefix}{self.field}', f'{prefix}{self.pk_field}')
+
+        if cursor:
+            lookup = 'lt' if walk_descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__{lookup}': cursor.value})
+                | Q(**{self.field: cursor.value, f'{self.pk_field}__{lookup}': cursor.pk})
+            )
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        # A cursor means there is a page on the side it came from
+        self.next_position = rows[-1] if rows and (has_more if not reverse else cursor) else None
+        self.previous_position = rows[0] if rows and (has_more if reverse else cursor) else None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE
+        return min(max(requested, 1), max_page_size())
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_link(self.next_position, reverse=False),
+            'previous': self.get_link(self.previous_position, reverse=True),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_link(self, row, reverse):
+        url = self.request.build_absolute_uri()
+        if row is None:
+            return None
+        # Rows are model instances, or dicts from a values() projection
+        if isinstance(row, dict):
+            value, pk = row[self.field], row[self.pk_field]
+        else:
+            value = getattr(row, self.field)
+            pk = getattr(row, self.pk_field)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(value, pk, reverse))
+
+    def encode_cursor(self, value, pk, reverse):
+        # isoformat() keeps microseconds, which the position must match exactly
+        payload = {
+            'v': value.isoformat() if hasattr(value, 'isoformat') else value,
+            'k': pk if isinstance(pk, int) else str(pk),
+        }
+        if reverse:
+            payload['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode())
+        return encoded.decode().rstrip('=')
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+            value = model._meta.get_field(self.field).to_python(payload['v'])
+            pk = model._meta.get_field(self.pk_field).to_python(payload['k'])
+        except (binascii.Error, ValueError, TypeError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(value, pk, bool(payload.get('r')))
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': f'Number of results to return per page (at most {max_page_size()}).',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+
+class KeysetOrPageNumberPagination(BasePagination):
+    """Keyset pagination, or page numbers with a count when ?page= is given"""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if 'page' in request.query_params:
+            self.paginator = CappedPageNumberPagination()
+        else:
+            self.paginator = KeysetPagination()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return KeysetPagination().get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        return (
+            KeysetPagination().get_schema_operation_parameters(view)
+            + CappedPageNumberPagination().get_schema_operation_parameters(view)[:1]
+        )
@@ -0,0 +1,188 @@
+"""
+Query budgets for ICPAC Booking System
+
+Every API view declares the most SQL queries one request may run, either with
+the @query_budget(n) decorator on a function view or a query_budget attribute
+on a class-based view. A dict such as {'GET': 3, 'POST': 8} gives per-method
+budgets. QueryBudgetMiddleware (enabled in development and tests) records the
+count, time and shape of each view's queries and reports:
+
+- X-Query-Count / X-Query-Time-Ms response headers
+- a warning when the budget is exceeded, or QueryBudgetExceeded when
+  QUERY_BUDGET_STRICT is set, so tests fail on a regression
+- a warning for every query shape repeated QUERY_BUDGET_REPEAT_THRESHOLD or
+  more times in one request, the usual sign of an N+1 loop
+
+Streaming response bodies (the booking exports) are produced after the
+middleware returns, so only the queries that set them up count.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Transaction bookkeeping the ORM issues on its own; never part of a budget
+IGNORED_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A view ran more queries than its declared budget"""
+
+
+def query_budget(budget):
+    """Declare the query budget of a function view (place above @api_view)"""
+    def decorator(view):
+        view.query_budget = budget
+        return view
+    return decorator
+
+
+def budget_for(view, method):
+    """Declared budget of a resolved view for an HTTP method, or None"""
+    view_class = getattr(view, 'view_class', None) or getattr(view, 'cls', None)
+    budget = getattr(view, 'query_budget', None)
+    if budget is None and view_class is not None:
+        budget = getattr(view_class, 'query_budget', None)
+    if isinstance(budget, dict):
+        return budget.get(method, budget.get('*'))
+    return budget
+
+
+def query_shape(sql):
+    """SQL with literals and IN/VALUES lists collapsed, so repeats compare equal"""
+    shape = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    shape = re.sub(r'\b\d+\b', '?', shape)
+    shape = re.sub(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)', '(?)', shape)
+    shape = shape.replace('%s', '?')
+    return re.sub(r'\s+', ' ', shape).strip()
+
+
+class QueryRecorder:
+    """
+    Records every statement run on any database connection while active:
+
+        with QueryRecorder() as recorder:
+            ...
+        recorder.count, recorder.duration, recorder.repeated()
+    """
+
+    def __init__(self):
+        self.queries = []
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if not sql.lstrip().upper().startswith(IGNORED_STATEMENTS):
+                self.queries.append((sql, time.perf_counter() - started))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        """Seconds spent in the database"""
+        return sum(duration for _, duration in self.queries)
+
+    def repeated(self, threshold=None):
+        """{shape: count} of query shapes run at least threshold times"""
+        if threshold is None:
+            threshold = getattr(settings, 'QUERY_BUDGET_REPEAT_THRESHOLD', 3)
+        shapes = Counter(query_shape(sql) for sql, _ in self.queries)
+        return {shape: count for shape, count in shapes.items() if count >= threshold}
+
+
+class QueryBudgetMiddleware:
+    """
+    Measures the queries of each view against its declared budget.
+    Install it last in MIDDLEWARE, so only the view itself is measured.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', False):
+            return self.get_response(request)
+
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        self.report(request, response, recorder)
+        return response
+
+    def report(self, request, response, recorder):
+        match = getattr(request, 'resolver_match', None)
+        endpoint = f'{request.method} {match.route if match else request.path}'
+        budget = budget_for(match.func, request.method) if match else None
+        repeated = recorder.repeated()
+
+        response['X-Query-Count'] = str(recorder.count)
+        response['X-Query-Time-Ms'] = f'{recorder.duration * 1000:.1f}'
+        response.query_recorder = recorder
+
+        for shape, count in repeated.items():
+            logger.warning('%s ran the same query %d times: %s', endpoint, count, shape)
+
+        if budget is None:
+            if request.path.startswith('/api/'):
+                logger.warning('%s has no query budget (%d queries)', endpoint, recorder.count)
+            return
+        if recorder.count > budget:
+            message = f'{endpoint} ran {recorder.count} queries, budget is {budget}'
+            if repeated:
+                message += '; repeated: ' + '; '.join(
+                    f'{count}x {shape}' for shape, count in repeated.items()
+                )
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+
+class QueryBudgetTestMixin:
+    """
+    TestCase helpers: every request made by the test client runs with budgets
+    enforced, and assertWithinBudget also rejects repeated query shapes.
+    """
+    query_budget_settings = {
+        'QUERY_BUDGET_ENABLED': True,
+        'QUERY_BUDGET_STRICT': True,
+    }
+
+    def setUp(self):
+        super().setUp()
+        overrides = self.settings(**self.query_budget_settings)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def assertWithinBudget(self, response, allow_repeats=()):
+        """The request behind response kept its budget and ran no N+1 loop"""
+        recorder = getattr(response, 'query_recorder', None)
+        self.assertIsNotNone(recorder, 'QueryBudgetMiddleware did not run for this request')
+        budget = budget_for(response.resolver_match.func, response.request['REQUEST_METHOD'])
+        self.assertIsNotNone(budget, f'{response.request["PATH_INFO"]} declares no query budget')
+        self.assertLessEqual(recorder.count, budget)
+        repeated = {
+            shape: count for shape, count in recorder.repeated().items()
+            if not any(allowed in shape for allowed in allow_repeats)
+        }
+        self.assertEqual(repeated, {}, 'Repeated query shapes (N+1)')
+        return recorder
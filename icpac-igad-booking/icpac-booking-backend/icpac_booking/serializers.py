@@ -0,0 +1,315 @@
+"""
+Fast and sparse serialization for ICPAC Booking System
+
+A ModelSerializer spends most of a large list walking its field machinery
+per instance: attribute lookups through related objects, method fields and
+a to_representation call per value. ValuesSerializer produces the same JSON
+as its serializer_class from a values() projection instead, so a list costs
+one query returning plain rows and a loop over a precomputed field plan.
+
+Plain and related model fields are read from values() columns derived from
+each field's source; fields backed by a method (get_full_name,
+get_FOO_display, SerializerMethodField) need a get_<field>(row) method on
+the subclass, with the columns it reads listed in getter_columns.
+
+Generic views opt in per view with ValuesListMixin and a
+values_serializer_class attribute; their create/update paths keep the
+regular serializers.
+
+SparseFieldsMixin gives a view's GET responses ?fields=id,name (only those
+fields) and ?expand=room (a related object nested in place of its id) for
+serializers using SparseFieldsSerializerMixin. Dropped fields are never
+computed, and the queryset's only(), select_related() and
+prefetch_related() are cut down to what the remaining fields read.
+"""
+import copy
+import re
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db.models import QuerySet
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+from rest_framework.response import Response
+
+DISPLAY_METHOD = re.compile(r'^get_(\w+)_display$')
+
+# Fields whose to_representation returns a values() column unchanged
+PASSTHROUGH_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.IntegerField,
+    serializers.JSONField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+def column_for(model, source_attrs):
+    """values() lookup of a serializer field source, or None for a method"""
+    if not source_attrs:
+        return None
+    for position, attr in enumerate(source_attrs):
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        if field.is_relation and position < len(source_attrs) - 1:
+            model = field.related_model
+    return '__'.join(source_attrs)
+
+
+def converter_for(field):
+    """Function turning a non-null column value into the field's output, or None"""
+    if type(field) in PASSTHROUGH_FIELDS:
+        return None
+    if isinstance(field, serializers.DateTimeField) and not hasattr(field, 'timezone'):
+        # Looking up the current timezone per value costs more than the formatting
+        field = copy.copy(field)
+        field.timezone = field.default_timezone()
+    return field.to_representation
+
+
+class ValuesSerializer:
+    """
+    Read-only serializer for lists, built on values() rows. Pass a queryset
+    (projected here) or rows from project(); data is a list of dicts equal
+    to serializer_class(instances, many=True).data.
+    """
+    serializer_class = None
+    getter_columns = {}
+
+    def __init__(self, rows, context=None, fields=None):
+        self.rows = rows
+        self.context = context or {}
+        self.fields = fields
+
+    @classmethod
+    def plan(cls):
+        """(name, column, field, getter) per output field, built once per class"""
+        if '_plan' not in cls.__dict__:
+            serializer = cls.serializer_class()
+            model = serializer.Meta.model
+            plan = []
+            for name, field in serializer.fields.items():
+                if field.write_only:
+                    continue
+                getter = getattr(cls, f'get_{name}', None)
+                if getter is not None:
+                    plan.append((name, None, None, getter))
+                    continue
+                column = None
+                if not isinstance(field, serializers.SerializerMethodField):
+                    column = column_for(model, field.source_attrs)
+                if column is None:
+                    raise ImproperlyConfigured(
+                        f'{cls.__name__} needs a get_{name}(row) method: {name} is not a model column.'
+                    )
+                plan.append((name, column, field, None))
+            cls._plan = plan
+        return cls._plan
+
+    @classmethod
+    def selected(cls, fields=None):
+        """The plan of the named fields only; ValidationError for unknown names"""
+        plan = cls.plan()
+        if fields is None:
+            return plan
+        check_field_names('fields', fields, [entry[0] for entry in plan])
+        return [entry for entry in plan if entry[0] in fields]
+
+    @classmethod
+    def columns(cls, fields=None):
+        columns = []
+        for name, column, field, getter in cls.selected(fields):
+            columns.extend([column] if column else cls.getter_columns.get(name, ()))
+        return list(dict.fromkeys(columns))
+
+    @classmethod
+    def project(cls, queryset, extra=(), fields=None):
+        """values() projection of queryset with every column the fields read"""
+        return queryset.values(*dict.fromkeys(cls.columns(fields) + list(extra)))
+
+    @property
+    def data(self):
+        rows = self.project(self.rows, fields=self.fields) if isinstance(self.rows, QuerySet) else self.rows
+        plan = [
+            (name, column, None if field is None else converter_for(field), getter)
+            for name, column, field, getter in self.selected(self.fields)
+        ]
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, converter, getter in plan:
+                if getter is not None:
+                    item[name] = getter(self, row)
+                    continue
+                value = row[column]
+                item[name] = value if converter is None or value is None else converter(value)
+            data.append(item)
+        return data
+
+
+class ValuesListMixin:
+    """
+    Serves a generic view's list action through values_serializer_class.
+    The projection keeps the keyset_ordering columns for the paginator.
+    """
+    values_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        serializer_class = self.values_serializer_class
+        fields, expand = sparse_params(request) if isinstance(self, SparseFieldsMixin) else (None, [])
+        # Nested objects need model instances
+        if serializer_class is None or expand:
+            return super().list(request, *args, **kwargs)
+
+        ordering = [name.lstrip('-') for name in getattr(self, 'keyset_ordering', ())]
+        queryset = serializer_class.project(self.filter_queryset(self.get_queryset()), ordering, fields)
+        page = self.paginate_queryset(queryset)
+        context = self.get_serializer_context()
+        if page is not None:
+            return self.get_paginated_response(serializer_class(page, context=context, fields=fields).data)
+        return Response(serializer_class(queryset, context=context, fields=fields).data)
+
+
+def check_field_names(param, names, allowed):
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise serializers.ValidationError({
+            param: f'Unknown field(s): {", ".join(unknown)}. Available: {", ".join(allowed) or "none"}.'
+        })
+
+
+def sparse_params(request):
+    """
+    Names in ?fields= (None when absent) and ?expand=, comma-separated or
+    repeated
+    """
+    def names(param):
+        values = request.query_params.getlist(param)
+        return [name.strip() for value in values for name in value.split(',') if name.strip()]
+
+    fields = names('fields') if 'fields' in request.query_params else None
+    return fields, names('expand')
+
+
+class SparseFieldsSerializerMixin:
+    """
+    ModelSerializer taking fields= (names to keep) and expand= (names of
+    expandable_fields to nest, added if the serializer lacks them).
+    expandable_fields maps a name to the dotted path of the nested
+    serializer; the relation of the same name is its source. field_sources
+    lists the model lookups of fields that are not plain columns or
+    get_FOO_display, so views can trim their querysets.
+    """
+    expandable_fields = {}
+    field_sources = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.expanded = set()
+        expand = expand or []
+        check_field_names('expand', expand, list(self.expandable_fields))
+        if fields is not None:
+            check_field_names('fields', fields, list(dict.fromkeys([*self.fields, *expand])))
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name in expand:
+            if fields is not None and name not in fields:
+                continue
+            relation = self.Meta.model._meta.get_field(name)
+            self.fields[name] = import_string(self.expandable_fields[name])(
+                read_only=True, many=relation.many_to_many or relation.one_to_many
+            )
+            self.expanded.add(name)
+
+    def field_lookups(self, name, field):
+        """Model lookups a field reads, or None when they are unknown"""
+        if name in self.field_sources:
+            return list(self.field_sources[name])
+        if name in self.expanded:
+            return [name]
+        model = self.Meta.model
+        if len(field.source_attrs) == 1:
+            display = DISPLAY_METHOD.match(field.source_attrs[0])
+            if display and column_for(model, [display.group(1)]):
+                return [display.group(1)]
+        if isinstance(field, serializers.SerializerMethodField):
+            return None
+        column = column_for(model, field.source_attrs)
+        return None if column is None else [column]
+
+
+def trim_queryset(queryset, serializer, extra=()):
+    """
+    queryset loading only the columns and relations serializer's fields
+    read, plus extra columns; unchanged when a field's sources are unknown
+    """
+    model = queryset.model
+    columns = {model._meta.pk.name, *extra}
+    relations, prefetches = set(), set()
+    for name, field in serializer.fields.items():
+        lookups = serializer.field_lookups(name, field)
+        if lookups is None:
+            return queryset
+        for lookup in lookups:
+            add_lookup(model, lookup, columns, relations, prefetches)
+
+    # Expanded relations are serialized whole
+    for name in serializer.expanded:
+        columns = {column for column in columns if not column.startswith(f'{name}__')}
+        if name not in prefetches:
+            relations.add(name)
+    queryset = queryset.select_related(None).prefetch_related(None)
+    if relations:
+        queryset = queryset.select_related(*relations)
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches)
+    return queryset.only(*columns)
+
+
+def add_lookup(model, lookup, columns, relations, prefetches):
+    """Sort one lookup into loaded columns, joined relations and prefetches"""
+    parts = lookup.split('__')
+    for position, part in enumerate(parts):
+        field = model._meta.get_field(part)
+        path = '__'.join(parts[:position + 1])
+        rest = parts[position + 1:]
+        if field.many_to_many or field.one_to_many:
+            prefetches.add(path)
+            return
+        if not field.is_relation or not rest:
+            columns.add(path)
+            return
+        # A foreign key's own id is its column; no join needed
+        if rest == [field.target_field.name]:
+            columns.add(path)
+            return
+        relations.add(path)
+        columns.add(path)
+        model = field.related_model
+
+
+class SparseFieldsMixin:
+    """
+    ?fields= and ?expand= on a generic view's GET responses. The serializer
+    class must use SparseFieldsSerializerMixin; keyset_ordering columns stay
+    loaded for the paginator.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == 'GET':
+            fields, expand = sparse_params(self.request)
+            if fields is not None:
+                kwargs.setdefault('fields', fields)
+            if expand:
+                kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields, expand = sparse_params(self.request)
+        if self.request.method != 'GET' or (fields is None and not expand):
+            return queryset
+        ordering = [name.lstrip('-') for name in getattr(self, 'keyset_ordering', ())]
+        return trim_queryset(queryset, self.get_serializer(), ordering)
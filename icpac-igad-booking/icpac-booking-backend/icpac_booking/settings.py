@@ -160,6 +160,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'icpac_booking.metrics.MetricsMiddleware',  # Must be first, times the whole stack
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -167,11 +168,13 @@ MIDDLEWARE = [
     'icpac_booking.middleware.DisableCSRFForExemptURLs',  # Must be before CsrfViewMiddleware
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.security.profiling.ProfilingMiddleware',  # Removes itself unless PROFILING_ENABLED
     'django_otp.middleware.OTPMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'wagtail.contrib.redirects.middleware.RedirectMiddleware',
     'apps.security.middleware.SecurityMiddleware',
+    'icpac_booking.querybudget.QueryBudgetMiddleware',  # Must be last, measures the view only
 ]
 
 ROOT_URLCONF = 'icpac_booking.urls'
@@ -233,6 +236,55 @@ if 'DATABASE_URL' in os.environ:
     else:
         DATABASES['default'] = dj_database_url.parse(os.environ['DATABASE_URL'])
 
+# Let the PostgreSQL exclusion constraint on booking_occurrences reject overlapping
+# bookings instead of checking for conflicts in Python (ignored on SQLite)
+BOOKING_DB_CONFLICT_CHECK = get_env_bool(
+    'BOOKING_DB_CONFLICT_CHECK',
+    'postgresql' in DATABASES['default']['ENGINE'],
+)
+
+# Longest series a recurring booking may expand to (two years of weekly meetings).
+# Every date is stored as an occurrence row so the overlap constraint can see it.
+BOOKING_RECURRENCE_MAX_OCCURRENCES = get_env_int('BOOKING_RECURRENCE_MAX_OCCURRENCES', 104)
+
+# Seconds dashboard statistics are cached per scope (user, managed rooms, system)
+BOOKING_STATS_CACHE_TTL = get_env_int('BOOKING_STATS_CACHE_TTL', 30)
+
+# Rows fetched per database round trip while streaming booking exports
+BOOKING_EXPORT_CHUNK_SIZE = get_env_int('BOOKING_EXPORT_CHUNK_SIZE', 2000)
+
+# Most bookings in one XLSX export; a workbook is built whole before sending,
+# so larger exports have to use the streamed CSV or NDJSON formats
+BOOKING_EXPORT_XLSX_MAX_ROWS = get_env_int('BOOKING_EXPORT_XLSX_MAX_ROWS', 50000)
+
+# Cache backend: Redis when REDIS_CACHE_URL is set, otherwise local memory.
+# Local memory is per process, so deployments running several workers must
+# set REDIS_CACHE_URL; without it availability answers are not cached at all.
+if os.environ.get('REDIS_CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_CACHE_URL'],
+            'KEY_PREFIX': 'icpac_booking',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'icpac-booking',
+        }
+    }
+
+# Cache holding availability answers, and how long an unused entry is kept
+# (entries are invalidated by version bumps, not by this timeout)
+AVAILABILITY_CACHE_ALIAS = os.environ.get('AVAILABILITY_CACHE_ALIAS', 'default')
+AVAILABILITY_CACHE_TIMEOUT = get_env_int('AVAILABILITY_CACHE_TIMEOUT', 60 * 60 * 24)
+
+# Cache availability in a per-process backend too; only safe when the site
+# runs a single process (runserver), as other workers never see its bumps
+AVAILABILITY_CACHE_PER_PROCESS = get_env_bool('AVAILABILITY_CACHE_PER_PROCESS', False)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -294,6 +346,7 @@ CORS_ALLOW_HEADERS = [
     'origin',
     'user-agent',
     'x-csrftoken',
+    'x-profile',
     'x-requested-with',
 ]
 
@@ -305,6 +358,16 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson-backed JSON, falling back to the stdlib when orjson is missing
+    'DEFAULT_RENDERER_CLASSES': [
+        'icpac_booking.fastjson.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'icpac_booking.fastjson.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.SearchFilter',
@@ -314,6 +377,9 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10,
 }
 
+# Largest page clients may request with ?page_size= on paginated lists
+API_MAX_PAGE_SIZE = get_env_int('API_MAX_PAGE_SIZE', 100)
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
@@ -356,6 +422,9 @@ SECURE_HSTS_INCLUDE_SUBDOMAINS = True
 PASSWORD_RESET_TIMEOUT = 3600  # 1 hour
 LOGIN_ATTEMPT_LIMIT = 5
 LOGIN_LOCKOUT_TIME = 1800  # 30 minutes
+# Cache holding the failed login counters checked on every request; use a
+# shared (Redis) cache so every worker sees the same counts
+LOGIN_ATTEMPT_CACHE_ALIAS = os.environ.get('LOGIN_ATTEMPT_CACHE_ALIAS', 'default')
 
 # Email Configuration (OTP and notifications)
 EMAIL_HOST = os.environ.get('EMAIL_HOST', '')
@@ -389,6 +458,72 @@ OTP_SMS_SENDER = 'ICPAC'
 # Audit and Logging
 LOG_USER_ACTIONS = True
 LOG_API_REQUESTS = True
+
+# Months of security logs kept in the database, counting the current month.
+# archive_security_logs writes older months to gzipped NDJSON files under
+# SECURITY_LOG_ARCHIVE_DIR and drops them (moves them to <table>_archive on SQLite)
+SECURITY_LOG_RETENTION_MONTHS = {
+    'security_audit_logs': get_env_int('AUDIT_LOG_RETENTION_MONTHS', 12),
+    'security_login_attempts': get_env_int('LOGIN_ATTEMPT_RETENTION_MONTHS', 3),
+}
+SECURITY_LOG_ARCHIVE_DIR = os.environ.get('SECURITY_LOG_ARCHIVE_DIR', str(BASE_DIR / 'logs' / 'archive'))
+# Monthly partitions created ahead of time on PostgreSQL
+SECURITY_LOG_PARTITIONS_AHEAD = get_env_int('SECURITY_LOG_PARTITIONS_AHEAD', 3)
+
+# API request audit sampling. Mutations, 401/403/429 responses and the paths
+# below are always logged; reads are logged at the rate of the first matching
+# (method, path prefix, rate) rule, capped per route per summary interval, and
+# counted into one summary row per route every AUDIT_API_SUMMARY_INTERVAL seconds
+AUDIT_API_ALWAYS_LOG_PATHS = ['/api/auth/', '/api/security/']
+AUDIT_API_SAMPLE_RATES = [
+    ('GET', '/api/bookings/availability-levels/', 0.01),
+    ('GET', '/api/bookings/check-availability/', 0.05),
+    ('GET', '/api/bookings/available-rooms/', 0.05),
+    ('GET', '/api/bookings/room/', 0.05),
+    ('GET', '/api/bookings/calendar/', 0.05),
+    ('GET', '/api/bookings/dashboard/', 0.05),
+    ('GET', '/api/rooms/', 0.05),
+    ('*', '/api/', 0.1),
+]
+AUDIT_API_DEFAULT_SAMPLE_RATE = 1.0
+AUDIT_API_MAX_SAMPLES_PER_INTERVAL = get_env_int('AUDIT_API_MAX_SAMPLES_PER_INTERVAL', 100)
+AUDIT_API_SUMMARY_INTERVAL = get_env_int('AUDIT_API_SUMMARY_INTERVAL', 300)
+
+# Audit log entries are queued and written in batches by a background thread;
+# batches the database rejects are appended to the fallback file
+AUDIT_LOG_ASYNC = get_env_bool('AUDIT_LOG_ASYNC', True)
+AUDIT_LOG_QUEUE_SIZE = get_env_int('AUDIT_LOG_QUEUE_SIZE', 10000)
+AUDIT_LOG_BATCH_SIZE = get_env_int('AUDIT_LOG_BATCH_SIZE', 200)
+AUDIT_LOG_FLUSH_INTERVAL = get_env_int('AUDIT_LOG_FLUSH_INTERVAL', 2)  # seconds
+AUDIT_LOG_FALLBACK_FILE = os.environ.get(
+    'AUDIT_LOG_FALLBACK_FILE',
+    str(BASE_DIR / 'logs' / 'audit-fallback.jsonl'),
+)
+
+# Per-view SQL query budgets (see icpac_booking/querybudget.py). Measured in
+# development; QUERY_BUDGET_STRICT turns an exceeded budget into an error
+QUERY_BUDGET_ENABLED = get_env_bool('QUERY_BUDGET_ENABLED', DEBUG)
+QUERY_BUDGET_STRICT = get_env_bool('QUERY_BUDGET_STRICT', False)
+QUERY_BUDGET_REPEAT_THRESHOLD = get_env_int('QUERY_BUDGET_REPEAT_THRESHOLD', 3)
+
+# Prometheus metrics at /metrics (see icpac_booking/metrics.py), served only
+# to METRICS_ALLOWED_IPS. Set METRICS_DIR to a directory shared by the
+# gunicorn workers of one host so every scrape reports all of them
+METRICS_ENABLED = get_env_bool('METRICS_ENABLED', True)
+METRICS_ALLOWED_IPS = get_env_list('METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_SNAPSHOT_INTERVAL = get_env_int('METRICS_SNAPSHOT_INTERVAL', 5)  # seconds
+
+# On-demand request profiling (see apps/security/profiling.py). When enabled,
+# admin requests sending PROFILING_HEADER and a PROFILING_SAMPLE_RATE share of
+# all requests are profiled into PROFILING_DIR, keeping the newest
+# PROFILING_MAX_PROFILES
+PROFILING_ENABLED = get_env_bool('PROFILING_ENABLED', False)
+PROFILING_HEADER = os.environ.get('PROFILING_HEADER', 'X-Profile')
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_INTERVAL_MS = get_env_int('PROFILING_INTERVAL_MS', 5)
+PROFILING_DIR = os.environ.get('PROFILING_DIR', str(BASE_DIR / 'logs' / 'profiles'))
+PROFILING_MAX_PROFILES = get_env_int('PROFILING_MAX_PROFILES', 200)
 SESSION_COOKIE_AGE = 28800  # 8 hours
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 
@@ -25,6 +25,7 @@ INSTALLED_APPS = [
 
 # Remove Wagtail-specific middleware
 MIDDLEWARE = [
+    'icpac_booking.metrics.MetricsMiddleware',  # Must be first, times the whole stack
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -32,9 +33,11 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.security.profiling.ProfilingMiddleware',  # Removes itself unless PROFILING_ENABLED
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'apps.security.middleware.SecurityMiddleware',
+    'icpac_booking.querybudget.QueryBudgetMiddleware',  # Must be last, measures the view only
 ]
 
 # Use SQLite for local development
@@ -45,6 +48,9 @@ DATABASES = {
     }
 }
 
+# runserver is a single process, so local memory can hold availability answers
+AVAILABILITY_CACHE_PER_PROCESS = True
+
 # Disable Celery for local development
 CELERY_TASK_ALWAYS_EAGER = True
 CELERY_TASK_EAGER_PROPAGATES = True
@@ -0,0 +1,317 @@
+import datetime
+import decimal
+import io
+import uuid
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.utils.translation import gettext_lazy
+from rest_framework import renderers
+from rest_framework.exceptions import NotFound, ParseError, ValidationError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from apps.authentication.models import User
+from apps.authentication.serializers import UserSerializer
+from apps.bookings.models import Booking
+from apps.bookings.serializers import BookingSerializer, BookingValuesSerializer
+from apps.rooms.models import Room
+from apps.security.models import AllowedEmailDomain, AuditLog
+from . import fastjson, metrics
+from .pagination import KeysetPagination
+from .querybudget import QueryRecorder, budget_for, query_shape
+from .serializers import sparse_params, trim_queryset
+
+
+def api_patterns(patterns=None, prefix=''):
+    """(route, callback) of every URL pattern under api/"""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            if route.startswith('api/') or 'api/'.startswith(route):
+                yield from api_patterns(pattern.url_patterns, route)
+        elif isinstance(pattern, URLPattern) and route.startswith('api/'):
+            yield route, pattern.callback
+
+
+def view_methods(callback):
+    """HTTP methods a view handles, besides HEAD and OPTIONS"""
+    view_class = getattr(callback, 'view_class', None) or getattr(callback, 'cls', None)
+    if view_class is None:
+        return ['GET']
+    return [
+        method.upper() for method in view_class.http_method_names
+        if method not in ('head', 'options') and hasattr(view_class, method)
+    ]
+
+
+class QueryBudgetCoverageTests(SimpleTestCase):
+    def test_every_api_endpoint_declares_a_budget(self):
+        missing = [
+            f'{method} {route}'
+            for route, callback in api_patterns()
+            for method in view_methods(callback)
+            if budget_for(callback, method) is None
+        ]
+        self.assertEqual(missing, [])
+
+    def test_query_shape_ignores_values(self):
+        self.assertEqual(
+            query_shape('SELECT * FROM "rooms" WHERE "id" IN (%s, %s, %s) LIMIT 21'),
+            query_shape("SELECT * FROM \"rooms\" WHERE \"id\" IN (4, 5) LIMIT 1"),
+        )
+
+
+class QueryRecorderTests(TestCase):
+    def test_repeated_lookups_are_reported(self):
+        rooms = [Room.objects.create(name=f'Room {n}', capacity=10) for n in range(4)]
+        with QueryRecorder() as recorder:
+            for room in rooms:
+                Room.objects.get(pk=room.pk)
+            Room.objects.filter(pk__in=[room.pk for room in rooms]).count()
+
+        self.assertEqual(recorder.count, 5)
+        self.assertEqual(list(recorder.repeated().values()), [4])
+
+
+@override_settings(AUDIT_LOG_ASYNC=False, LOG_API_REQUESTS=False, METRICS_DIR='')
+class MetricsEndpointTests(TestCase):
+    def test_requests_are_counted_per_route(self):
+        room = Room.objects.create(name='Room', capacity=10)
+        self.client.get(f'/api/rooms/{room.id}/')
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        body = response.content.decode()
+        self.assertIn('# TYPE icpac_http_request_duration_seconds histogram', body)
+        self.assertIn('route="/api/rooms/<int:pk>/"', body)
+        self.assertIn('icpac_http_request_db_queries_count{method="GET",route="/api/rooms/<int:pk>/"}', body)
+        self.assertIn('icpac_audit_queue_depth ', body)
+
+    def test_only_allowed_addresses_may_scrape(self):
+        response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.9')
+        self.assertEqual(response.status_code, 403)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram('test_seconds', 'Test', ['route'], buckets=(0.1, 1.0))
+        metrics.REGISTRY.remove(histogram)
+        histogram.observe(0.05, route='/a')
+        histogram.observe(0.5, route='/a')
+        samples = list(histogram.samples(('/a',), histogram.snapshot()[('/a',)]))
+        self.assertEqual([value for _, _, value in samples], [1, 2, 2, 0.55, 2])
+
+
+class FastJSONTests(SimpleTestCase):
+    payload = {
+        'created_at': datetime.datetime(2026, 3, 2, 8, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+        'naive': datetime.datetime(2026, 3, 2, 8, 30),
+        'date': datetime.date(2026, 3, 2),
+        'time': datetime.time(14, 45),
+        'price': decimal.Decimal('12.50'),
+        'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'status': gettext_lazy('Pending'),
+        'counts': {1: 3, 'total': [1, 2.5, None, True]},
+        'purpose': 'Réunion \u2028 board \u2029',
+        'huge': 2 ** 70,
+    }
+
+    def test_renderer_matches_drf_renderer(self):
+        self.assertEqual(
+            fastjson.JSONRenderer().render(self.payload), renderers.JSONRenderer().render(self.payload)
+        )
+        indented = 'application/json; indent=2'
+        self.assertEqual(
+            fastjson.JSONRenderer().render(self.payload, indented),
+            renderers.JSONRenderer().render(self.payload, indented),
+        )
+
+    def test_dumps_matches_with_and_without_orjson(self):
+        encoded = fastjson.dumps(self.payload)
+        with mock.patch.object(fastjson, 'orjson', None):
+            self.assertEqual(fastjson.dumps(self.payload), encoded)
+            self.assertEqual(fastjson.loads(encoded), fastjson.loads(encoded.encode()))
+        self.assertEqual(fastjson.loads(encoded)['created_at'], '2026-03-02T08:30:15.123456Z')
+
+    def test_parser_rejects_invalid_json(self):
+        parser = fastjson.JSONParser()
+        self.assertEqual(parser.parse(io.BytesIO('{"room": 1, "purpose": "Café"}'.encode())), {
+            'room': 1, 'purpose': 'Café',
+        })
+        for body in (b'{"room": ', b'{"attendees": NaN}'):
+            with self.subTest(body=body), self.assertRaises(ParseError):
+                parser.parse(io.BytesIO(body))
+
+
+
+@override_settings(AUDIT_LOG_ASYNC=False, LOG_API_REQUESTS=False)
+class FastJSONEndpointTests(TestCase):
+    """API requests are parsed and responses rendered through fastjson"""
+
+    @classmethod
+    def setUpTestData(cls):
+        AllowedEmailDomain.objects.create(
+            domain='icpac.net', description='Centre de prévision \u2028 IGAD', requires_approval=True
+        )
+        Room.objects.create(name='Salle Kilimandjaro', capacity=40, category='conference', amenities=['Projector'])
+        Room.objects.create(name='Boardroom \u2029', capacity=12, category='boardroom')
+
+    def test_responses_match_drf_renderer(self):
+        for path in ('/api/rooms/', '/api/rooms/?fields=id,name'):
+            response = self.client.get(path, HTTP_ACCEPT='application/json')
+            with self.subTest(path=path):
+                self.assertIsInstance(response.accepted_renderer, fastjson.JSONRenderer)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                self.assertEqual(response.content, renderers.JSONRenderer().render(response.data))
+        self.assertIn(b'Boardroom \\u2029', response.content)
+
+        # Indented output is left to the stdlib encoder
+        response = self.client.get('/api/rooms/', HTTP_ACCEPT='application/json; indent=2')
+        self.assertEqual(
+            response.content, renderers.JSONRenderer().render(response.data, 'application/json; indent=2')
+        )
+
+    def test_request_bodies_are_parsed(self):
+        body = '{"email": "Amélie@ICPAC.net"}'
+        with mock.patch.object(fastjson.orjson, 'loads', wraps=fastjson.orjson.loads) as loads:
+            response = self.client.post(
+                '/api/security/check-domain/', body.encode(), content_type='application/json'
+            )
+        loads.assert_called_once_with(body.encode())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            'allowed': True, 'requires_approval': True, 'domain_description': 'Centre de prévision \u2028 IGAD',
+        })
+        self.assertIn(b'\\u2028', response.content)
+
+        # Other charsets go through DRF's parser; the client encodes body as latin-1
+        response = self.client.post(
+            '/api/security/check-domain/', body, content_type='application/json; charset=latin-1'
+        )
+        self.assertEqual(response.data['allowed'], True)
+
+        response = self.client.post('/api/security/check-domain/', b'{"email": ', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.data['detail'].startswith('JSON parse error'))
+
+class KeysetPaginationTests(TestCase):
+    factory = APIRequestFactory()
+
+    def paginate(self, queryset, url, ordering):
+        view = mock.Mock(keyset_ordering=ordering)
+        paginator = KeysetPagination()
+        rows = paginator.paginate_queryset(queryset, Request(self.factory.get(url)), view)
+        return [row.pk for row in rows], paginator.get_paginated_response([]).data
+
+    def walk(self, queryset, ordering, link='next'):
+        """Pages of primary keys from following link from the first (or last) page"""
+        pages, url = [], '/api/items/?page_size=2'
+        while url:
+            ids, data = self.paginate(queryset, url, ordering)
+            pages.append(ids)
+            url = data[link]
+        return pages
+
+    def test_cursor_round_trip(self):
+        paginator = KeysetPagination()
+        paginator.field, paginator.pk_field = 'timestamp', 'id'
+        value = datetime.datetime(2026, 3, 2, 8, 30, 15, 123456, tzinfo=datetime.timezone.utc)
+        pk = uuid.UUID('12345678-1234-5678-1234-567812345678')
+        for reverse in (False, True):
+            with self.subTest(reverse=reverse):
+                encoded = paginator.encode_cursor(value, pk, reverse)
+                self.assertNotIn('=', encoded)
+                request = Request(self.factory.get('/api/items/', {'cursor': encoded}))
+                self.assertEqual(tuple(paginator.decode_cursor(request, AuditLog)), (value, pk, reverse))
+
+        for encoded in ('not base64!', 'eyJ2IjoxfQ', paginator.encode_cursor('yesterday', pk, False)):
+            with self.subTest(cursor=encoded), self.assertRaises(NotFound):
+                paginator.decode_cursor(Request(self.factory.get('/api/items/', {'cursor': encoded})), AuditLog)
+
+    def test_ties_on_the_sort_key_are_broken_by_id(self):
+        for capacity in (10, 20, 10, 10, 20):
+            Room.objects.create(name=f'Room {capacity}', capacity=capacity)
+        ordered = list(Room.objects.order_by('capacity', 'id').values_list('id', flat=True))
+        ordering = ('capacity', 'id')
+
+        pages = self.walk(Room.objects.all(), ordering)
+        self.assertEqual(pages, [ordered[0:2], ordered[2:4], ordered[4:]])
+
+        # Previous links walk back through the same pages
+        _, last = self.paginate(Room.objects.all(), '/api/items/?page_size=4', ordering)
+        ids, data = self.paginate(Room.objects.all(), last['next'], ordering)
+        self.assertEqual((ids, data['next']), (ordered[4:], None))
+        ids, data = self.paginate(Room.objects.all(), data['previous'], ordering)
+        self.assertEqual(ids, ordered[0:4])
+        self.assertIsNone(data['previous'])
+
+    def test_descending_datetimes_with_equal_timestamps(self):
+        same = datetime.datetime(2026, 3, 2, 8, 30, 15, 123456, tzinfo=datetime.timezone.utc)
+        for offset in (0, 0, 0, 1, 2):
+            AuditLog.objects.create(
+                action_type='other', description='Event', timestamp=same + datetime.timedelta(microseconds=offset)
+            )
+        ordered = list(AuditLog.objects.order_by('-timestamp', '-id').values_list('id', flat=True))
+
+        pages = self.walk(AuditLog.objects.all(), ('-timestamp', '-id'))
+        self.assertEqual(sum(pages, []), ordered)
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+
+
+class SparseFieldsTests(SimpleTestCase):
+    """?fields= and ?expand= cut serializers and their querysets down to what is asked for"""
+
+    def test_params_are_comma_separated_or_repeated(self):
+        request = Request(APIRequestFactory().get('/api/bookings/?fields=id, room&fields=purpose,&expand=room'))
+        self.assertEqual(sparse_params(request), (['id', 'room', 'purpose'], ['room']))
+        self.assertEqual(sparse_params(Request(APIRequestFactory().get('/api/bookings/'))), (None, []))
+
+    def test_queryset_loads_only_the_requested_columns(self):
+        serializer = BookingSerializer(fields=['id', 'room_name', 'user_name', 'duration_hours'])
+        self.assertEqual(list(serializer.fields), ['id', 'room_name', 'user_name', 'duration_hours'])
+        queryset = trim_queryset(Booking.objects.select_related('room', 'user', 'approved_by'), serializer)
+        self.assertEqual(queryset.query.deferred_loading, ({
+            'id', 'room', 'room__name', 'user', 'user__first_name', 'user__last_name',
+            'start_date', 'end_date', 'start_time', 'end_time',
+        }, False))
+        self.assertEqual(queryset.query.select_related, {'room': {}, 'user': {}})
+
+        sql = str(trim_queryset(Booking.objects.all(), BookingSerializer(fields=['id', 'room_name'])).query)
+        self.assertTrue(sql.startswith(
+            'SELECT "bookings"."id", "bookings"."room_id", "rooms"."id", "rooms"."name" FROM "bookings"'
+        ))
+
+    def test_expanded_relations_are_loaded_whole(self):
+        serializer = BookingSerializer(fields=['id', 'room', 'can_modify'], expand=['room', 'user'])
+        # user is expandable but was not asked for in fields
+        self.assertEqual(list(serializer.fields), ['id', 'room', 'can_modify'])
+        self.assertEqual(serializer.expanded, {'room'})
+        queryset = trim_queryset(Booking.objects.all(), serializer, ['created_at'])
+        self.assertEqual(
+            queryset.query.deferred_loading, ({'id', 'room', 'user', 'approval_status', 'created_at'}, False)
+        )
+        self.assertEqual(queryset.query.select_related, {'room': {}})
+
+    def test_to_many_sources_are_prefetched(self):
+        queryset = trim_queryset(User.objects.all(), UserSerializer(fields=['id', 'full_name', 'managed_rooms_data']))
+        self.assertEqual(queryset.query.deferred_loading, ({'id', 'first_name', 'last_name', 'role'}, False))
+        self.assertEqual(queryset._prefetch_related_lookups, ('managed_rooms',))
+
+    def test_unknown_sources_leave_the_queryset_alone(self):
+        class Undeclared(BookingSerializer):
+            field_sources = {}
+
+        queryset = Booking.objects.select_related('room')
+        self.assertIs(trim_queryset(queryset, Undeclared(fields=['id', 'can_modify'])), queryset)
+        self.assertIsNot(trim_queryset(queryset, Undeclared(fields=['id', 'room_name'])), queryset)
+
+    def test_values_projection_reads_only_the_requested_columns(self):
+        self.assertEqual(
+            BookingValuesSerializer.columns(['id', 'room_name', 'user_name']),
+            ['id', 'room__name', 'user__first_name', 'user__last_name'],
+        )
+        with self.assertRaisesMessage(ValidationError, 'Unknown field(s): email'):
+            BookingValuesSerializer.columns(['id', 'email'])
@@ -8,11 +8,15 @@ from django.conf.urls.static import static
 from django.http import JsonResponse
 from django.shortcuts import redirect
 
+from icpac_booking.metrics import metrics_view
+from icpac_booking.querybudget import query_budget
+
 # Wagtail imports
 from wagtail.admin import urls as wagtailadmin_urls
 from wagtail import urls as wagtail_urls
 from wagtail.documents import urls as wagtaildocs_urls
 
+@query_budget(0)
 def api_info(request):
     return JsonResponse({
         'message': 'ICPAC Booking API',
@@ -46,6 +50,9 @@ urlpatterns = [
     path('api/rooms/', include('apps.rooms.urls')),
     path('api/bookings/', include('apps.bookings.urls')),
     path('api/security/', include('apps.security.urls')),
+
+    # Prometheus scrape endpoint
+    path('metrics', metrics_view, name='metrics'),
     
     # Wagtail pages (catch-all - must be last)
     path('', include(wagtail_urls)),
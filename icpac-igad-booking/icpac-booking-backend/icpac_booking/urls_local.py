@@ -8,6 +8,10 @@ from django.conf.urls.static import static
 from django.http import JsonResponse
 from django.shortcuts import redirect
 
+from icpac_booking.metrics import metrics_view
+from icpac_booking.querybudget import query_budget
+
+@query_budget(0)
 def api_info(request):
     return JsonResponse({
         'message': 'ICPAC Booking API',
@@ -37,6 +41,9 @@ urlpatterns = [
     path('api/rooms/', include('apps.rooms.urls')),
     path('api/bookings/', include('apps.bookings.urls')),
     path('api/security/', include('apps.security.urls')),
+
+    # Prometheus scrape endpoint
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Serve media files in development